@@ -1,5 +1,113 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Row count of `queryset` as estimated by PostgreSQL without running it:
+    pg_class.reltuples for a whole table, the planner's EXPLAIN row estimate
+    otherwise. None on other databases or when no estimate is available.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            if row and row[0] >= 0:
+                return int(row[0])
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class _EstimatedPage(Page):
+    has_more = None
+
+    def has_next(self):
+        if self.has_more is None:
+            return super().has_next()
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count comes from the planner estimate when that is above
+    settings.PAGINATION_ESTIMATE_THRESHOLD, and from COUNT(*) below it. Either
+    result is cached per query (SQL + params) for PAGINATION_COUNT_CACHE_TTL
+    seconds. With an estimated count, pages past the estimate are still
+    served and `next` is decided by fetching one row more than a page.
+    """
+    count_is_estimate = False
+
+    def _count_cache_key(self):
+        sql, params = self.object_list.order_by().query.sql_with_params()
+        signature = f"{self.object_list.db}|{sql}|{params!r}"
+        return "pagination_count:" + hashlib.sha1(signature.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        key = self._count_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            count, self.count_is_estimate = cached
+            return count
+
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > settings.PAGINATION_ESTIMATE_THRESHOLD:
+            count, self.count_is_estimate = estimate, True
+        else:
+            count, self.count_is_estimate = self.object_list.count(), False
+        cache.set(key, (count, self.count_is_estimate), settings.PAGINATION_COUNT_CACHE_TTL)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.count_is_estimate):
+            return super().validate_number(number)
+        # The real last page may lie beyond the estimated one; only the lower bound is checked
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        page = _EstimatedPage(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
 
 
 class StandardPagination(PageNumberPagination):
@@ -10,6 +118,7 @@ class StandardPagination(PageNumberPagination):
     def get_paginated_response(self, data):
         return Response({
             'count': self.page.paginator.count,
+            'count_is_estimate': getattr(self.page.paginator, 'count_is_estimate', False),
             'total_pages': self.page.paginator.num_pages,
             'current_page': self.page.number,
             'next': self.get_next_link(),
@@ -22,6 +131,7 @@ class StandardPagination(PageNumberPagination):
             'type': 'object',
             'properties': {
                 'count': {'type': 'integer'},
+                'count_is_estimate': {'type': 'boolean'},
                 'total_pages': {'type': 'integer'},
                 'current_page': {'type': 'integer'},
                 'next': {'type': 'string', 'nullable': True},
@@ -31,9 +141,142 @@ class StandardPagination(PageNumberPagination):
         }
 
 
-def paginate_queryset(request, queryset, serializer_class):
+class EstimatedCountPagination(StandardPagination):
+    """StandardPagination for big tables: planner-estimated counts above a threshold (EstimatedCountPaginator)."""
+    django_paginator_class = EstimatedCountPaginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over an ordering of indexed columns ending in a unique
+    one, e.g. ('-date', '-attendance_id') or ('-leave_refno',). Each page
+    seeks past the last row of the previous one (`?cursor=`), so deep pages
+    cost the same as the first and no OFFSET is scanned.
+
+    No total is computed unless asked for: ?count=exact runs COUNT(*),
+    ?count=estimate takes the planner's row estimate.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-pk',)
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row):
+        values = [row[f] if isinstance(row, dict) else getattr(row, f) for f in self._fields()]
+        raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return values
+
+    def _fields(self):
+        return [f.lstrip('-') for f in self.ordering]
+
+    def _after(self, values):
+        """Rows strictly after `values` in self.ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column, so it becomes an index range
+        first = self.ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count, self.count_is_estimate = queryset.count(), False
+        elif count_mode == 'estimate':
+            estimate = estimate_count(queryset)
+            if estimate is None:
+                self.count, self.count_is_estimate = queryset.count(), False
+            else:
+                self.count, self.count_is_estimate = estimate, True
+        else:
+            self.count, self.count_is_estimate = None, None
+
+        queryset = queryset.order_by(*self.ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._after(cursor))
+        rows = list(queryset[:page_size + 1])
+        self.page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(self.page[-1]) if len(rows) > page_size else None
+        return self.page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'count_is_estimate': {'type': 'boolean', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+def wants_keyset(request):
+    """Whether a listing was asked for keyset pagination (?pagination=keyset, or a cursor)."""
+    params = request.query_params
+    return params.get('pagination') == 'keyset' or KeysetPagination.cursor_query_param in params
+
+
+def get_paginator(request, keyset_ordering=None, pagination_class=StandardPagination):
+    """`pagination_class`, or KeysetPagination on `keyset_ordering` when the request opts in."""
+    if keyset_ordering and wants_keyset(request):
+        return KeysetPagination(keyset_ordering)
+    return pagination_class()
+
+
+def paginate_queryset(request, queryset, serializer_class, keyset_ordering=None, pagination_class=StandardPagination):
     """Helper for paginating function-based views."""
-    paginator = StandardPagination()
+    paginator = get_paginator(request, keyset_ordering, pagination_class)
     page = paginator.paginate_queryset(queryset, request)
     if page is not None:
         serializer = serializer_class(page, many=True)
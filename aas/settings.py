@@ -127,6 +127,11 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 50,
 }
 
+# EstimatedCountPagination: above this many rows (planner estimate) the count
+# is the estimate instead of COUNT(*); either is cached per query for the TTL
+PAGINATION_ESTIMATE_THRESHOLD = int(os.getenv('PAGINATION_ESTIMATE_THRESHOLD', '50000'))
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', '30'))  # seconds
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -158,6 +163,78 @@ HAARCASCADE_FILE_PATH = BASE_DIR / 'models' / 'haarcascade_frontalface_default.x
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_REKOGNITION_REGION = os.getenv('AWS_REKOGNITION_REGION')
+# One pooled client per process is shared by all gthread workers (4 threads each)
+AWS_REKOGNITION_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_REKOGNITION_MAX_POOL_CONNECTIONS', '10'))
+
+# 'rekognition' (AWS) or 'local' (on-box OpenCV engine), or a dotted class path
+FACE_VERIFICATION_BACKEND = os.getenv('FACE_VERIFICATION_BACKEND', 'rekognition')
+FACE_REKOGNITION_SIMILARITY_THRESHOLD = float(os.getenv('FACE_REKOGNITION_SIMILARITY_THRESHOLD', '95'))
+FACE_LOCAL_SIMILARITY_THRESHOLD = float(os.getenv('FACE_LOCAL_SIMILARITY_THRESHOLD', '85'))
+# Per-process LRU of precomputed reference face templates (employees)
+FACE_REFERENCE_CACHE_SIZE = int(os.getenv('FACE_REFERENCE_CACHE_SIZE', '2048'))
+
+# 'sync' verifies inside the punch request; 'async' records the punch as Pending
+# and leaves the comparison to `manage.py run_verification_workers`
+FACE_VERIFICATION_MODE = os.getenv('FACE_VERIFICATION_MODE', 'sync')
+FACE_VERIFICATION_JOB_TIMEOUT = int(os.getenv('FACE_VERIFICATION_JOB_TIMEOUT', '300'))  # seconds before a stuck job is retried
+FACE_VERIFICATION_MAX_ATTEMPTS = int(os.getenv('FACE_VERIFICATION_MAX_ATTEMPTS', '3'))
+
+# Punch selfie pre-processing (before verification and storage)
+SELFIE_PREPROCESS_ENABLED = os.getenv('SELFIE_PREPROCESS_ENABLED', 'True') == 'True'
+SELFIE_MAX_DIMENSION = int(os.getenv('SELFIE_MAX_DIMENSION', '1024'))
+SELFIE_FACE_CROP = os.getenv('SELFIE_FACE_CROP', 'True') == 'True'
+SELFIE_FACE_MARGIN = float(os.getenv('SELFIE_FACE_MARGIN', '0.5'))  # fraction of face size kept around the face
+SELFIE_JPEG_QUALITY = int(os.getenv('SELFIE_JPEG_QUALITY', '85'))
+
+# How long a punch Idempotency-Key (and its stored response) is honoured, in seconds
+PUNCH_IDEMPOTENCY_TTL = int(os.getenv('PUNCH_IDEMPOTENCY_TTL', '86400'))
+
+# ------------------------------------------------------------------------------
+# GEOFENCE
+# ------------------------------------------------------------------------------
+# In-memory outlet geofence index (main.geofence); ~0.05 deg is about 5.5 km per cell
+GEOFENCE_CELL_DEGREES = float(os.getenv('GEOFENCE_CELL_DEGREES', '0.05'))
+# Full rebuild interval, so outlet edits made in other worker processes are picked up
+GEOFENCE_INDEX_TTL = int(os.getenv('GEOFENCE_INDEX_TTL', '300'))
+
+# ------------------------------------------------------------------------------
+# FILE IMPORTS
+# ------------------------------------------------------------------------------
+# CSV/XLSX imports (attendance.imports) run in `manage.py run_import_workers`;
+# each chunk of rows is validated and written in one transaction
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_JOB_TIMEOUT = int(os.getenv('IMPORT_JOB_TIMEOUT', '600'))  # seconds without a written chunk before a job is resumed elsewhere
+IMPORT_MAX_ATTEMPTS = int(os.getenv('IMPORT_MAX_ATTEMPTS', '3'))
+IMPORT_MAX_FILE_SIZE = int(os.getenv('IMPORT_MAX_FILE_SIZE', str(100 * 1024 * 1024)))  # bytes
+
+# ------------------------------------------------------------------------------
+# CACHE
+# ------------------------------------------------------------------------------
+# Report dashboard responses (report.dashboard_cache). The file backend is shared
+# by all gunicorn workers of a container, so change-driven invalidation reaches
+# every worker; LocMemCache is per-process and only suits a single worker.
+DASHBOARD_CACHE_ALIAS = 'dashboard'
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))  # seconds; 0 disables
+# Users' groups and outlet ids (main.access), shared the same way so version
+# bumps on group/outlet changes reach every worker; own location so culling
+# of dashboard entries can't evict the version keys
+ACCESS_SCOPE_CACHE_ALIAS = 'access'
+ACCESS_SCOPE_CACHE_TTL = int(os.getenv('ACCESS_SCOPE_CACHE_TTL', '300'))  # seconds; 0 disables
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    DASHBOARD_CACHE_ALIAS: {
+        'BACKEND': os.getenv('DASHBOARD_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('DASHBOARD_CACHE_LOCATION', '/tmp/aas_dashboard_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    ACCESS_SCOPE_CACHE_ALIAS: {
+        'BACKEND': os.getenv('ACCESS_SCOPE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('ACCESS_SCOPE_CACHE_LOCATION', '/tmp/aas_access_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
 
 
 TEMPLATES = [
@@ -130,6 +130,7 @@ urlpatterns = [
     # ATTENDANCE
     # -----------------
     path('api/attendance/all/', views.AllAttendanceRecordsView.as_view(), name='all_attendance_records'),
+    path('api/attendance/all/export/', views.AllAttendanceRecordsExportView.as_view(), name='all_attendance_records_export'),
     path('api/attendance/', include('attendance.apiurls')),
     path('attendance/', include('attendance.urls')),
 
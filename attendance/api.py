@@ -7,12 +7,28 @@ from main.serializers import EmpLeaveSerializer, HolidaySerializer, AttendanceSe
 from django.db.models import Q
 from datetime import datetime, timedelta, date
 from rest_framework import status
-from main.utils import verify_location
 import logging
 from rest_framework.views import APIView
-from .face_recognition import compare_faces
+from .face_verification import get_face_verifier
+from .reference_faces import get_reference_template
+from .verification_queue import is_async_verification, enqueue_verification, queue_metrics
+from .face_recognition import get_rekognition_stats
+from .selfie_pipeline import preprocess_selfie
+from .punch_context import load_punch_context, punch_point
+from .punch_events import store_punch_selfie, punch_device, record_punch_event
+from .idempotency import idempotent
+from .daily_report import COLUMNS as REPORT_COLUMNS, build_daily_report, iter_daily_report
+from .listing import attendance_list_response, outlet_attendance
+from .imports import create_import_job, import_columns, import_job_status, iter_error_rows
+from .models import ImportJob
+from main.leave_balance import get_balance, leave_types_with_balance
+from main.leave_ingest import ingest_leaves
+from main.attendance_ingest import manual_attendance, upsert_attendance
+from main.access import get_access_scope
+from django.db import transaction
 from django.conf import settings
 from dateutil import parser
+from aas.exports import export_format, streaming_export
 
 
 
@@ -21,15 +37,19 @@ logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('punch_in')
 def punch_in(request):
     try:
         try:
-            employee = request.user.employee
-        except:
+            # Employee, open session, today's leave and the location check in one query
+            point = punch_point(request.data, 'check_in_lat', 'check_in_long')
+            context = load_punch_context(request.user, point)
+        except Employee.DoesNotExist:
             return Response(
                 {"error": "Employee profile not found for this user"},
                 status=status.HTTP_403_FORBIDDEN
             )
+        employee = context.employee
         data = request.data
 
         if not all(field in data for field in ['check_in_lat', 'check_in_long']):
@@ -38,12 +58,7 @@ def punch_in(request):
         if 'photo_check_in' not in request.FILES:
             return Response({"error": "Photo is required for punch-in"}, status=status.HTTP_400_BAD_REQUEST)
 
-        open_attendance = Attendance.objects.filter(
-            employee=employee,
-            check_out_time__isnull=True
-        ).last()
-
-        if open_attendance:
+        if context.open_attendance_id:
             return Response({"error": "You must punch out from your previous session before punching in again"}, status=400)
         
         try:
@@ -57,78 +72,84 @@ def punch_in(request):
 
         photo_file = request.FILES.get('photo_check_in')
 
-        if not verify_location(employee, check_in_lat, check_in_long):
+        if not context.at_own_outlet:
             return Response(
                 {"error": "You're not at an allowed location for punch-in"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
+        # Downscale/crop/re-encode once; the smaller file is verified and stored
+        photo_file, selfie_report = preprocess_selfie(photo_file)
+        # Every attempt keeps its own selfie; nothing on the employee row is overwritten
+        selfie = store_punch_selfie(photo_file)
+        device = punch_device(request)
+
         verified_status = 'Pending'
         response_message = "Punch-in recorded successfully!"
+        result = None
+        queue_verification = False
 
         if not employee.reference_photo:
             employee.reference_photo = photo_file
-            employee.punchin_selfie = photo_file
-            employee.save()
+            employee.save(update_fields=['reference_photo', 'updated_at'])
             
             verified_status = 'Pending'
             response_message = "Punch-in recorded. Your photo has been submitted for verification."
 
-        elif employee.reference_photo:
-            # CORRECTED: Use the new field name
-            employee.punchin_selfie = photo_file
-            employee.save()
-            
+        elif is_async_verification():
+            # Record now, compare in the background worker pool
+            queue_verification = True
+            verified_status = 'Pending'
+            response_message = "Punch-in recorded. Face verification is in progress."
+
+        else:
             try:
-                employee.reference_photo.open('rb')
-                employee.punchin_selfie.open('rb')
-                source_bytes = employee.reference_photo.read()
-                target_bytes = employee.punchin_selfie.read()
-                employee.reference_photo.close()
-                employee.punchin_selfie.close()
-                
-                result = compare_faces(
-                    source_bytes=source_bytes,
-                    target_bytes=target_bytes,
-                    aws_access_key=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                    aws_region=settings.AWS_REKOGNITION_REGION
-                )
-
-                if result.get('FaceMatches'):
-                    verified_status = 'Verified'
-                else:
-                    return Response({"error": "Face recognition failed. Please try again."}, status=status.HTTP_400_BAD_REQUEST)
+                photo_file.seek(0)
+                target_bytes = photo_file.read()
+
+                # Precomputed template; no reference photo read on the hot path
+                reference = get_reference_template(employee)
+                result = get_face_verifier().verify(reference, target_bytes)
             
             except Exception as e:
                 logger.error(f"Face comparison error for employee {employee.employee_id}: {str(e)}")
+                record_punch_event(employee, 'punchin', selfie, check_in_lat, check_in_long, device,
+                                   verification_status='Rejected', error=str(e))
                 return Response({"error": "Could not process image. Ensure your face is clearly visible."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the employee has an approved leave on the punch-in date
-        leave_record = EmpLeave.objects.filter(
-            employee=employee,
-            leave_date=timezone.now().date(),
-            status='approved'
-        ).first()
+            if not result.matched:
+                record_punch_event(employee, 'punchin', selfie, check_in_lat, check_in_long, device,
+                                   verification_status='Rejected', result=result)
+                return Response({"error": "Face recognition failed. Please try again."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if leave_record:
-            # Update the leave status to 'rejected' and add a remark
-            leave_record.status = 'rejected'
-            leave_record.remarks = f"Employee punched in on an approved leave day: {timezone.now().date()}"
-            leave_record.save()
-
-            # Notify the reason for rejection
-            response_message = "Punch-in recorded. Leave for this day has been rejected."
+            verified_status = 'Verified'
 
         # Create the attendance record
-        attendance = Attendance.objects.create(
-            employee=employee,
-            date=timezone.now().date(),
-            check_in_time=timezone.now(),
-            check_in_lat=check_in_lat,
-            check_in_long=check_in_long,
-            punchin_verification=verified_status
-        )
+        with transaction.atomic():
+            # Serialise punches of this employee; a concurrent duplicate already opened a session
+            if context.lock():
+                return Response({"error": "You must punch out from your previous session before punching in again"}, status=400)
+
+            # If the employee has an approved leave on the punch-in date, reject it
+            # (with the attendance row: a refused or failed punch keeps the leave)
+            if context.reject_approved_leave():
+                # Notify the reason for rejection
+                response_message = "Punch-in recorded. Leave for this day has been rejected."
+
+            attendance = Attendance.objects.create(
+                employee=employee,
+                date=context.today,
+                check_in_time=timezone.now(),
+                check_in_lat=check_in_lat,
+                check_in_long=check_in_long,
+                punchin_verification=verified_status,
+                verification_notes={'punchin_selfie': selfie_report}
+            )
+            event = record_punch_event(employee, 'punchin', selfie, check_in_lat, check_in_long, device,
+                                       attendance=attendance, verification_status=verified_status, result=result)
+
+            if queue_verification:
+                enqueue_verification(attendance, 'punchin', event)
 
         return Response({
             "message": response_message,
@@ -141,15 +162,18 @@ def punch_in(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('punch_out')
 def punch_out(request):
     try:
         try:
-            employee = request.user.employee
-        except:
+            point = punch_point(request.data, 'check_out_lat', 'check_out_long')
+            context = load_punch_context(request.user, point)
+        except Employee.DoesNotExist:
             return Response(
                 {"error": "Employee profile not found for this user"},
                 status=status.HTTP_403_FORBIDDEN
             )
+        employee = context.employee
 
         data = request.data
 
@@ -164,10 +188,7 @@ def punch_out(request):
         photo_file = request.FILES.get('photo_check_out')
 
         # 3. Check active attendance
-        attendance = Attendance.objects.filter(
-            employee=employee,
-            check_out_time__isnull=True
-        ).last()
+        attendance = context.open_attendance
 
         if not attendance:
             return Response({"error": "No active punch-in session found"}, status=400)
@@ -187,45 +208,72 @@ def punch_out(request):
             )
 
         # 6. Verify location
-        if not verify_location(employee, check_out_lat, check_out_long):
+        if not context.at_own_outlet:
             return Response(
                 {"error": "You're not at an allowed location for punch-out"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 7. Face recognition BEFORE saving selfie
+        photo_file, selfie_report = preprocess_selfie(photo_file)
+        selfie = store_punch_selfie(photo_file)
+        device = punch_device(request)
+        notes = attendance.verification_notes if isinstance(attendance.verification_notes, dict) else {}
+        notes['punchout_selfie'] = selfie_report
+
+        # 7a. Async mode: record the punch-out now and verify in the background
+        if is_async_verification():
+            with transaction.atomic():
+                if context.lock() != attendance.attendance_id:
+                    return Response({"error": "No active punch-in session found"}, status=400)
+
+                attendance.check_out_time = timezone.now()
+                attendance.check_out_lat = check_out_lat
+                attendance.check_out_long = check_out_long
+                attendance.punchout_verification = "Pending"
+                attendance.verification_notes = notes
+                attendance.save()
+                event = record_punch_event(employee, 'punchout', selfie, check_out_lat, check_out_long, device,
+                                           attendance=attendance)
+                enqueue_verification(attendance, 'punchout', event)
+
+            return Response({
+                "message": "Punch-out recorded. Face verification is in progress.",
+                "data": AttendanceSerializer(attendance).data
+            }, status=200)
+
+        # 7. Face recognition BEFORE closing the session
         try:
-            employee.reference_photo.open('rb')
-            source_bytes = employee.reference_photo.read()
-            employee.reference_photo.close()
-
-            target_bytes = photo_file.read()  # Read directly without saving first
-
-            result = compare_faces(
-                source_bytes=source_bytes,
-                target_bytes=target_bytes,
-                aws_access_key=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                aws_region=settings.AWS_REKOGNITION_REGION
-            )
+            photo_file.seek(0)
+            target_bytes = photo_file.read()
 
-            if not result.get('FaceMatches'):
-                return Response({"error": "Face recognition failed. Please try again."}, status=401)
+            reference = get_reference_template(employee)
+            result = get_face_verifier().verify(reference, target_bytes)
 
         except Exception as e:
             logger.error(f"Face comparison error during punch-out for employee {employee.employee_id}: {str(e)}")
+            record_punch_event(employee, 'punchout', selfie, check_out_lat, check_out_long, device,
+                               verification_status='Rejected', error=str(e))
             return Response({"error": "Could not process image. Ensure your face is clearly visible."}, status=400)
 
-        # 8. Only save selfie AFTER verification passes
-        employee.punchout_selfie = photo_file
-        employee.save()
-
-        # 9. Save attendance details
-        attendance.check_out_time = timezone.now()
-        attendance.check_out_lat = check_out_lat
-        attendance.check_out_long = check_out_long
-        attendance.punchout_verification = "Verified"
-        attendance.save()
+        if not result.matched:
+            record_punch_event(employee, 'punchout', selfie, check_out_lat, check_out_long, device,
+                               verification_status='Rejected', result=result)
+            return Response({"error": "Face recognition failed. Please try again."}, status=401)
+
+        # 8. Save attendance details and the accepted punch event
+        with transaction.atomic():
+            # Serialise punches of this employee; a concurrent duplicate may have closed the session
+            if context.lock() != attendance.attendance_id:
+                return Response({"error": "No active punch-in session found"}, status=400)
+
+            attendance.check_out_time = timezone.now()
+            attendance.check_out_lat = check_out_lat
+            attendance.check_out_long = check_out_long
+            attendance.punchout_verification = "Verified"
+            attendance.verification_notes = notes
+            attendance.save()
+            record_punch_event(employee, 'punchout', selfie, check_out_lat, check_out_long, device,
+                               attendance=attendance, verification_status='Verified', result=result)
 
         return Response({
             "message": "Punch-out recorded successfully!",
@@ -241,6 +289,22 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 
+# GET /attendance/verification-queue - Async verification queue depth/lag (Manager/Admin)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def verification_queue_status(request):
+    scope = get_access_scope(request)
+    if not (scope.is_staff or scope.is_manager):
+        return Response({"message": "You are not authorized to view this information."}, status=403)
+
+    return Response({
+        "mode": settings.FACE_VERIFICATION_MODE,
+        "backend": settings.FACE_VERIFICATION_BACKEND,
+        "queue": queue_metrics(),
+        "rekognition": get_rekognition_stats(),
+    })
+
+
 # GET /attendance/me - Get logged-in user's attendance
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -264,41 +328,23 @@ def get_my_attendance(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_outlet_attendance(request):
-    employee = request.user.employee
-    if not request.user.groups.filter(name="Manager").exists(): 
+    """
+    Attendance of the staff of the manager's outlets, newest first, in keyset
+    pages (?cursor=, ?page_size=); optional ?start_date / ?end_date.
+    """
+    scope = get_access_scope(request)
+    if not scope.is_manager:
         return Response({"message": "You are not authorized to view this information."}, status=403)
-    
-    outlet_staff = Employee.objects.filter(outlets__in=employee.outlets.all()).distinct()
-    attendance = Attendance.objects.filter(employee__in=outlet_staff).order_by('-date')
 
-    data = [{
-        'employee': att.employee.fullname,
-        'date': att.date,
-        'check_in_time': att.check_in_time,
-        'check_out_time': att.check_out_time,
-        'status': att.status,
-        'worked_hours': att.worked_hours,
-    } for att in attendance]
-
-    return Response(data)
+    return attendance_list_response(request, outlet_attendance(scope.outlet_ids))
 
 
 # GET /attendance/all - Get all attendance records (Admin)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def get_all_attendance(request):
-    attendance = Attendance.objects.all().order_by('-date')
-
-    data = [{
-        'employee': att.employee.fullname,
-        'date': att.date,
-        'check_in_time': att.check_in_time,
-        'check_out_time': att.check_out_time,
-        'status': att.status,
-        'worked_hours': att.worked_hours,
-    } for att in attendance]
-
-    return Response(data)
+    """All attendance, newest first, in keyset pages; optional ?start_date / ?end_date."""
+    return attendance_list_response(request, Attendance.objects.all())
 
 
 @api_view(['POST'])
@@ -431,7 +477,7 @@ def update_attendance_status(request, id):
     except Attendance.DoesNotExist:
         return Response({"message": "Attendance record not found."}, status=404)
 
-    if not (request.user.groups.filter(name="Manager").exists()):
+    if not get_access_scope(request).is_manager:
         return Response({"message": "You are not authorized to update the status."}, status=403)
 
     status = request.data.get('status')
@@ -462,22 +508,18 @@ class LeaveRequestAPIView(APIView):
         except LeaveType.DoesNotExist:
             return Response({'error': 'Invalid leave_type.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        created = []
+        parsed_dates = []
         for date_str in leave_dates:
             try:
-                leave_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                obj = EmpLeave.objects.create(
-                    employee=employee,
-                    leave_date=leave_date,
-                    leave_type=leave_type,
-                    remarks=remarks,
-                    status='pending'
-                )
-                created.append(obj.leave_refno)
+                parsed_dates.append(datetime.strptime(date_str, "%Y-%m-%d").date())
             except ValueError:
                 return Response({'error': f'Invalid date format: {date_str}'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'message': 'Leave requests submitted.', 'created_ids': created}, status=status.HTTP_201_CREATED)
+        results = ingest_leaves([employee.employee_id], parsed_dates, leave_type, status='pending', remarks=remarks)
+        created = [r['leave_refno'] for r in results if r['created']]
+        skipped = [{'leave_date': r['leave_date'], 'error': r['error']} for r in results if not r['created']]
+
+        return Response({'message': 'Leave requests submitted.', 'created_ids': created, 'skipped': skipped}, status=status.HTTP_201_CREATED)
     
 @api_view(['GET'])
 def my_leave_requests(request):
@@ -494,10 +536,10 @@ def all_leave_requests(request):
 
 @api_view(['GET'])
 def leave_requests_by_outlet(request):
-    user = request.user
+    scope = get_access_scope(request)
 
     # Check if user is a manager
-    if not user.groups.filter(name="Manager").exists():
+    if not scope.is_manager:
         return Response({"detail": "Access denied. User is not a manager."}, status=403)
 
     outlet_id = request.query_params.get('outlet_id')
@@ -510,12 +552,11 @@ def leave_requests_by_outlet(request):
         return Response({"detail": "Invalid outlet_id."}, status=400)
 
     # Check user has an employee profile
-    employee = getattr(user, 'employee', None)
-    if not employee:
+    if scope.employee_id is None:
         return Response({"detail": "Employee profile not found."}, status=404)
 
     # Check outlet access
-    if not employee.outlets.filter(id=outlet_id).exists():
+    if not scope.has_outlet(outlet_id):
         return Response({"detail": "You are not assigned to this outlet."}, status=403)
 
     # Filter leave requests for employees in that outlet
@@ -526,29 +567,15 @@ def leave_requests_by_outlet(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def pending_leave_requests(request):
-    user = request.user
-    employee = user.employee
-
-    today = date.today()
+    employee = request.user.employee
     result = []
 
-    # Fetch all active leave types
-    leave_types = LeaveType.objects.filter(active=True)
+    # Active leave types with this employee's ledger row for the configured leave year, in one query
+    leave_types = leave_types_with_balance(employee.pk, LeaveType.objects.filter(active=True))
 
     for leave_type in leave_types:
-        # Get the year range from leave type
-        start_date = leave_type.year_start_date
-        end_date = leave_type.year_end_date
-
-        # Get count of used leaves (pending + approved) in the year range
-        used_count = EmpLeave.objects.filter(
-            employee=employee,
-            leave_type=leave_type,
-            status__in=['pending', 'approved'],
-            leave_date__range=(start_date, end_date)
-        ).count()
-
-        allowed = leave_type.att_type_no_of_days_in_year
+        allowed = leave_type.att_type_no_of_days_in_year if leave_type.balance_allowed is None else leave_type.balance_allowed
+        used_count = (leave_type.balance_pending or 0) + (leave_type.balance_approved or 0)
         remaining = max(allowed - used_count, 0)
 
         result.append({
@@ -570,16 +597,12 @@ def update_leave_status(request, id):
         return Response({"message": "Leave request not found."}, status=404)
 
     user = request.user
+    scope = get_access_scope(request)
 
-    is_admin = user.is_staff or user.is_superuser
-    is_manager = user.groups.filter(name="Manager").exists()
-    same_outlet = (
-        hasattr(user, 'employee') and
-        leave_request.employee.outlets.filter(id__in=user.employee.outlets.values_list('id', flat=True)).exists()
-    )
-
+    # employee__outlets is prefetched: no query for the outlet check
+    same_outlet = scope.shares_outlet(outlet.id for outlet in leave_request.employee.outlets.all())
 
-    if not (is_admin or (is_manager and same_outlet)):
+    if not (scope.is_admin or (scope.is_manager and same_outlet)):
         return Response({"message": "You are not authorized to update this leave request."}, status=403)
 
     new_status = request.data.get('status')
@@ -590,9 +613,18 @@ def update_leave_status(request, id):
     leave_request.status = new_status
     leave_request.action_date = timezone.now().date()
     leave_request.action_user = user
-    leave_request.save()
-
-    return Response({"message": f"Leave request {new_status}."}, status=200)
+    leave_request.save()  # moves the leave-balance ledger in the same transaction
+
+    response = {"message": f"Leave request {new_status}."}
+    if leave_request.leave_type_id:
+        balance = get_balance(leave_request.employee_id, leave_request.leave_type, leave_request.leave_date)
+        response["balance"] = {
+            "allowed": balance.allowed,
+            "pending": balance.pending,
+            "approved": balance.approved,
+            "remaining": balance.remaining,
+        }
+    return Response(response, status=200)
 
 
 @api_view(['GET'])
@@ -605,7 +637,7 @@ def list_holidays(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_holiday(request):
-    if not (request.user.groups.filter(name="Manager").exists()):
+    if not get_access_scope(request).is_manager:
         return Response({"detail": "Not authorized."}, status=403)
 
     serializer = HolidaySerializer(data=request.data)
@@ -617,7 +649,7 @@ def add_holiday(request):
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_holiday(request, hcode):
-    if not (request.user.groups.filter(name="Admin").exists()):
+    if not get_access_scope(request).in_group("Admin"):
         return Response({"detail": "Not authorized."}, status=403)
 
     holiday = Holiday.objects.filter(hcode=hcode).first()
@@ -633,7 +665,7 @@ def update_holiday(request, hcode):
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_holiday(request, hcode):
-    if not (request.user.groups.filter(name="Admin").exists()):
+    if not get_access_scope(request).in_group("Admin"):
         return Response({"detail": "Not authorized."}, status=403)
 
     holiday = Holiday.objects.filter(hcode=hcode).first()
@@ -643,8 +675,8 @@ def delete_holiday(request, hcode):
     return Response({"message": "Holiday deleted."}, status=204)
 
 
-@api_view(['GET'])
-def generate_report(request):
+def _report_scope(request):
+    """(employees, start_date, end_date) for the report query params, or an error Response."""
     # Required date range
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date') or start_date_str
@@ -665,58 +697,47 @@ def generate_report(request):
     # Filter employees
     employees = Employee.objects.all()
     if user_id:
-        employees = employees.filter(id=user_id)
+        employees = employees.filter(user_id=user_id)
     if outlet:
         employees = employees.filter(outlets=outlet)
+    return employees, start_date, end_date
 
-    report = []
-
-    # Loop through each day and employee
-    current_date = start_date
-    while current_date <= end_date:
-        for employee in employees:
-            attendance = Attendance.objects.filter(employee=employee, date=current_date).first()
-            leave = None if attendance else EmpLeave.objects.filter(
-                employee=employee, leave_date=current_date, leave_status="Approved"
-            ).first()
-            holiday = Holiday.objects.filter(hdate=current_date).first()
-
-            row = {
-                "emp_id": employee.emp_id,
-                "designation": employee.role.designation if hasattr(employee, 'role') else '',
-                "id_no": employee.id_no,
-                "name": employee.name,
-                "date": current_date,
-                "time_in": attendance.time_in if attendance else '',
-                "time_out": attendance.time_out if attendance else '',
-                "type": (
-                    'WD' if attendance else
-                    (leave.leave_type if leave else '')
-                ),
-                "type_name": (
-                    "" if attendance else
-                    (leave.leave_type if leave else '')
-                ),
-                "hcode": holiday.hcode if holiday else '',
-                "htype": holiday.holiday_type if holiday else '',
-                "hname": holiday.holiday_name if holiday else '',
-                "agency": employee.agency
-            }
 
-            report.append(row)
-        current_date += timedelta(days=1)
+@api_view(['GET'])
+def generate_report(request):
+    scope = _report_scope(request)
+    if isinstance(scope, Response):
+        return scope
+
+    # One query per table for the whole range, joined in memory
+    report = build_daily_report(*scope)
 
     return Response(report)
 
 
+@api_view(['GET'])
+def export_report(request):
+    """generate_report as a streamed CSV/XLSX download (?file_format=csv|xlsx)."""
+    scope = _report_scope(request)
+    if isinstance(scope, Response):
+        return scope
+    file_format = export_format(request)
+    if file_format is None:
+        return Response({"detail": "file_format must be csv or xlsx."}, status=400)
+
+    employees, start_date, end_date = scope
+    rows = ([row[c] for c in REPORT_COLUMNS] for row in iter_daily_report(employees, start_date, end_date))
+    return streaming_export(f"attendance_report_{start_date}_{end_date}", REPORT_COLUMNS, rows, file_format)
+
+
 class VerifyAttendanceView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        user = request.user
+        scope = get_access_scope(request)
         
         # --- Permission Check: Ensure user is a Manager or Admin ---
-        if not (user.is_staff or user.groups.filter(name="Manager").exists()):
+        if not (scope.is_staff or scope.is_manager):
             return Response(
                 {"error": "You do not have permission to perform this action."},
                 status=status.HTTP_403_FORBIDDEN
@@ -745,9 +766,8 @@ class VerifyAttendanceView(APIView):
             attendance = Attendance.objects.select_related('employee').get(attendance_id=attendance_id)
             
             # Security Check: Can this manager see this employee?
-            if user.groups.filter(name="Manager").exists():
-                manager_outlets = user.employee.outlets.all()
-                if not attendance.employee.outlets.filter(id__in=manager_outlets.values_list('id', flat=True)).exists():
+            if scope.is_manager:
+                if not attendance.employee.outlets.filter(id__in=scope.outlet_ids).exists():
                     return Response({"error": "You are not authorized to verify this employee's attendance."}, status=status.HTTP_403_FORBIDDEN)
 
             # Update the correct field
@@ -760,6 +780,11 @@ class VerifyAttendanceView(APIView):
                 attendance.verification_notes = notes
                 
             attendance.save()
+            # Keep the punch history in line with the manual decision
+            attendance.punch_events.filter(kind=verification_type).update(
+                verification_status=new_status,
+                verified_at=timezone.now()
+            )
             
             # Return the updated record
             serializer = AttendanceSerializer(attendance)
@@ -836,8 +861,6 @@ def bulk_add_attendance(request):
                 {"error": "The selected outlet does not have location data."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        outlet_lat = outlet.latitude
-        outlet_long = outlet.longitude
     except Outlet.DoesNotExist:
         return Response({"error": "Outlet not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -856,11 +879,6 @@ def bulk_add_attendance(request):
     failed_updates = []
     leave_updates = []  # To store employees who have approved leave on the given day
 
-    delta = check_out_dt - check_in_dt
-    worked_hours = round(delta.total_seconds() / 3600, 2)
-    ot_hours = max(0, worked_hours - 8)
-    status_val = 'Present' if worked_hours >= 4 else 'Half Day'
-
     notes = {
         'manual_bulk_add': {
             "updated_by": request.user.username,
@@ -868,53 +886,18 @@ def bulk_add_attendance(request):
         }
     }
 
-    # Find which employees exist from the provided list
-    existing_employees = Employee.objects.filter(employee_id__in=employee_ids)
-    existing_employee_ids = {emp.employee_id for emp in existing_employees}
-
-    # Determine which IDs were not found
-    for emp_id in employee_ids:
-        if emp_id not in existing_employee_ids:
-            failed_updates.append({"employee_id": emp_id, "error": "Employee not found."})
-
-    # Process only the employees that were found
-    for employee in existing_employees:
-        # Check if the employee has an approved leave on the attendance date
-        leave_exists = EmpLeave.objects.filter(
-            employee=employee,
-            leave_date=attendance_date,
-            status='approved'
-        ).exists()
-
-        if leave_exists:
-            leave_updates.append({
-                "employee_id": employee.employee_id,
-                "error": "Employee has an approved leave on this date."
-            })
-            continue  # Skip attendance creation for this employee
-
-        try:
-            Attendance.objects.update_or_create(
-                employee=employee,
-                date=attendance_date,
-                defaults={
-                    'check_in_time': check_in_dt,
-                    'check_out_time': check_out_dt,
-                    'worked_hours': worked_hours,
-                    'ot_hours': ot_hours,
-                    'status': status_val,
-                    'check_in_lat': outlet_lat,
-                    'check_in_long': outlet_long,
-                    'check_out_lat': outlet_lat,
-                    'check_out_long': outlet_long,
-                    'punchin_verification': 'Verified',
-                    'punchout_verification': 'Verified',
-                    'verification_notes': notes
-                }
-            )
-            successful_updates.append(employee.employee_id)
-        except Exception as e:
-            failed_updates.append({"employee_id": employee.employee_id, "error": str(e)})
+    # One upsert for the whole list: a constant number of queries
+    results = upsert_attendance(
+        manual_attendance(employee_id, attendance_date, check_in_dt, check_out_dt, outlet, notes)
+        for employee_id in dict.fromkeys(employee_ids)
+    )
+    for result in results:
+        if result["result"]:
+            successful_updates.append(result["employee_id"])
+        elif result["on_leave"]:
+            leave_updates.append({"employee_id": result["employee_id"], "error": result["error"]})
+        else:
+            failed_updates.append({"employee_id": result["employee_id"], "error": result["error"]})
 
     return Response({
         "message": f"Bulk operation completed. {len(successful_updates)} records processed.",
@@ -956,41 +939,73 @@ def bulk_add_leave(request):
     successful_adds = []
     failed_adds = []
     
-    # Fetch all employees to process
-    employees_to_process = Employee.objects.filter(employee_id__in=employee_ids)
-    
-    # Get a set of (employee_id, leave_date) for existing leaves to check for duplicates efficiently
-    existing_leaves = EmpLeave.objects.filter(
-        employee_id__in=employee_ids,
-        leave_date=leave_date,
-        status__in=['pending', 'approved']
-    ).values_list('employee_id', flat=True)
-    existing_leave_set = set(existing_leaves)
-
-    for employee in employees_to_process:
-        if employee.employee_id in existing_leave_set:
-            failed_adds.append({
-                "employee_id": employee.employee_id,
-                "error": "An active leave already exists for this date."
-            })
-            continue
-
-        try:
-            EmpLeave.objects.create(
-                employee=employee,
-                leave_date=leave_date,
-                leave_type=leave_type,
-                remarks=remarks,
-                status='approved',  # Approve directly since it's a manual add
-                action_user=request.user,
-                action_date=timezone.now()
-            )
-            successful_adds.append(employee.employee_id)
-        except Exception as e:
-            failed_adds.append({"employee_id": employee.employee_id, "error": str(e)})
+    # Unknown employees are reported; the rest go in one set-based insert
+    found_ids = set(Employee.objects.filter(employee_id__in=employee_ids).values_list('employee_id', flat=True))
+    for employee_id in employee_ids:
+        if employee_id not in found_ids:
+            failed_adds.append({"employee_id": employee_id, "error": "Employee not found."})
+
+    results = ingest_leaves(
+        [employee_id for employee_id in dict.fromkeys(employee_ids) if employee_id in found_ids],
+        [leave_date], leave_type,
+        status='approved',  # Approve directly since it's a manual add
+        remarks=remarks, action_user=request.user, action_date=timezone.now(),
+    )
+    for result in results:
+        if result["created"]:
+            successful_adds.append(result["employee_id"])
+        else:
+            failed_adds.append({"employee_id": result["employee_id"], "error": result["error"]})
 
     return Response({
         "message": f"Bulk leave operation completed. {len(successful_adds)} leaves added.",
         "successful_adds": successful_adds,
         "failed_adds": failed_adds
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+# POST /attendance/imports - Upload a CSV/XLSX of attendance, leave or employee rows (Admin)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def create_import(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"error": "file is required."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        job = create_import_job(upload, request.data.get('kind'), request.user)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(import_job_status(job), status=status.HTTP_202_ACCEPTED)
+
+
+# GET /attendance/imports/<id> - Import progress
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def import_status(request, id):
+    job = ImportJob.objects.filter(pk=id).first()
+    if job is None:
+        return Response({"error": "Import not found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(import_job_status(job))
+
+
+# GET /attendance/imports/<id>/errors?file_format=csv|xlsx - Rejected rows, re-importable once fixed
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def import_errors(request, id):
+    job = ImportJob.objects.filter(pk=id).first()
+    if job is None:
+        return Response({"error": "Import not found."}, status=status.HTTP_404_NOT_FOUND)
+    file_format = export_format(request)
+    if file_format is None:
+        return Response({"detail": "file_format must be csv or xlsx."}, status=400)
+    header = ['row', 'error'] + import_columns(job.kind)
+    return streaming_export(f"import_{job.id}_errors", header, iter_error_rows(job), file_format)
+
+
+# POST /attendance/imports/<id>/retry - Queue a failed import for one more attempt; it resumes after its last written chunk
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def retry_import(request, id):
+    updated = ImportJob.objects.filter(pk=id, status='failed').update(status='queued', finished_at=None)
+    if not updated:
+        return Response({"error": "No failed import with this id."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(import_job_status(ImportJob.objects.get(pk=id)))
@@ -5,6 +5,7 @@ from . import api  # Import views from the current app
 urlpatterns = [
     path('punch-in/', api.punch_in, name='punch_in'),
     path('punch-out/', api.punch_out, name='punch_out'),
+    path('verification-queue/', api.verification_queue_status, name='verification_queue_status'),
     path('me/', api.get_my_attendance, name='get_my_attendance'),
     path('outlet/', api.get_outlet_attendance, name='get_outlet_attendance'),
     path('get_attall/', api.get_all_attendance, name='get_all_attendance'),
@@ -17,9 +18,14 @@ urlpatterns = [
     path('pendingleave/', api.pending_leave_requests, name='pending_leave_requests'),
     path('updateleavestatus/<int:id>/', api.update_leave_status, name='update_leave_status'),
     path('report/', api.generate_report, name='generate-report'),
+    path('report/export/', api.export_report, name='export-report'),
     path('verify/', api.VerifyAttendanceView.as_view(), name='verify-attendance'),
     path('update/', api.update_attendance, name='update_attendance'),
     path("addleave/", api.add_leave, name="add_leave_by_maanger"),
     path('bulk-add/', api.bulk_add_attendance, name='bulk-add-attendance'),
     path('bulk-addleave/', api.bulk_add_leave, name='bulk-add-leave'),
+    path('imports/', api.create_import, name='create-import'),
+    path('imports/<int:id>/', api.import_status, name='import-status'),
+    path('imports/<int:id>/errors/', api.import_errors, name='import-errors'),
+    path('imports/<int:id>/retry/', api.retry_import, name='retry-import'),
 ]
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Set-based engine behind `generate_report`: one row per (day, employee) with
+attendance, approved leave and holiday columns.
+
+Each table is read once for the whole range and joined in memory on
+(employee_id, date), so the query count does not grow with the number of
+days or employees.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Prefetch
+
+from main.models import Attendance, EmpLeave, Holiday, Outlet, Role
+
+COLUMNS = (
+    "emp_id", "designation", "id_no", "name", "date", "time_in", "time_out",
+    "type", "type_name", "hcode", "htype", "hname", "agency",
+)
+
+
+def _designations(employee_ids):
+    # Employee.user -> group -> Role; the first role found per user
+    designations = {}
+    rows = (
+        Role.objects
+        .filter(group__user__employee__in=employee_ids)
+        .order_by('group__user__id', 'id')
+        .values_list('group__user__id', 'designation')
+    )
+    for user_id, designation in rows:
+        designations.setdefault(user_id, designation)
+    return designations
+
+
+def _by_day(rows):
+    """(day, {employee_id: values of the first row}) per day, from rows ordered by day."""
+    for day, group in groupby(rows, key=itemgetter(1)):
+        first = {}
+        for employee_id, _, *values in group:
+            first.setdefault(employee_id, tuple(values))
+        yield day, first
+
+
+def _attendance_days(employee_ids, start_date, end_date):
+    # Earliest session of each employee-day
+    rows = (
+        Attendance.objects
+        .filter(employee_id__in=employee_ids, date__range=(start_date, end_date))
+        .order_by('date', 'check_in_time', 'attendance_id')
+        .values_list('employee_id', 'date', 'check_in_time', 'check_out_time')
+    )
+    return _by_day(rows.iterator(chunk_size=5000))
+
+
+def _approved_leave_days(employee_ids, start_date, end_date):
+    rows = (
+        EmpLeave.objects
+        .filter(employee_id__in=employee_ids, leave_date__range=(start_date, end_date), status='approved')
+        .order_by('leave_date', 'leave_refno')
+        .values_list('employee_id', 'leave_date', 'leave_type__att_type', 'leave_type__att_type_name')
+    )
+    return _by_day(rows.iterator(chunk_size=5000))
+
+
+class _DayCursor:
+    """Walks a _by_day() stream in step with the report's calendar."""
+
+    def __init__(self, days):
+        self._days = days
+        self._next = next(days, None)
+
+    def take(self, day):
+        if self._next is None or self._next[0] != day:
+            return {}
+        values = self._next[1]
+        self._next = next(self._days, None)
+        return values
+
+
+def _holidays(start_date, end_date):
+    holidays = {}
+    for holiday in Holiday.objects.filter(hdate__range=(start_date, end_date)).order_by('hdate', 'id'):
+        holidays.setdefault(holiday.hdate, holiday)
+    return holidays
+
+
+def iter_daily_report(employees, start_date, end_date):
+    """
+    Yields the report rows for `employees` (a queryset) from start_date to
+    end_date, day by day, employees in id order within a day. Attendance
+    and leaves are streamed in date order alongside, so only one day of
+    them is held in memory.
+    """
+    employees = list(
+        employees
+        .order_by('employee_id')
+        .prefetch_related(Prefetch('outlets', queryset=Outlet.objects.select_related('agency')))
+    )
+    employee_ids = [employee.pk for employee in employees]
+
+    designations = _designations(employee_ids)
+    holidays = _holidays(start_date, end_date)
+
+    # Per-employee columns that don't change from day to day
+    static = {}
+    for employee in employees:
+        agencies = sorted({outlet.agency.name for outlet in employee.outlets.all() if outlet.agency})
+        static[employee.pk] = {
+            "emp_id": employee.empcode,
+            "designation": designations.get(employee.user_id, ''),
+            "id_no": employee.idnumber,
+            "name": employee.fullname,
+            "agency": ", ".join(agencies),
+        }
+
+    attendance_days = _DayCursor(_attendance_days(employee_ids, start_date, end_date))
+    leave_days = _DayCursor(_approved_leave_days(employee_ids, start_date, end_date))
+
+    current_date = start_date
+    while current_date <= end_date:
+        holiday = holidays.get(current_date)
+        attendance = attendance_days.take(current_date)
+        leaves = leave_days.take(current_date)
+        for employee_id in employee_ids:
+            times = attendance.get(employee_id)
+            leave = None if times else leaves.get(employee_id)
+            columns = static[employee_id]
+            yield {
+                "emp_id": columns["emp_id"],
+                "designation": columns["designation"],
+                "id_no": columns["id_no"],
+                "name": columns["name"],
+                "date": current_date,
+                "time_in": times[0] if times else '',
+                "time_out": (times[1] or '') if times else '',
+                "type": 'WD' if times else (leave[0] if leave else ''),
+                "type_name": "" if times else (leave[1] if leave else ''),
+                "hcode": holiday.hcode if holiday else '',
+                "htype": holiday.holiday_type if holiday else '',
+                "hname": holiday.holiday_name if holiday else '',
+                "agency": columns["agency"],
+            }
+        current_date += timedelta(days=1)
+
+
+def build_daily_report(employees, start_date, end_date):
+    """iter_daily_report() as a list."""
+    return list(iter_daily_report(employees, start_date, end_date))
@@ -1,18 +1,73 @@
 # in your_app/face_recognition.py
 
+import threading
+import time
+
 import boto3
 from botocore.config import Config
+from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-def compare_faces(source_bytes, target_bytes, aws_access_key, aws_secret_key, aws_region='us-east-2', similarity_threshold=95):
+# --- Process-wide Rekognition client registry ---
+# boto3 low-level clients are thread-safe once built, but building one goes
+# through a shared session that is not, so creation happens under a lock and
+# every gthread worker thread then reuses the same pooled client.
+_client_lock = threading.Lock()
+_clients = {}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "clients_created": 0,
+    "clients_reused": 0,
+    "calls": 0,
+    "errors": 0,
+    "total_latency_ms": 0.0,
+    "max_latency_ms": 0.0,
+    "last_latency_ms": 0.0,
+}
+
+
+def _record_stat(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def _record_latency(elapsed_ms, failed):
+    with _stats_lock:
+        _stats["calls"] += 1
+        if failed:
+            _stats["errors"] += 1
+        _stats["total_latency_ms"] += elapsed_ms
+        _stats["last_latency_ms"] = elapsed_ms
+        if elapsed_ms > _stats["max_latency_ms"]:
+            _stats["max_latency_ms"] = elapsed_ms
+
+
+def get_rekognition_client(aws_access_key, aws_secret_key, aws_region='us-east-2'):
     """
-    Compares two faces using AWS Rekognition.
-    Accepts image bytes directly.
+    Returns the shared Rekognition client for this region/credential pair,
+    creating it on first use. The client keeps its HTTP connections alive,
+    so later punches skip both client construction and the TLS handshake.
     """
-    try:
-        rekognition = boto3.client(
+    key = (aws_region, aws_access_key, aws_secret_key)
+
+    client = _clients.get(key)
+    if client is not None:
+        _record_stat(clients_reused=1)
+        return client
+
+    with _client_lock:
+        # Another thread may have built it while we waited for the lock
+        client = _clients.get(key)
+        if client is not None:
+            _record_stat(clients_reused=1)
+            return client
+
+        logger.info(f"Creating Rekognition client for region {aws_region}")
+        client = boto3.session.Session().client(
             'rekognition',
             region_name=aws_region,
             aws_access_key_id=aws_access_key,
@@ -20,9 +75,45 @@ def compare_faces(source_bytes, target_bytes, aws_access_key, aws_secret_key, aw
             config=Config(
                 connect_timeout=5,
                 read_timeout=15,
-                retries={'max_attempts': 1}
+                retries={'max_attempts': 1},
+                max_pool_connections=settings.AWS_REKOGNITION_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=True,
             )
         )
+        _clients[key] = client
+        _record_stat(clients_created=1)
+        return client
+
+
+def get_rekognition_stats():
+    """
+    Returns a snapshot of client reuse and per-call latency counters.
+    """
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot["pooled_clients"] = len(_clients)
+    calls = snapshot["calls"]
+    snapshot["avg_latency_ms"] = round(snapshot["total_latency_ms"] / calls, 2) if calls else 0.0
+    return snapshot
+
+
+def reset_rekognition_clients():
+    """
+    Drops all pooled clients, e.g. after rotating AWS credentials.
+    """
+    with _client_lock:
+        _clients.clear()
+
+
+def compare_faces(source_bytes, target_bytes, aws_access_key, aws_secret_key, aws_region='us-east-2', similarity_threshold=95):
+    """
+    Compares two faces using AWS Rekognition.
+    Accepts image bytes directly.
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        rekognition = get_rekognition_client(aws_access_key, aws_secret_key, aws_region)
 
         response = rekognition.compare_faces(
             SourceImage={'Bytes': source_bytes},
@@ -31,6 +122,11 @@ def compare_faces(source_bytes, target_bytes, aws_access_key, aws_secret_key, aw
         )
         return response
     except Exception as e:
+        failed = True
         logger.error(f"AWS Rekognition error: {str(e)}")
         # Re-raise the exception to be handled by the view
-        raise e
\ No newline at end of file
+        raise e
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _record_latency(elapsed_ms, failed)
+        logger.debug(f"Rekognition compare_faces took {elapsed_ms:.1f} ms")
@@ -0,0 +1,224 @@
+import threading
+import time
+import logging
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .utils import detect_largest_face, crop_with_margin
+from .face_recognition import compare_faces
+
+logger = logging.getLogger(__name__)
+
+
+class FaceVerificationError(Exception):
+    """Raised when an image cannot be used for face verification."""
+
+
+class FaceVerificationResult:
+    """
+    Backend-neutral outcome of a face comparison.
+    `similarity` is on a 0-100 scale for every backend.
+    """
+
+    def __init__(self, matched, similarity=None, backend='', latency_ms=None):
+        self.matched = matched
+        self.similarity = similarity
+        self.backend = backend
+        self.latency_ms = latency_ms
+
+    def as_dict(self):
+        return {
+            "matched": self.matched,
+            "similarity": self.similarity,
+            "backend": self.backend,
+            "latency_ms": self.latency_ms,
+        }
+
+
+class BaseFaceVerifier:
+    """
+    Interface every verification backend implements.
+
+    A backend turns a reference photo into a reference template once
+    (`build_reference`) and then matches punch selfies against that
+    template (`match`).
+    """
+    name = ''
+
+    def build_reference(self, image_bytes):
+        return image_bytes
+
+    def match(self, reference, target_bytes):
+        raise NotImplementedError
+
+    def verify(self, reference, target_bytes):
+        started = time.perf_counter()
+        result = self.match(reference, target_bytes)
+        result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def compare(self, source_bytes, target_bytes):
+        return self.verify(self.build_reference(source_bytes), target_bytes)
+
+
+class RekognitionFaceVerifier(BaseFaceVerifier):
+    """
+    AWS Rekognition CompareFaces. The reference template is the reference
+    photo cropped around the face, downscaled and re-encoded as JPEG, which
+    is a fraction of the original upload.
+    """
+    name = 'rekognition'
+
+    REFERENCE_MAX_DIMENSION = 480
+    REFERENCE_FACE_MARGIN = 0.4
+    REFERENCE_JPEG_QUALITY = 90
+
+    def build_reference(self, image_bytes):
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise FaceVerificationError("Invalid or corrupted image file.")
+
+        face_box = detect_largest_face(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        if face_box is not None:
+            image = crop_with_margin(image, face_box, self.REFERENCE_FACE_MARGIN)
+
+        scale = self.REFERENCE_MAX_DIMENSION / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.REFERENCE_JPEG_QUALITY])
+        return buffer.tobytes()
+
+    def match(self, reference, target_bytes):
+        result = compare_faces(
+            source_bytes=reference,
+            target_bytes=target_bytes,
+            aws_access_key=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_key=settings.AWS_SECRET_ACCESS_KEY,
+            aws_region=settings.AWS_REKOGNITION_REGION,
+            similarity_threshold=settings.FACE_REKOGNITION_SIMILARITY_THRESHOLD,
+        )
+        face_matches = result.get('FaceMatches') or []
+        similarity = max((m.get('Similarity', 0) for m in face_matches), default=None)
+        return FaceVerificationResult(bool(face_matches), similarity, self.name)
+
+
+def _uniform_lbp_lut():
+    """
+    Maps the 256 raw 8-neighbour LBP codes onto the 59 "uniform" bins
+    (58 patterns with at most two 0/1 transitions plus one catch-all bin).
+    """
+    lut = np.full(256, 58, dtype=np.int32)
+    next_bin = 0
+    for code in range(256):
+        bits = [(code >> i) & 1 for i in range(8)]
+        transitions = sum(bits[i] != bits[(i + 1) % 8] for i in range(8))
+        if transitions <= 2:
+            lut[code] = next_bin
+            next_bin += 1
+    return lut
+
+
+class LocalFaceVerifier(BaseFaceVerifier):
+    """
+    On-box verification using the OpenCV/NumPy stack we already ship.
+
+    The face is found with the shared Haar cascade, normalised to a small
+    grayscale patch and described by a grid of uniform LBP histograms.
+    Embeddings are Hellinger-normalised so cosine similarity (x100) gives
+    the same 0-100 scale Rekognition reports. No network access is needed.
+    """
+    name = 'local'
+
+    FACE_SIZE = 96
+    GRID = 6
+    BINS = 59
+    # 8 neighbours, clockwise from top-left
+    OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+    def __init__(self):
+        self.threshold = settings.FACE_LOCAL_SIMILARITY_THRESHOLD
+        self._lut = _uniform_lbp_lut()
+
+    def _decode(self, image_bytes):
+        image_array = np.frombuffer(image_bytes, np.uint8)
+        image = cv2.imdecode(image_array, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FaceVerificationError("Invalid or corrupted image file.")
+        return image
+
+    def _face_patch(self, gray):
+        # Use the largest face; background faces are usually much smaller
+        face_box = detect_largest_face(gray)
+        if face_box is None:
+            raise FaceVerificationError("No face detected.")
+
+        x, y, w, h = face_box
+        patch = cv2.resize(gray[y:y + h, x:x + w], (self.FACE_SIZE, self.FACE_SIZE), interpolation=cv2.INTER_AREA)
+        return cv2.equalizeHist(patch)
+
+    def embed(self, image_bytes):
+        patch = self._face_patch(self._decode(image_bytes)).astype(np.int16)
+
+        h, w = patch.shape
+        center = patch[1:h - 1, 1:w - 1]
+        codes = np.zeros(center.shape, dtype=np.int32)
+        for bit, (dy, dx) in enumerate(self.OFFSETS):
+            neighbour = patch[1 + dy:h - 1 + dy, 1 + dx:w - 1 + dx]
+            codes |= (neighbour >= center).astype(np.int32) << bit
+        bins = self._lut[codes]
+
+        # Histogram every grid cell in one bincount call
+        ch, cw = bins.shape[0] // self.GRID, bins.shape[1] // self.GRID
+        bins = bins[:ch * self.GRID, :cw * self.GRID]
+        cell_rows = np.repeat(np.arange(self.GRID), ch)[:, None]
+        cell_cols = np.repeat(np.arange(self.GRID), cw)[None, :]
+        cell_index = cell_rows * self.GRID + cell_cols
+        hist = np.bincount(
+            (cell_index * self.BINS + bins).ravel(),
+            minlength=self.GRID * self.GRID * self.BINS
+        ).astype(np.float32)
+
+        hist = hist.reshape(self.GRID * self.GRID, self.BINS)
+        hist /= hist.sum(axis=1, keepdims=True)
+        embedding = np.sqrt(hist).ravel()
+        embedding /= np.linalg.norm(embedding)
+        return embedding
+
+    def build_reference(self, image_bytes):
+        return self.embed(image_bytes).tobytes()
+
+    def match(self, reference, target_bytes):
+        reference_vec = np.frombuffer(reference, dtype=np.float32)
+        target_vec = self.embed(target_bytes)
+        similarity = round(float(np.dot(reference_vec, target_vec)) * 100, 2)
+        return FaceVerificationResult(similarity >= self.threshold, similarity, self.name)
+
+
+FACE_VERIFICATION_BACKENDS = {
+    'rekognition': RekognitionFaceVerifier,
+    'local': LocalFaceVerifier,
+}
+
+# --- Global verifier, built once per process ---
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_face_verifier():
+    """
+    Returns the backend selected by settings.FACE_VERIFICATION_BACKEND.
+    Accepts a short name ('rekognition', 'local') or a dotted class path.
+    """
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                backend = settings.FACE_VERIFICATION_BACKEND
+                backend_class = FACE_VERIFICATION_BACKENDS.get(backend) or import_string(backend)
+                logger.info(f"Using face verification backend: {backend}")
+                _verifier = backend_class()
+    return _verifier
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from functools import wraps
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# A key whose first request never finished (worker killed) is released after this
+IN_FLIGHT_TIMEOUT = timedelta(minutes=2)
+
+
+def get_idempotency_key(request):
+    key = request.META.get('HTTP_IDEMPOTENCY_KEY') or request.data.get('idempotency_key')
+    return str(key).strip()[:100] if key else None
+
+
+def _release(record, endpoint, key):
+    """Drops an in-flight key whose response won't be stored, so a retry isn't answered 409."""
+    try:
+        record.delete()
+    except Exception as e:
+        logger.error(f"Could not release idempotency key {key} for {endpoint}: {str(e)}")
+
+
+def idempotent(endpoint):
+    """
+    Makes a POST view replay-safe. A request carrying an `Idempotency-Key`
+    header (or `idempotency_key` field) that was already answered gets the
+    stored response back with `Idempotent-Replay: true` and the view is not
+    run again. A duplicate that arrives while the first request is still in
+    flight gets 409. Server errors (5xx, or the view raising) are not
+    stored, so the client can retry with the same key. Requests without a key are unaffected.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = get_idempotency_key(request)
+            if not key:
+                return view(request, *args, **kwargs)
+
+            now = timezone.now()
+            expired_before = now - timedelta(seconds=settings.PUNCH_IDEMPOTENCY_TTL)
+            stored = IdempotencyKey.objects.filter(
+                user=request.user, endpoint=endpoint, key=key, created_at__gte=expired_before
+            ).first()
+
+            if stored is not None:
+                if stored.response_status is not None:
+                    return Response(stored.response_body, status=stored.response_status, headers={'Idempotent-Replay': 'true'})
+                elif stored.created_at < now - IN_FLIGHT_TIMEOUT:
+                    stored.delete()
+                else:
+                    return Response({"error": "This request is already being processed"}, status=409)
+
+            try:
+                with transaction.atomic():
+                    # Drop this user's expired keys (including an expired copy of this one)
+                    IdempotencyKey.objects.filter(user=request.user, created_at__lt=expired_before).delete()
+                    record = IdempotencyKey.objects.create(user=request.user, endpoint=endpoint, key=key)
+            except IntegrityError:
+                # Lost the race against a concurrent request with the same key
+                return Response({"error": "This request is already being processed"}, status=409)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                _release(record, endpoint, key)
+                raise
+
+            try:
+                if response.status_code >= 500:
+                    record.delete()
+                else:
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=['response_status', 'response_body'])
+            except Exception as e:
+                logger.error(f"Could not store idempotent response for {endpoint} key {key}: {str(e)}")
+                _release(record, endpoint, key)
+            return response
+
+        return wrapped
+    return decorator
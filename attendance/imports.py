@@ -0,0 +1,677 @@
+"""
+Background CSV/XLSX imports of attendance, leave and employee rows.
+
+An upload is stored and queued as an ImportJob; `manage.py
+run_import_workers` claims it (SKIP LOCKED, like the verification queue)
+and streams the file IMPORT_CHUNK_SIZE rows at a time. Each chunk is
+validated and written with the bulk ingest services (upsert_attendance,
+create_leaves, bulk_create for employees) in one transaction together with
+its rejected rows (ImportRowError) and the job's progress, so a job that
+dies is resumed after its last written chunk. Rows are checked against the
+models' field rules first; if the database still rejects a chunk, it is
+written row by row and only the rows that fail are reported.
+
+Memory is bounded by the chunk size: CSV is read row by row and XLSX
+sheets are parsed with iterparse; only an XLSX file's shared-strings table
+is held in full.
+"""
+from collections import defaultdict
+import csv
+from datetime import datetime, timedelta
+import io
+from itertools import islice
+import logging
+import math
+import os
+import time
+import uuid
+import zipfile
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from main.attendance_ingest import manual_attendance, upsert_attendance
+from main.leave_ingest import create_leaves
+from main.models import EmpLeave, Employee, LeaveType, Outlet
+from main.signals import bulk_written
+from .models import ImportJob, ImportRowError
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+# kind -> (required columns, optional columns); attendance and leave rows name
+# the employee by employee_id or empcode
+COLUMNS = {
+    'attendance': (('date', 'check_in_time', 'check_out_time', 'outlet_id'), ('employee_id', 'empcode')),
+    'leave': (('leave_date', 'leave_type'), ('employee_id', 'empcode', 'status', 'remarks', 'outlet_id')),
+    'employee': (
+        ('fullname', 'email', 'date_of_birth'),
+        ('password', 'empcode', 'phone_number', 'idnumber', 'first_name', 'last_name', 'outlets', 'group', 'basic_salary'),
+    ),
+}
+
+
+def import_columns(kind):
+    required, optional = COLUMNS[kind]
+    return list(required) + list(optional)
+
+
+# --- Reading ---
+
+def iter_csv_rows(fileobj):
+    yield from csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def _text(element):
+    return ''.join(t.text or '' for t in element.iter(_NS + 't'))
+
+
+def _shared_strings(workbook):
+    if 'xl/sharedStrings.xml' not in workbook.namelist():
+        return []
+    strings = []
+    with workbook.open('xl/sharedStrings.xml') as part:
+        for _, element in ElementTree.iterparse(part):
+            if element.tag == _NS + 'si':
+                strings.append(_text(element))
+                element.clear()
+    return strings
+
+
+def _first_sheet(workbook):
+    sheet = ElementTree.fromstring(workbook.read('xl/workbook.xml')).find(f'{_NS}sheets/{_NS}sheet')
+    for rel in ElementTree.fromstring(workbook.read('xl/_rels/workbook.xml.rels')):
+        if rel.get('Id') == sheet.get(_REL_ID):
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    raise ValueError("The workbook has no worksheet.")
+
+
+def _column_index(ref):
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        node = cell.find(_NS + 'is')
+        return _text(node) if node is not None else ''
+    value = cell.findtext(_NS + 'v') or ''
+    if kind == 's' and value:
+        return shared[int(value)]
+    return value
+
+
+def iter_xlsx_rows(fileobj):
+    """Rows of the first worksheet as lists of strings; rows the sheet skips come back empty."""
+    with zipfile.ZipFile(fileobj) as workbook:
+        shared = _shared_strings(workbook)
+        with workbook.open(_first_sheet(workbook)) as part:
+            sheet_data, expected = None, 1
+            for event, element in ElementTree.iterparse(part, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == _NS + 'sheetData':
+                        sheet_data = element
+                    continue
+                if element.tag != _NS + 'row':
+                    continue
+                number = int(element.get('r') or expected)
+                while expected < number:
+                    yield []
+                    expected += 1
+                values = []
+                for cell in element.iter(_NS + 'c'):
+                    if cell.get('r'):
+                        values.extend([''] * (_column_index(cell.get('r')) - len(values)))
+                    values.append(_cell_value(cell, shared))
+                yield values
+                expected += 1
+                sheet_data.clear()  # drop parsed rows
+
+
+def _rows(fileobj, file_name):
+    return iter_xlsx_rows(fileobj) if file_name.endswith('.xlsx') else iter_csv_rows(fileobj)
+
+
+def _header(values):
+    return [str(v or '').strip().lower().replace(' ', '_') for v in values]
+
+
+def read_header(job):
+    with default_storage.open(job.file_name, 'rb') as fileobj:
+        return _header(next(_rows(fileobj, job.file_name), []))
+
+
+def iter_records(job):
+    """(row_number, {column: value}) for the non-blank data rows of the job's file."""
+    with default_storage.open(job.file_name, 'rb') as fileobj:
+        rows = _rows(fileobj, job.file_name)
+        header = _header(next(rows, []))
+        for number, values in enumerate(rows, start=2):
+            values = [str(v).strip() for v in values]
+            if any(values):
+                yield number, {name: values[i] if i < len(values) else '' for i, name in enumerate(header) if name}
+
+
+# --- Values ---
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_int(value, column):
+    number = _number(value)
+    if number is None or not number.is_integer():
+        raise ValueError(f"{column} must be a whole number.")
+    return int(number)
+
+
+def parse_day(value, column):
+    """YYYY-MM-DD, or an Excel date serial."""
+    number = _number(value)
+    if number is not None:
+        try:
+            return (EXCEL_EPOCH + timedelta(days=number)).date()
+        except OverflowError:
+            raise ValueError(f"{column} must be a date (YYYY-MM-DD).")
+    try:
+        day = parse_date(value[:10])
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f"{column} must be a date (YYYY-MM-DD).")
+    return day
+
+
+def parse_clock(value, column):
+    """HH:MM[:SS] (optionally after a date), or an Excel time (fraction of a day)."""
+    number = _number(value)
+    if number is not None:
+        seconds = round((number % 1) * 86400)
+        return (datetime.min + timedelta(seconds=seconds)).time()
+    try:
+        clock = parse_time(value.split()[-1]) if value else None
+    except ValueError:
+        clock = None
+    if clock is None:
+        raise ValueError(f"{column} must be a time (HH:MM).")
+    return clock
+
+
+class _Employees:
+    """The employees a chunk's rows name (by employee_id or empcode), looked up in one query."""
+
+    def __init__(self, rows):
+        ids, codes = set(), set()
+        for _, row in rows:
+            if row.get('employee_id'):
+                number = _number(row['employee_id'])
+                if number is not None and number.is_integer():
+                    ids.add(int(number))
+            elif row.get('empcode'):
+                codes.add(row['empcode'])
+        self.ids, self.by_code = set(), defaultdict(list)
+        for employee_id, empcode in Employee.objects.filter(Q(employee_id__in=ids) | Q(empcode__in=codes)).values_list('employee_id', 'empcode'):
+            self.ids.add(employee_id)
+            if empcode in codes:
+                self.by_code[empcode].append(employee_id)
+
+    def get(self, row):
+        if row.get('employee_id'):
+            employee_id = parse_int(row['employee_id'], 'employee_id')
+            if employee_id not in self.ids:
+                raise ValueError("Employee not found.")
+            return employee_id
+        if not row.get('empcode'):
+            raise ValueError("employee_id or empcode is required.")
+        matches = self.by_code.get(row['empcode'], [])
+        if len(matches) != 1:
+            raise ValueError("empcode matches several employees." if matches else "Employee not found.")
+        return matches[0]
+
+
+def check_fields(instance, exclude=()):
+    """The model's field rules (max_length, choices, validators) for one row; ValueError naming the fields."""
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as e:
+        raise ValueError(' '.join(f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()))
+
+
+def _write_rows(write, valid):
+    """
+    Runs write([item, ...]) -> [result, ...] over a chunk's valid
+    (row_number, row, item)s in one savepoint. If the database rejects the
+    batch, it is retried row by row so that only the offending rows are
+    reported instead of the whole chunk failing.
+    Returns ([(row_number, row, result), ...], errors).
+    """
+    if not valid:
+        return [], []
+    try:
+        with transaction.atomic():
+            results = write([item for _, _, item in valid])
+        return [(number, row, result) for (number, row, _), result in zip(valid, results)], []
+    except DatabaseError as e:
+        logger.warning(f"Import chunk of {len(valid)} rows rejected, retrying row by row: {str(e)}")
+
+    done, errors = [], []
+    for number, row, item in valid:
+        try:
+            with transaction.atomic():
+                result, = write([item])
+        except DatabaseError as e:
+            errors.append((number, f"Could not be saved: {str(e).strip()}", row))
+        else:
+            done.append((number, row, result))
+    return done, errors
+
+
+def _memberships(employee_ids):
+    return set(Employee.outlets.through.objects.filter(employee_id__in=employee_ids).values_list('employee_id', 'outlet_id'))
+
+
+def parse_ids(value, column):
+    """Ids separated by ';' or ','."""
+    return [parse_int(v.strip(), column) for v in value.replace(',', ';').split(';') if v.strip()]
+
+
+def _ids(rows, column):
+    ids = set()
+    for _, row in rows:
+        try:
+            ids.update(parse_ids(row.get(column, ''), column))
+        except ValueError:
+            pass  # reported per row
+    return ids
+
+
+# --- Chunk importers: (job, [(row_number, row), ...]) -> (rows written, [(row_number, error, row), ...]) ---
+
+def import_attendance(job, rows):
+    """Attendance at an outlet the employee belongs to, written as bulk_add_attendance does."""
+    employees = _Employees(rows)
+    outlets = Outlet.objects.in_bulk(_ids(rows, 'outlet_id'))
+    parsed, errors = [], []
+    for number, row in rows:
+        try:
+            employee_id = employees.get(row)
+            outlet = outlets.get(parse_int(row.get('outlet_id', ''), 'outlet_id'))
+            if outlet is None:
+                raise ValueError("Outlet not found.")
+            if not outlet.latitude or not outlet.longitude:
+                raise ValueError("The outlet does not have location data.")
+            day = parse_day(row.get('date', ''), 'date')
+            check_in = timezone.make_aware(datetime.combine(day, parse_clock(row.get('check_in_time', ''), 'check_in_time')))
+            check_out = timezone.make_aware(datetime.combine(day, parse_clock(row.get('check_out_time', ''), 'check_out_time')))
+            if check_out <= check_in:
+                raise ValueError("check_out_time must be after check_in_time.")
+        except ValueError as e:
+            errors.append((number, str(e), row))
+            continue
+        parsed.append((number, row, employee_id, outlet, day, check_in, check_out))
+
+    members = _memberships({p[2] for p in parsed})
+    valid = []
+    for number, row, employee_id, outlet, *rest in parsed:
+        if (employee_id, outlet.id) not in members:
+            errors.append((number, "Employee is not assigned to this outlet.", row))
+        else:
+            valid.append((number, row, employee_id, outlet, *rest))
+
+    notes = {
+        'import': {
+            "job_id": job.id,
+            "updated_by": job.created_by.username if job.created_by else None,
+            "updated_at": timezone.now().isoformat(),
+        }
+    }
+    done, failed = _write_rows(
+        lambda items: upsert_attendance(
+            manual_attendance(employee_id, day, check_in, check_out, outlet, notes)
+            for employee_id, outlet, day, check_in, check_out in items
+        ),
+        [(number, row, tuple(rest)) for number, row, *rest in valid],
+    )
+    errors += failed
+    written = 0
+    for number, row, result in done:
+        if result["result"]:
+            written += 1
+        else:
+            errors.append((number, result["error"], row))
+    return written, errors
+
+
+def import_leaves(job, rows):
+    """Leaves (approved by the uploader unless a status is given) with no active leave that day."""
+    employees = _Employees(rows)
+    leave_types = list(LeaveType.objects.all())
+    by_code = {t.att_type.lower(): t for t in leave_types}
+    by_id = {str(t.id): t for t in leave_types}
+    statuses = dict(EmpLeave.STATUS_CHOICES)
+    outlet_ids = _ids(rows, 'outlet_id')
+    parsed, errors = [], []
+    for number, row in rows:
+        try:
+            employee_id = employees.get(row)
+            code = row.get('leave_type', '')
+            number_code = _number(code)
+            leave_type = by_code.get(code.lower()) or (by_id.get(str(int(number_code))) if number_code is not None and number_code.is_integer() else None)
+            if leave_type is None:
+                raise ValueError("LeaveType not found.")
+            day = parse_day(row.get('leave_date', ''), 'leave_date')
+            status = EmpLeave.normalize_status(row.get('status') or 'approved')
+            if status not in statuses:
+                raise ValueError(f"status must be one of: {', '.join(statuses)}.")
+            outlet_id = parse_int(row['outlet_id'], 'outlet_id') if row.get('outlet_id') else None
+            fields = {
+                'employee_id': employee_id, 'leave_date': day, 'leave_type': leave_type, 'remarks': row.get('remarks', ''),
+                'status': status, 'action_user_id': job.created_by_id,
+                'action_date': timezone.localdate() if status != 'pending' else None,
+            }
+            check_fields(EmpLeave(**fields), exclude=['employee', 'leave_type', 'action_user'])
+        except ValueError as e:
+            errors.append((number, str(e), row))
+            continue
+        parsed.append((number, row, outlet_id, fields))
+
+    members = _memberships({fields['employee_id'] for *_, fields in parsed}) if outlet_ids else set()
+    valid = []
+    for number, row, outlet_id, fields in parsed:
+        if outlet_id is not None and (fields['employee_id'], outlet_id) not in members:
+            errors.append((number, "Employee is not assigned to this outlet.", row))
+            continue
+        valid.append((number, row, fields))
+
+    done, failed = _write_rows(lambda items: create_leaves(EmpLeave(**fields) for fields in items), valid)
+    errors += failed
+    written = 0
+    for number, row, result in done:
+        if result["created"]:
+            written += 1
+        else:
+            errors.append((number, result["error"], row))
+    return written, errors
+
+
+def _create_employees(items):
+    users = User.objects.bulk_create([User(**user_fields) for user_fields, *_ in items])
+    employees = Employee.objects.bulk_create([
+        Employee(user=user, **employee_fields) for (_, employee_fields, *_), user in zip(items, users)
+    ])
+    Employee.outlets.through.objects.bulk_create([
+        Employee.outlets.through(employee_id=employee.employee_id, outlet_id=outlet_id)
+        for (_, _, outlet_ids, _), employee in zip(items, employees)
+        for outlet_id in outlet_ids
+    ])
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.id, group_id=group.id)
+        for (_, _, _, group), user in zip(items, users)
+        if group is not None
+    ])
+    return employees
+
+
+def import_employees(job, rows):
+    """Users and employees as create_employee makes them (username = fullname), with outlets and group."""
+    outlets = Outlet.objects.in_bulk(_ids(rows, 'outlets'))
+    groups = {}
+    for group in Group.objects.all():
+        groups[group.name.lower()] = groups[str(group.id)] = group
+    taken = set(User.objects.filter(username__in={row.get('fullname') for _, row in rows}).values_list('username', flat=True))
+    username_length = User._meta.get_field('username').max_length
+
+    valid, errors = [], []
+    for number, row in rows:
+        try:
+            for column in ('fullname', 'email', 'date_of_birth'):
+                if not row.get(column):
+                    raise ValueError("fullname, email and date_of_birth are required.")
+            if row['fullname'] in taken:
+                raise ValueError("A user with this username already exists.")
+            if len(row['fullname']) > username_length:
+                raise ValueError(f"fullname: Ensure this value has at most {username_length} characters (it is used as the username).")
+            date_of_birth = parse_day(row['date_of_birth'], 'date_of_birth')
+            basic_salary = None
+            if row.get('basic_salary') not in (None, '', 'null'):
+                basic_salary = _number(row['basic_salary'])
+                if basic_salary is None:
+                    raise ValueError("Invalid value for basic_salary.")
+            outlet_ids = parse_ids(row.get('outlets', ''), 'outlets')
+            if any(outlet_id not in outlets for outlet_id in outlet_ids):
+                raise ValueError("One or more outlets not found.")
+            group = None
+            if row.get('group'):
+                group_number = _number(row['group'])
+                key = str(int(group_number)) if group_number is not None and group_number.is_integer() else row['group'].lower()
+                group = groups.get(key)
+                if group is None:
+                    raise ValueError("Group not found.")
+            user_fields = {
+                'username': row['fullname'], 'email': row['email'],
+                'first_name': row.get('first_name', ''), 'last_name': row.get('last_name', ''),
+                'password': make_password(row.get('password') or None),  # no password: unusable until reset
+            }
+            employee_fields = {
+                'empcode': row.get('empcode') or None, 'fullname': row['fullname'], 'phone_number': row.get('phone_number', ''),
+                'date_of_birth': date_of_birth, 'idnumber': row.get('idnumber') or None, 'basic_salary': basic_salary,
+                # create_employee's defaults
+                'cal_epf': True, 'epf_com_per': 8.0, 'epf_emp_per': 5.0, 'etf_com_per': 3.0,
+            }
+            # username follows create_employee (fullname, spaces allowed): only its length is checked above
+            check_fields(User(**user_fields), exclude=['username', 'password'])
+            # None is stored as NULL (empcode allows NULL but not blank), so it skips the blank rule
+            check_fields(Employee(**employee_fields), exclude=['user'] + [k for k, v in employee_fields.items() if v is None])
+        except ValueError as e:
+            errors.append((number, str(e), row))
+            continue
+        taken.add(row['fullname'])
+        valid.append((number, row, (user_fields, employee_fields, outlet_ids, group)))
+
+    done, failed = _write_rows(_create_employees, valid)
+    errors += failed
+    if done:
+        bulk_written.send(sender=Employee, pairs={(employee.employee_id, None) for _, _, employee in done})
+    return len(done), errors
+
+
+IMPORTERS = {
+    'attendance': import_attendance,
+    'leave': import_leaves,
+    'employee': import_employees,
+}
+
+
+# --- Jobs ---
+
+def create_import_job(upload, kind, user):
+    """Stores an uploaded file and queues its import. ValueError for an unsupported kind, format or size."""
+    if kind not in IMPORTERS:
+        raise ValueError(f"kind must be one of: {', '.join(IMPORTERS)}.")
+    extension = os.path.splitext(upload.name)[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise ValueError("The file must be .csv or .xlsx.")
+    if upload.size > settings.IMPORT_MAX_FILE_SIZE:
+        raise ValueError(f"The file is larger than {settings.IMPORT_MAX_FILE_SIZE // (1024 * 1024)} MB.")
+    file_name = default_storage.save(f"imports/{uuid.uuid4().hex}.{extension}", upload)
+    return ImportJob.objects.create(kind=kind, file_name=file_name, original_name=upload.name[:255], created_by=user)
+
+
+def import_job_status(job):
+    progress = None
+    if job.rows_total:
+        progress = round(100 * job.rows_done / job.rows_total, 1)
+    elif job.status == 'done':
+        progress = 100.0
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "file": job.original_name,
+        "status": job.status,
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "rows_ok": job.rows_ok,
+        "rows_failed": job.rows_failed,
+        "progress": progress,
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def iter_error_rows(job):
+    """Rejected rows as [row, error, *columns]: the file's columns, so it can be fixed and uploaded again."""
+    columns = import_columns(job.kind)
+    errors = ImportRowError.objects.filter(job=job).order_by('row_number').values_list('row_number', 'error', 'data')
+    for row_number, error, data in errors.iterator(chunk_size=2000):
+        yield [row_number, error] + [data.get(c, '') for c in columns]
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest runnable import to 'running' and returns it.
+    Jobs whose worker stopped writing chunks for IMPORT_JOB_TIMEOUT seconds
+    (crashed or killed) become runnable again and resume where they stopped,
+    unless they have used up IMPORT_MAX_ATTEMPTS: a file that keeps killing
+    its worker is failed instead.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+
+    with transaction.atomic():
+        ImportJob.objects.filter(
+            status='running', heartbeat_at__lt=stale_before, attempts__gte=settings.IMPORT_MAX_ATTEMPTS,
+        ).update(status='failed', last_error="The import stopped responding too many times.", finished_at=now)
+
+        job = (
+            ImportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | Q(status='running', heartbeat_at__lt=stale_before))
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = 'running'
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+        return job
+
+
+def _write_chunk(job, chunk):
+    """Imports one chunk with its errors and progress in one transaction; False if the job was taken over."""
+    with transaction.atomic():
+        owned = ImportJob.objects.select_for_update().filter(pk=job.pk, status='running', attempts=job.attempts).exists()
+        if not owned:
+            return False
+        written, errors = IMPORTERS[job.kind](job, chunk)
+        ImportRowError.objects.bulk_create([
+            ImportRowError(job_id=job.pk, row_number=number, error=error, data=row)
+            for number, error, row in sorted(errors, key=lambda e: e[0])
+        ])
+        job.rows_done += len(chunk)
+        job.rows_ok += written
+        job.rows_failed += len(errors)
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['rows_done', 'rows_ok', 'rows_failed', 'heartbeat_at'])
+    return True
+
+
+def _finish(job, status, error=None):
+    job.status = status
+    job.last_error = error
+    job.finished_at = timezone.now()
+    ImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        status=job.status, last_error=job.last_error, finished_at=job.finished_at,
+    )
+
+
+def process_job(job):
+    """
+    Runs a claimed job from its first unwritten row to the end of the file.
+    A file without the required columns fails at once; other errors are
+    retried (resuming) up to IMPORT_MAX_ATTEMPTS.
+    """
+    try:
+        required, _ = COLUMNS[job.kind]
+        header = read_header(job)
+        missing = [c for c in required if c not in header]
+        if job.kind != 'employee' and not {'employee_id', 'empcode'} & set(header):
+            missing.append('employee_id or empcode')
+        if missing:
+            _finish(job, 'failed', f"Missing columns: {', '.join(missing)}")
+            return
+
+        if job.rows_total is None:
+            job.rows_total = sum(1 for _ in iter_records(job))
+            ImportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+
+        records = islice(iter_records(job), job.rows_done, None)
+        while True:
+            chunk = list(islice(records, settings.IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            if not _write_chunk(job, chunk):
+                logger.warning(f"Import job {job.id} was taken over by another worker")
+                return
+
+        _finish(job, 'done')
+        default_storage.delete(job.file_name)
+
+    except Exception as e:
+        logger.error(f"Import job {job.id} failed at row {job.rows_done} (attempt {job.attempts}): {str(e)}")
+        if job.attempts >= settings.IMPORT_MAX_ATTEMPTS:
+            _finish(job, 'failed', str(e))
+        else:
+            ImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(status='queued', last_error=str(e))
+
+
+def run_worker(stop_event, poll_interval=2.0):
+    """Worker loop for one thread: claim, import, repeat; sleep when idle."""
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            logger.error(f"Could not claim import job: {str(e)}")
+            job = None
+
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        process_job(job)
+        logger.info(f"Import job {job.id} ({job.kind}) stopped after {job.rows_done} rows in {time.perf_counter() - started:.1f} s")
+
+    close_old_connections()
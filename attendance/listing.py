@@ -0,0 +1,67 @@
+"""
+Projection behind the attendance list endpoints (get_outlet_attendance,
+get_all_attendance).
+
+Only the listed columns are selected, the employee name comes from the same
+query's join, and results are keyset pages on (date, attendance_id), so a
+page costs one query whatever its size and however deep it is.
+"""
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from aas.pagination import KeysetPagination
+from main.models import Attendance, Employee
+
+# response key -> ORM path
+ATTENDANCE_LIST_FIELDS = {
+    'attendance_id': 'attendance_id',
+    'employee_id': 'employee_id',
+    'employee': 'employee__fullname',
+    'date': 'date',
+    'check_in_time': 'check_in_time',
+    'check_out_time': 'check_out_time',
+    'status': 'status',
+    'worked_hours': 'worked_hours',
+}
+ATTENDANCE_LIST_ORDERING = ('-date', '-attendance_id')
+
+
+def parse_date_range(params):
+    """(start_date, end_date) from ?start_date / ?end_date (YYYY-MM-DD, both optional)."""
+    dates = []
+    for name in ('start_date', 'end_date'):
+        value = params.get(name)
+        parsed = parse_date(value) if value else None
+        if value and parsed is None:
+            raise ValueError(f"{name} must be YYYY-MM-DD.")
+        dates.append(parsed)
+    return tuple(dates)
+
+
+def outlet_attendance(outlet_ids):
+    """Attendance of the employees of the given outlets, as a subquery (no join, no DISTINCT)."""
+    members = Employee.outlets.through.objects.filter(outlet_id__in=outlet_ids).values('employee_id')
+    return Attendance.objects.filter(employee_id__in=members)
+
+
+def attendance_rows(queryset, start_date=None, end_date=None):
+    """`queryset` restricted to the date range, as values() of ATTENDANCE_LIST_FIELDS."""
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset.values(*ATTENDANCE_LIST_FIELDS.values())
+
+
+def attendance_list_response(request, queryset):
+    """One keyset page of `queryset` (filtered by the request's date range) in the list format."""
+    try:
+        start_date, end_date = parse_date_range(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPagination(ATTENDANCE_LIST_ORDERING)
+    page = paginator.paginate_queryset(attendance_rows(queryset, start_date, end_date), request)
+    data = [{key: row[path] for key, path in ATTENDANCE_LIST_FIELDS.items()} for row in page]
+    return paginator.get_paginated_response(data)
@@ -0,0 +1,42 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from attendance.imports import run_worker
+
+
+class Command(BaseCommand):
+    help = "Runs background workers for queued CSV/XLSX imports (attendance, leave, employees)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help="Worker threads in this process.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when no import is queued.")
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping import workers...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        workers = [
+            threading.Thread(
+                target=run_worker,
+                args=(stop_event, options['poll_interval']),
+                name=f"import-worker-{i}",
+                daemon=True,
+            )
+            for i in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(self.style.SUCCESS(f"Started {len(workers)} import worker thread(s)."))
+
+        stop_event.wait()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from attendance.verification_queue import run_worker, queue_metrics
+
+
+class Command(BaseCommand):
+    help = "Runs background face verification workers for punches queued in async mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--metrics-interval', type=float, default=60.0, help="Seconds between queue metric log lines (0 disables).")
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping verification workers...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        workers = [
+            threading.Thread(
+                target=run_worker,
+                args=(stop_event, options['poll_interval']),
+                name=f"verification-worker-{i}",
+                daemon=True,
+            )
+            for i in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(self.style.SUCCESS(f"Started {len(workers)} verification worker thread(s)."))
+
+        metrics_interval = options['metrics_interval']
+        while not stop_event.wait(metrics_interval or None):
+            self.stdout.write(f"Verification queue: {queue_metrics()}")
+
+        for worker in workers:
+            worker.join()
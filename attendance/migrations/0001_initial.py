@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('main', '0010_alter_attendance_options_attendance_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceFace',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reference_face', serialize=False, to='main.employee')),
+                ('backend', models.CharField(max_length=50)),
+                ('source_name', models.CharField(max_length=255)),
+                ('template', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'reference_face',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_alter_attendance_options_attendance_updated_at_and_more'),
+        ('attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerificationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('punchin', 'Punch In'), ('punchout', 'Punch Out')], max_length=20)),
+                ('selfie_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('attendance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_jobs', to='main.attendance')),
+            ],
+            options={
+                'db_table': 'verification_job',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='verification_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_alter_attendance_options_attendance_updated_at_and_more'),
+        ('attendance', '0002_verificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('punchin', 'Punch In'), ('punchout', 'Punch Out')], max_length=20)),
+                ('selfie', models.ImageField(blank=True, max_length=255, null=True, upload_to='')),
+                ('selfie_sha256', models.CharField(blank=True, max_length=64)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('device', models.CharField(blank=True, max_length=255)),
+                ('verification_status', models.CharField(choices=[('Pending', 'Pending'), ('Verified', 'Verified'), ('Rejected', 'Rejected')], default='Pending', max_length=20)),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('backend', models.CharField(blank=True, max_length=50)),
+                ('latency_ms', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='punch_events', to='main.attendance')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='main.employee')),
+            ],
+            options={
+                'db_table': 'punch_event',
+            },
+        ),
+        migrations.AddField(
+            model_name='verificationjob',
+            name='punch_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='verification_jobs', to='attendance.punchevent'),
+        ),
+        migrations.AddIndex(
+            model_name='punchevent',
+            index=models.Index(fields=['employee', 'created_at'], name='punch_event_employee_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('attendance', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('attendance', 'Attendance'), ('leave', 'Leave'), ('employee', 'Employee')], max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('original_name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('rows_total', models.IntegerField(blank=True, null=True)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('rows_ok', models.IntegerField(default=0)),
+                ('rows_failed', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'import_job',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='import_job_queue_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('error', models.TextField()),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='attendance.importjob')),
+            ],
+            options={
+                'db_table': 'import_row_error',
+                'indexes': [models.Index(fields=['job', 'row_number'], name='import_row_error_job_idx')],
+            },
+        ),
+    ]
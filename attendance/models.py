@@ -1,3 +1,164 @@
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from main.models import Attendance, Employee
 
-# Create your models here.
+
+class ReferenceFace(models.Model):
+    """
+    Precomputed verification template for an employee's reference photo.
+
+    Built once when the reference photo is uploaded or replaced, so punches
+    compare against this compact blob instead of re-reading the photo.
+    """
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, primary_key=True, related_name='reference_face')
+    backend = models.CharField(max_length=50)  # verifier that produced the template
+    source_name = models.CharField(max_length=255)  # reference_photo.name it was built from
+    template = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reference face for {self.employee_id} ({self.backend})"
+
+    class Meta:
+        db_table = 'reference_face'
+
+
+class PunchEvent(models.Model):
+    """
+    One row per punch attempt, never overwritten: the selfie, where it was
+    taken and how it was verified. Accepted punches link to their
+    Attendance row; rejected attempts keep attendance empty.
+    """
+    KIND_CHOICES = [('punchin', 'Punch In'), ('punchout', 'Punch Out')]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='punch_events')
+    attendance = models.ForeignKey(Attendance, null=True, blank=True, on_delete=models.SET_NULL, related_name='punch_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    selfie = models.ImageField(max_length=255, null=True, blank=True)  # content-addressed name, see punch_events.store_punch_selfie
+    selfie_sha256 = models.CharField(max_length=64, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    device = models.CharField(max_length=255, blank=True)
+    verification_status = models.CharField(max_length=20, choices=Attendance.VERIFICATION_CHOICES, default='Pending')
+    similarity = models.FloatField(null=True, blank=True)
+    backend = models.CharField(max_length=50, blank=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} by {self.employee_id} at {self.created_at} ({self.verification_status})"
+
+    class Meta:
+        db_table = 'punch_event'
+        indexes = [
+            models.Index(fields=['employee', 'created_at'], name='punch_event_employee_idx'),
+        ]
+
+
+class VerificationJob(models.Model):
+    """
+    Durable queue entry for a face comparison that runs after the punch
+    has already been recorded (FACE_VERIFICATION_MODE = 'async').
+    """
+    KIND_CHOICES = PunchEvent.KIND_CHOICES
+    STATUS_CHOICES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, related_name='verification_jobs')
+    punch_event = models.ForeignKey(PunchEvent, null=True, blank=True, on_delete=models.CASCADE, related_name='verification_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    selfie_name = models.CharField(max_length=255)  # storage name of the selfie to verify
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} verification for attendance {self.attendance_id} ({self.status})"
+
+    class Meta:
+        db_table = 'verification_job'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='verification_job_queue_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Client-supplied Idempotency-Key for a punch request and the response it
+    produced, so a retried request is answered from here instead of being
+    processed (and verified) again. `response_status` stays null while the
+    first request is still running.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='punch_idempotency_keys')
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=100)
+    response_status = models.IntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} ({self.user_id})"
+
+    class Meta:
+        db_table = 'punch_idempotency_key'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='punch_idempotency_key_unique'),
+        ]
+
+
+class ImportJob(models.Model):
+    """
+    A CSV/XLSX file of attendance, leave or employee rows imported in the
+    background by `manage.py run_import_workers` (see attendance.imports).
+    `rows_done` moves in the same transaction as each chunk's writes, so a
+    job picked up again after a crash resumes after the last written chunk.
+    """
+    KIND_CHOICES = [('attendance', 'Attendance'), ('leave', 'Leave'), ('employee', 'Employee')]
+    STATUS_CHOICES = VerificationJob.STATUS_CHOICES
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    file_name = models.CharField(max_length=255)  # storage name of the uploaded file
+    original_name = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='import_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    rows_total = models.IntegerField(null=True, blank=True)  # counted when first picked up
+    rows_done = models.IntegerField(default=0)
+    rows_ok = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last chunk written
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} import {self.id} ({self.status}, {self.rows_done} rows)"
+
+    class Meta:
+        db_table = 'import_job'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='import_job_queue_idx'),
+        ]
+
+
+class ImportRowError(models.Model):
+    """A rejected row of an ImportJob: its row number in the file, the reason and the values read."""
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='row_errors')
+    row_number = models.IntegerField()
+    error = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"Import {self.job_id} row {self.row_number}: {self.error}"
+
+    class Meta:
+        db_table = 'import_row_error'
+        indexes = [
+            models.Index(fields=['job', 'row_number'], name='import_row_error_job_idx'),
+        ]
@@ -0,0 +1,116 @@
+from django.db.models import BooleanField, Exists, OuterRef, Subquery, Value
+from django.utils import timezone
+
+from main.geofence import get_geofence_index
+from main.models import Attendance, Employee, EmpLeave
+from main.leave_balance import update_leave_status
+
+
+class PunchContext:
+    """
+    Everything punch_in/punch_out need to decide on a punch, loaded up front:
+    the employee row, the open attendance session (if any), today's
+    approved leave id (if any) and whether the punch location is inside one
+    of the employee's outlets (`at_own_outlet`, None without a location).
+    """
+
+    def __init__(self, employee, today):
+        self.employee = employee
+        self.today = today
+        self.open_attendance_id = employee.open_attendance_id
+        self.approved_leave_id = employee.approved_leave_id
+        self.at_own_outlet = getattr(employee, 'at_own_outlet', None)
+        self._open_attendance = None
+
+    @property
+    def open_attendance(self):
+        """The open session row; fetched on first access (punch-out only)."""
+        if self._open_attendance is None and self.open_attendance_id:
+            self._open_attendance = Attendance.objects.get(pk=self.open_attendance_id)
+            # Reuse the loaded employee instead of a lazy FK fetch when serializing
+            self._open_attendance.employee = self.employee
+        return self._open_attendance
+
+    def lock(self):
+        """
+        Locks the employee row until the surrounding transaction ends and
+        re-reads the open session id under the lock. Concurrent punches of
+        the same employee queue up here, so a duplicate request sees the
+        session the first one created/closed instead of racing it.
+        """
+        self.open_attendance_id = (
+            Employee.objects
+            .select_for_update()
+            .filter(pk=self.employee.pk)
+            .annotate(open_attendance_id=_open_attendance_subquery())
+            .values_list('open_attendance_id', flat=True)
+            .get()
+        )
+        self._open_attendance = None
+        return self.open_attendance_id
+
+    def reject_approved_leave(self):
+        """Marks today's approved leave as rejected (punched in on a leave day)."""
+        if not self.approved_leave_id:
+            return False
+        update_leave_status(
+            EmpLeave.objects.filter(pk=self.approved_leave_id),
+            'rejected',
+            remarks=f"Employee punched in on an approved leave day: {self.today}",
+        )
+        return True
+
+
+def _open_attendance_subquery():
+    # Same row the old `.filter(...).last()` picked under Attendance.Meta.ordering
+    return Subquery(
+        Attendance.objects
+        .filter(employee=OuterRef('pk'), check_out_time__isnull=True)
+        .order_by('date', 'attendance_id')
+        .values('attendance_id')[:1]
+    )
+
+
+def punch_point(data, lat_field, lon_field):
+    """(lat, lon) of a punch from the request data, or None if missing/invalid (the view reports that)."""
+    try:
+        return float(data.get(lat_field)), float(data.get(lon_field))
+    except (TypeError, ValueError):
+        return None
+
+
+def _at_own_outlet(point):
+    # Geometry from the in-memory index, membership from the database: an
+    # outlet removal is seen at once by every worker process
+    outlet_ids = get_geofence_index().containing_outlets(*point)
+    if not outlet_ids:
+        return Value(False, output_field=BooleanField())
+    return Exists(Employee.outlets.through.objects.filter(employee_id=OuterRef('pk'), outlet_id__in=outlet_ids))
+
+
+def load_punch_context(user, point=None):
+    """
+    Loads the punch context for `user` in a single query; the open session,
+    today's approved leave and, given the punch `point` (lat, lon), whether
+    it is inside one of the employee's outlets come back as subquery
+    columns on the employee row. Raises Employee.DoesNotExist if the user
+    has no employee profile.
+    """
+    today = timezone.now().date()
+
+    approved_leave = (
+        EmpLeave.objects
+        .filter(employee=OuterRef('pk'), leave_date=today, status='approved')
+        .order_by('leave_refno')
+        .values('leave_refno')[:1]
+    )
+
+    annotations = {
+        'open_attendance_id': _open_attendance_subquery(),
+        'approved_leave_id': Subquery(approved_leave),
+    }
+    if point is not None:
+        annotations['at_own_outlet'] = _at_own_outlet(point)
+
+    employee = Employee.objects.annotate(**annotations).get(user_id=user.id)
+    return PunchContext(employee, today)
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import PunchEvent
+
+
+def store_punch_selfie(photo_file, when=None):
+    """
+    Saves a punch selfie under a content-addressed, date-partitioned name:
+    punch_selfies/YYYY/MM/DD/<sha256>.<ext>. Identical bytes map to the same
+    file, and no earlier selfie is ever overwritten or deleted.
+
+    Returns (storage_name, sha256).
+    """
+    when = timezone.localtime(when or timezone.now())
+    photo_file.seek(0)
+    content = photo_file.read()
+    photo_file.seek(0)
+
+    digest = hashlib.sha256(content).hexdigest()
+    ext = os.path.splitext(photo_file.name or '')[1].lower() or '.jpg'
+    name = f"punch_selfies/{when:%Y/%m/%d}/{digest}{ext}"
+
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name, digest
+
+
+def punch_device(request):
+    """Device label for the event: an explicit `device` field, else the User-Agent."""
+    device = request.data.get('device') or request.META.get('HTTP_USER_AGENT', '')
+    return str(device)[:255]
+
+
+def record_punch_event(employee, kind, selfie, latitude, longitude, device, attendance=None,
+                       verification_status='Pending', result=None, error=None):
+    """
+    Appends a PunchEvent. `selfie` is the (name, sha256) pair from
+    store_punch_selfie; `result` an optional FaceVerificationResult.
+    """
+    selfie_name, selfie_sha256 = selfie
+    event = PunchEvent(
+        employee=employee,
+        attendance=attendance,
+        kind=kind,
+        selfie_sha256=selfie_sha256,
+        latitude=latitude,
+        longitude=longitude,
+        device=device,
+        verification_status=verification_status,
+        error=error,
+    )
+    event.selfie.name = selfie_name
+    if result is not None:
+        event.similarity = result.similarity
+        event.backend = result.backend
+        event.latency_ms = result.latency_ms
+        event.verified_at = timezone.now()
+    event.save()
+    return event
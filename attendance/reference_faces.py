@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+import logging
+
+from django.conf import settings
+
+from .face_verification import get_face_verifier
+from .models import ReferenceFace
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceTemplateCache:
+    """
+    Small thread-safe LRU of employee_id -> (backend, source_name, template).
+
+    Entries are only trusted when backend and source_name still match the
+    employee row, so a reference photo replaced in another worker process
+    is picked up on the next punch without any cross-process signalling.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, employee_id, backend, source_name):
+        with self._lock:
+            entry = self._entries.get(employee_id)
+            if entry is None or entry[0] != backend or entry[1] != source_name:
+                return None
+            self._entries.move_to_end(employee_id)
+            return entry[2]
+
+    def put(self, employee_id, backend, source_name, template):
+        with self._lock:
+            self._entries[employee_id] = (backend, source_name, template)
+            self._entries.move_to_end(employee_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, employee_id):
+        with self._lock:
+            self._entries.pop(employee_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+reference_cache = ReferenceTemplateCache(settings.FACE_REFERENCE_CACHE_SIZE)
+
+
+def _read_reference_photo(employee):
+    employee.reference_photo.open('rb')
+    try:
+        return employee.reference_photo.read()
+    finally:
+        employee.reference_photo.close()
+
+
+def build_reference_face(employee):
+    """
+    Builds and stores the verification template for the employee's current
+    reference photo. Called once per upload, not per punch.
+    """
+    verifier = get_face_verifier()
+    reference_cache.invalidate(employee.employee_id)
+
+    if not employee.reference_photo:
+        ReferenceFace.objects.filter(employee_id=employee.employee_id).delete()
+        return None
+
+    template = verifier.build_reference(_read_reference_photo(employee))
+    ReferenceFace.objects.update_or_create(
+        employee_id=employee.employee_id,
+        defaults={
+            'backend': verifier.name,
+            'source_name': employee.reference_photo.name,
+            'template': template,
+        }
+    )
+    reference_cache.put(employee.employee_id, verifier.name, employee.reference_photo.name, template)
+    return template
+
+
+def get_reference_template(employee):
+    """
+    Returns the reference template for a punch: from the in-process LRU,
+    else the stored ReferenceFace row, else built from the photo (first
+    punch after a backend switch or for photos uploaded before templates
+    existed).
+    """
+    verifier = get_face_verifier()
+    source_name = employee.reference_photo.name
+
+    template = reference_cache.get(employee.employee_id, verifier.name, source_name)
+    if template is not None:
+        return template
+
+    stored = ReferenceFace.objects.filter(
+        employee_id=employee.employee_id,
+        backend=verifier.name,
+        source_name=source_name
+    ).values_list('template', flat=True).first()
+
+    if stored is not None:
+        template = bytes(stored)
+        reference_cache.put(employee.employee_id, verifier.name, source_name, template)
+        return template
+
+    logger.info(f"Building missing reference template for employee {employee.employee_id}")
+    return build_reference_face(employee)
@@ -0,0 +1,84 @@
+import os
+import time
+import logging
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .utils import detect_largest_face, crop_with_margin
+
+logger = logging.getLogger(__name__)
+
+# Faces are searched for on a smaller proxy image; the Haar cascade cost
+# grows with pixel count and a selfie face is never tiny
+DETECT_MAX_DIMENSION = 480
+
+
+def preprocess_selfie(photo_file):
+    """
+    Normalises an uploaded punch selfie before it is verified and stored:
+    downscale to SELFIE_MAX_DIMENSION, optionally crop to the face plus
+    SELFIE_FACE_MARGIN, and re-encode as JPEG at SELFIE_JPEG_QUALITY.
+
+    Returns (file, report). `file` is the processed ContentFile, or the
+    original upload when pre-processing is disabled or the image cannot be
+    decoded (the verifier will reject it later). `report` holds byte sizes
+    and per-stage timings in milliseconds.
+    """
+    report = {"timings_ms": {}}
+    timings = report["timings_ms"]
+
+    if not settings.SELFIE_PREPROCESS_ENABLED:
+        return photo_file, report
+
+    def lap(stage, started):
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    photo_file.seek(0)
+    raw = photo_file.read()
+    photo_file.seek(0)
+    report["bytes_in"] = len(raw)
+
+    image = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+    started = lap("decode", started)
+    if image is None:
+        return photo_file, report
+
+    scale = settings.SELFIE_MAX_DIMENSION / max(image.shape[:2])
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    started = lap("downscale", started)
+
+    report["face_found"] = None
+    if settings.SELFIE_FACE_CROP:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        detect_scale = min(DETECT_MAX_DIMENSION / max(gray.shape), 1)
+        if detect_scale < 1:
+            gray = cv2.resize(gray, None, fx=detect_scale, fy=detect_scale, interpolation=cv2.INTER_AREA)
+
+        face_box = detect_largest_face(gray)
+        report["face_found"] = face_box is not None
+        if face_box is not None:
+            face_box = [int(v / detect_scale) for v in face_box]
+            image = crop_with_margin(image, face_box, settings.SELFIE_FACE_MARGIN)
+        started = lap("face_crop", started)
+
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, settings.SELFIE_JPEG_QUALITY])
+    lap("encode", started)
+    if not ok:
+        return photo_file, report
+
+    processed = buffer.tobytes()
+    report["bytes_out"] = len(processed)
+    report["size"] = [int(image.shape[1]), int(image.shape[0])]
+
+    base_name = os.path.splitext(os.path.basename(photo_file.name or 'selfie'))[0]
+    logger.info(
+        f"Selfie pre-processed {report['bytes_in']} -> {report['bytes_out']} bytes "
+        f"(face_found={report['face_found']}, timings={timings})"
+    )
+    return ContentFile(processed, name=f"{base_name}.jpg"), report
@@ -0,0 +1,22 @@
+import logging
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from main.models import Employee
+from .reference_faces import build_reference_face
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Employee)
+def refresh_reference_face(sender, instance, created, **kwargs):
+    # Employee.save flags the instance when reference_photo was set or replaced
+    if not getattr(instance, '_reference_photo_changed', False):
+        return
+    instance._reference_photo_changed = False
+    try:
+        build_reference_face(instance)
+    except Exception as e:
+        # Punches fall back to building the template on demand
+        logger.warning(f"Could not build reference face for employee {instance.employee_id}: {str(e)}")
@@ -1,3 +1,752 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import io
+import shutil
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+from unittest import mock
 
-# Create your tests here.
+import cv2
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DataError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import numpy as np
+from rest_framework.decorators import api_view
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from aas.exports import csv_stream, xlsx_stream
+from main.geofence import get_geofence_index
+from main.models import Agency, Attendance, Employee, EmpLeave, Holiday, LeaveType, Outlet
+from .daily_report import COLUMNS as REPORT_COLUMNS
+from .face_verification import (
+    FaceVerificationError, FaceVerificationResult, LocalFaceVerifier, RekognitionFaceVerifier, get_face_verifier,
+)
+from . import imports, verification_queue
+from .idempotency import idempotent
+from .imports import claim_next_job, process_job
+from .models import IdempotencyKey, ImportJob, ImportRowError, PunchEvent, VerificationJob
+from .selfie_pipeline import preprocess_selfie
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, SELFIE_PREPROCESS_ENABLED=False, FACE_VERIFICATION_MODE='sync')
+class PunchTestCase(TestCase):
+    """
+    An employee with one outlet and a reference photo. The face verifier is
+    replaced so only the database work of the punch endpoints runs.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create(username='punch-user')
+        self.outlet = Outlet.objects.create(name='Outlet', address='Street', latitude=6.9, longitude=79.8, radius_meters=100)
+        with mock.patch('attendance.signals.build_reference_face'):
+            self.employee = Employee.objects.create(
+                user=self.user,
+                fullname='Punch User',
+                date_of_birth='1990-01-01',
+                reference_photo=SimpleUploadedFile('ref.jpg', b'ref'),
+            )
+        self.employee.outlets.add(self.outlet)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        matched = FaceVerificationResult(True, 99.0, 'test', 1.0)
+        patches = [
+            mock.patch('attendance.api.get_reference_template', return_value=b'ref'),
+            mock.patch('attendance.api.get_face_verifier', return_value=mock.Mock(verify=mock.Mock(return_value=matched))),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Build the geofence index outside the measured requests
+        get_geofence_index().rebuild()
+
+    def punch_in(self, **extra):
+        return self.client.post('/api/attendance/punch-in/', {
+            'check_in_lat': 6.9,
+            'check_in_long': 79.8,
+            'photo_check_in': SimpleUploadedFile('in.jpg', b'selfie'),
+        }, format='multipart', **extra)
+
+    def punch_out(self):
+        return self.client.post('/api/attendance/punch-out/', {
+            'check_out_lat': 6.9,
+            'check_out_long': 79.8,
+            'photo_check_out': SimpleUploadedFile('out.jpg', b'selfie'),
+        }, format='multipart')
+
+
+class PunchQueryCountTests(PunchTestCase):
+    """
+    Guards the number of queries one punch costs, including the on_commit
+    callbacks (TestCase doesn't run them by itself).
+    """
+
+    def test_punch_in_query_count(self):
+        # context, employee lock, attendance insert, punch event insert, rollup queue insert,
+        # punch events for the response (+ SAVEPOINT/RELEASE: the atomic block nests in the
+        # test transaction); nothing runs after commit
+        with self.assertNumQueries(8), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.punch_in()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(response.status_code, 201)
+        attendance = Attendance.objects.get()
+        self.assertEqual(attendance.punchin_verification, 'Verified')
+        self.assertEqual(attendance.punch_events.get().verification_status, 'Verified')
+
+    def test_punch_in_on_leave_day_query_count(self):
+        EmpLeave.objects.create(employee=self.employee, leave_date=timezone.now().date(), status='approved')
+        # ... plus the leave rejection (read for the leave-balance ledger, update, rollup queue insert)
+        with self.assertNumQueries(11), self.captureOnCommitCallbacks(execute=True):
+            response = self.punch_in()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(EmpLeave.objects.get().status, 'rejected')
+
+    def test_refused_punch_keeps_the_leave(self):
+        EmpLeave.objects.create(employee=self.employee, leave_date=timezone.now().date(), status='approved')
+        # A concurrent duplicate opened the session between the context read and the lock
+        with mock.patch('attendance.punch_context.PunchContext.lock', return_value=42):
+            response = self.punch_in()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(EmpLeave.objects.get().status, 'approved')
+
+    def test_punch_in_with_open_session_query_count(self):
+        self.punch_in()
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            response = self.punch_in()
+        self.assertEqual(response.status_code, 400)
+
+    def test_punch_out_query_count(self):
+        self.punch_in()
+        # context, attendance fetch, employee lock, attendance update, punch event
+        # insert, rollup queue insert, punch events for the response (+ SAVEPOINT/RELEASE)
+        with self.assertNumQueries(9), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.punch_out()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(Attendance.objects.get().check_out_time)
+
+    def test_rejected_punch_is_kept_as_event(self):
+        unmatched = FaceVerificationResult(False, 40.0, 'test', 1.0)
+        with mock.patch('attendance.api.get_face_verifier', return_value=mock.Mock(verify=mock.Mock(return_value=unmatched))):
+            response = self.punch_in()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+        event = PunchEvent.objects.get()
+        self.assertEqual((event.verification_status, event.similarity, event.attendance_id), ('Rejected', 40.0, None))
+
+
+class PunchLocationTests(PunchTestCase):
+    """Outlet membership is read with the punch, not from the per-process geofence index."""
+
+    def test_removed_member_cannot_punch_in(self):
+        self.employee.outlets.remove(self.outlet)  # the geofence index isn't told
+        response = self.punch_in()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "You're not at an allowed location for punch-in")
+
+        self.employee.outlets.add(self.outlet)
+        self.assertEqual(self.punch_in().status_code, 201)
+
+    def test_outside_geofence(self):
+        response = self.client.post('/api/attendance/punch-in/', {
+            'check_in_lat': 7.0, 'check_in_long': 79.8, 'photo_check_in': SimpleUploadedFile('in.jpg', b'selfie'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+
+@override_settings(SELFIE_PREPROCESS_ENABLED=True, SELFIE_MAX_DIMENSION=1024, SELFIE_FACE_CROP=True, SELFIE_FACE_MARGIN=0.5)
+class SelfiePipelineTests(PunchTestCase):
+    """Selfies are downscaled, cropped to the face and re-encoded as JPEG before they are verified and stored."""
+
+    def upload(self, width=2000, height=1000, name='in.png'):
+        return SimpleUploadedFile(name, encode_png(np.full((height, width, 3), 128, np.uint8)))
+
+    def test_downscaled_to_jpeg(self):
+        photo, report = preprocess_selfie(self.upload())
+        self.assertEqual(photo.name, 'in.jpg')
+        image = cv2.imdecode(np.frombuffer(photo.read(), np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(image.shape[:2], (512, 1024))
+        self.assertEqual((report['size'], report['face_found']), ([1024, 512], False))
+        self.assertEqual(report['bytes_out'], photo.size)
+        self.assertEqual(set(report['timings_ms']), {'decode', 'downscale', 'face_crop', 'encode'})
+
+    def test_small_selfie_is_not_upscaled(self):
+        photo, report = preprocess_selfie(self.upload(320, 240))
+        self.assertEqual(report['size'], [320, 240])
+
+    def test_cropped_to_face(self):
+        # The box is found on the 480px detection proxy and scaled back up
+        with mock.patch('attendance.selfie_pipeline.detect_largest_face', return_value=(200, 100, 60, 60)):
+            photo, report = preprocess_selfie(self.upload())
+        self.assertEqual((report['size'], report['face_found']), ([256, 256], True))
+
+    def test_unprocessable_uploads_are_passed_through(self):
+        upload = SimpleUploadedFile('in.jpg', b'not an image')
+        photo, report = preprocess_selfie(upload)
+        self.assertIs(photo, upload)
+        self.assertEqual(report['bytes_in'], len(b'not an image'))
+        self.assertNotIn('bytes_out', report)
+
+        upload = self.upload()
+        with override_settings(SELFIE_PREPROCESS_ENABLED=False):
+            self.assertIs(preprocess_selfie(upload)[0], upload)
+
+    def test_punch_stores_processed_selfie(self):
+        response = self.client.post('/api/attendance/punch-in/', {
+            'check_in_lat': 6.9, 'check_in_long': 79.8, 'photo_check_in': self.upload(),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        event = PunchEvent.objects.get()
+        self.assertTrue(event.selfie.name.endswith('.jpg'))
+        self.assertEqual(event.selfie.height, 512)
+        self.assertEqual(Attendance.objects.get().verification_notes['punchin_selfie']['size'], [1024, 512])
+
+    def test_undecodable_selfie_is_rejected(self):
+        reference = np.ones(LocalFaceVerifier.GRID ** 2 * LocalFaceVerifier.BINS, np.float32).tobytes()
+        with mock.patch('attendance.api.get_reference_template', return_value=reference), \
+                mock.patch('attendance.api.get_face_verifier', return_value=LocalFaceVerifier()):
+            response = self.punch_in()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+        event = PunchEvent.objects.get()
+        self.assertEqual((event.verification_status, event.error), ('Rejected', "Invalid or corrupted image file."))
+
+
+class IdempotentPunchTests(PunchTestCase):
+    """Retried punches carrying the same Idempotency-Key are answered from the stored response."""
+
+    def test_retry_replays_stored_response(self):
+        first = self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-1')
+        with self.assertNumQueries(1):
+            retry = self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replay'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_new_key_is_processed(self):
+        self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-1')
+        response = self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-2')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Idempotent-Replay', response)
+
+    def test_key_released_when_view_fails(self):
+        @api_view(['POST'])
+        @idempotent('punch_in')
+        def failing(request):
+            raise RuntimeError('database gone')
+
+        request = APIRequestFactory().post('/', {}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        force_authenticate(request, self.user)
+        with self.assertRaises(RuntimeError):
+            failing(request)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        create = IdempotencyKey.save
+
+        def store_response(record, *args, **kwargs):
+            if kwargs.get('update_fields'):
+                raise RuntimeError('database gone')
+            return create(record, *args, **kwargs)
+
+        with mock.patch.object(IdempotencyKey, 'save', store_response):
+            self.assertEqual(self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-2').status_code, 201)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_in_flight_duplicate_is_rejected(self):
+        IdempotencyKey.objects.create(user=self.user, endpoint='punch_in', key='retry-1')
+        response = self.punch_in(HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Attendance.objects.exists())
+
+
+@override_settings(FACE_VERIFICATION_MODE='async', FACE_VERIFICATION_MAX_ATTEMPTS=2)
+class VerificationQueueTests(PunchTestCase):
+    """Async punches are saved as 'Pending' and verified by the queue workers."""
+
+    def setUp(self):
+        super().setUp()
+        self.verify = mock.Mock(return_value=FaceVerificationResult(True, 99.0, 'test', 1.0))
+        patches = [
+            mock.patch('attendance.verification_queue.get_reference_template', return_value=b'ref'),
+            mock.patch('attendance.verification_queue.get_face_verifier', return_value=mock.Mock(verify=self.verify)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.assertEqual(self.punch_in().status_code, 201)
+        self.job = VerificationJob.objects.get()
+
+    def test_claim(self):
+        self.assertEqual(Attendance.objects.get().punchin_verification, 'Pending')
+        job = verification_queue.claim_next_job()
+        self.assertEqual((job.pk, job.status, job.attempts), (self.job.pk, 'running', 1))
+        self.assertIsNone(verification_queue.claim_next_job())
+
+        # A job left running by a crashed worker is claimed again after the timeout
+        VerificationJob.objects.update(started_at=timezone.now() - timedelta(seconds=settings.FACE_VERIFICATION_JOB_TIMEOUT + 1))
+        self.assertEqual(verification_queue.claim_next_job().attempts, 2)
+
+    def test_verified(self):
+        verification_queue.process_job(verification_queue.claim_next_job())
+        self.assertEqual(Attendance.objects.get().punchin_verification, 'Verified')
+        self.assertEqual(PunchEvent.objects.get().verification_status, 'Verified')
+        self.assertEqual(VerificationJob.objects.get().status, 'done')
+
+    def test_retried_then_failed(self):
+        self.verify.side_effect = ConnectionError('timed out')
+        verification_queue.process_job(verification_queue.claim_next_job())
+        job = VerificationJob.objects.get()
+        self.assertEqual((job.status, job.last_error), ('queued', 'timed out'))
+
+        verification_queue.process_job(verification_queue.claim_next_job())
+        job = VerificationJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(verification_queue.claim_next_job())
+        self.assertEqual(Attendance.objects.get().punchin_verification, 'Pending')  # left for a manager
+
+    def test_crashing_job_fails_after_max_attempts(self):
+        stale = timezone.now() - timedelta(seconds=settings.FACE_VERIFICATION_JOB_TIMEOUT + 1)
+        for attempt in (1, 2):
+            self.assertEqual(verification_queue.claim_next_job().attempts, attempt)
+            VerificationJob.objects.update(started_at=stale)  # the worker was killed mid-job
+
+        self.assertIsNone(verification_queue.claim_next_job())
+        job = VerificationJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(Attendance.objects.get().punchin_verification, 'Pending')
+
+    def test_attendance_deleted_after_claim(self):
+        job = verification_queue.claim_next_job()
+        Attendance.objects.all().delete()
+        verification_queue.process_job(job)
+        self.assertFalse(VerificationJob.objects.exists())
+        self.verify.assert_not_called()
+
+
+def encode_png(image):
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+def drawn_face():
+    image = np.full((200, 200), 128, np.uint8)
+    cv2.circle(image, (100, 100), 70, 220, -1)
+    cv2.circle(image, (75, 80), 12, 30, -1)
+    cv2.circle(image, (125, 80), 12, 30, -1)
+    cv2.ellipse(image, (100, 135), (30, 12), 0, 0, 180, 30, 4)
+    return image
+
+
+@override_settings(FACE_LOCAL_SIMILARITY_THRESHOLD=85)
+class LocalFaceVerifierTests(TestCase):
+    """
+    LBP embeddings of the local backend. The drawn test images aren't
+    something the Haar cascade finds, so matching tests give it the box.
+    """
+
+    def setUp(self):
+        self.verifier = LocalFaceVerifier()
+
+    def test_match(self):
+        face = drawn_face()
+        pattern = cv2.GaussianBlur((np.indices((200, 200)).sum(axis=0) % 16 * 16).astype(np.uint8), (3, 3), 0)
+        with mock.patch('attendance.face_verification.detect_largest_face', return_value=(20, 20, 160, 160)):
+            reference = self.verifier.build_reference(encode_png(face))
+            same = self.verifier.verify(reference, encode_png(face))
+            brighter = self.verifier.verify(reference, encode_png(cv2.add(face, 20)))
+            other = self.verifier.verify(reference, encode_png(pattern))
+
+        self.assertEqual((same.matched, same.similarity, same.backend), (True, 100.0, 'local'))
+        self.assertIsNotNone(same.latency_ms)
+        self.assertTrue(brighter.matched)
+        self.assertFalse(other.matched)
+        self.assertLess(other.similarity, 85)
+
+    def test_unusable_images(self):
+        with self.assertRaisesMessage(FaceVerificationError, "No face detected."):
+            self.verifier.build_reference(encode_png(np.full((200, 200), 128, np.uint8)))
+        with self.assertRaisesMessage(FaceVerificationError, "Invalid or corrupted image file."):
+            self.verifier.build_reference(b'not an image')
+
+    def test_backend_setting(self):
+        for backend, backend_class in [
+            ('local', LocalFaceVerifier),
+            ('rekognition', RekognitionFaceVerifier),
+            ('attendance.face_verification.LocalFaceVerifier', LocalFaceVerifier),
+        ]:
+            with override_settings(FACE_VERIFICATION_BACKEND=backend), mock.patch('attendance.face_verification._verifier', None):
+                self.assertIsInstance(get_face_verifier(), backend_class)
+
+
+class ReportTestCase(TestCase):
+    """An outlet (with agency) and a leave type; employees are added per test."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='report-user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        agency = Agency.objects.create(name='Agency', address='Street')
+        self.outlet = Outlet.objects.create(name='Outlet', address='Street', latitude=6.9, longitude=79.8, radius_meters=100, agency=agency)
+        self.leave_type = LeaveType.objects.create(
+            att_type='AL', att_type_name='Annual', att_type_group='Leave', att_type_per_day_hours=8,
+            pay_percentage=100, att_type_no_of_days_in_year=14, year_start_date='2025-01-01', year_end_date='2025-12-31',
+        )
+        self.start = date(2025, 3, 1)
+
+    def add_employees(self, count):
+        employees = []
+        for n in range(Employee.objects.count(), Employee.objects.count() + count):
+            employee = Employee.objects.create(
+                user=User.objects.create(username=f'report-{n}'), fullname=f'Employee {n}',
+                empcode=f'E{n}', idnumber=f'ID{n}', date_of_birth='1990-01-01',
+            )
+            employee.outlets.add(self.outlet)
+            employees.append(employee)
+        return employees
+
+
+
+class GenerateReportTests(ReportTestCase):
+    """generate_report reads each table once, whatever the range and headcount."""
+
+    def get_report(self, days):
+        end = self.start + timedelta(days=days - 1)
+        return self.client.get('/api/attendance/report/', {'start_date': str(self.start), 'end_date': str(end)})
+
+    def test_rows(self):
+        first, second = self.add_employees(2)
+        check_in = timezone.now()
+        Attendance.objects.create(employee=first, date=self.start, check_in_time=check_in, check_in_lat=0, check_in_long=0)
+        EmpLeave.objects.create(employee=second, leave_date=self.start, status='approved', leave_type=self.leave_type)
+        EmpLeave.objects.create(employee=second, leave_date=self.start + timedelta(days=1), status='pending', leave_type=self.leave_type)
+        Holiday.objects.create(hcode='H1', holiday_name='Holiday', holiday_type='public', holiday_type_name='Public', hdate=self.start)
+
+        response = self.get_report(2)
+
+        self.assertEqual(response.status_code, 200)
+        rows = {(row['name'], row['date']): row for row in response.data}
+        self.assertEqual(len(rows), 4)
+        worked = rows[('Employee 0', self.start)]
+        self.assertEqual((worked['emp_id'], worked['id_no'], worked['type'], worked['time_in']), ('E0', 'ID0', 'WD', check_in))
+        self.assertEqual((worked['hcode'], worked['agency']), ('H1', 'Agency'))
+        on_leave = rows[('Employee 1', self.start)]
+        self.assertEqual((on_leave['type'], on_leave['type_name'], on_leave['time_in']), ('AL', 'Annual', ''))
+        pending = rows[('Employee 1', self.start + timedelta(days=1))]
+        self.assertEqual((pending['type'], pending['hcode']), ('', ''))
+
+    def test_query_count_is_constant(self):
+        self.add_employees(2)
+        # employees, their outlets (+agency), roles, attendance, leaves, holidays
+        with self.assertNumQueries(6):
+            self.get_report(3)
+
+        for employee in self.add_employees(20):
+            for offset in range(0, 30, 3):
+                Attendance.objects.create(employee=employee, date=self.start + timedelta(days=offset), check_in_time=timezone.now(), check_in_lat=0, check_in_long=0)
+        with self.assertNumQueries(6):
+            response = self.get_report(30)
+        self.assertEqual(len(response.data), 22 * 30)
+
+
+class ExportReportTests(ReportTestCase):
+    """report/export/ streams the generate_report rows as CSV or XLSX."""
+
+    def export(self, file_format):
+        return self.client.get('/api/attendance/report/export/', {
+            'start_date': str(self.start), 'end_date': str(self.start + timedelta(days=1)), 'file_format': file_format,
+        })
+
+    def test_csv(self):
+        self.add_employees(2)
+        response = self.export('csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(','), list(REPORT_COLUMNS))
+        self.assertEqual(len(lines), 1 + 2 * 2)
+        self.assertTrue(lines[1].startswith('E0,,ID0,Employee 0,2025-03-01,'))
+
+    def test_xlsx(self):
+        self.add_employees(3)
+        response = self.export('xlsx')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', ns)
+        self.assertEqual(len(rows), 1 + 3 * 2)
+        self.assertEqual([t.text for t in rows[1].iter('{%s}t' % ns['s'])][:4], ['E0', 'ID0', 'Employee 0', '2025-03-01'])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.export('pdf').status_code, 400)
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_cell_values(self):
+        checked_in = datetime(2025, 3, 1, 3, 30, tzinfo=dt_timezone.utc)
+        lines = ''.join(csv_stream(['at'], [[checked_in]])).lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[1], '2025-03-01T09:00:00+05:30')  # local time, like the API
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(xlsx_stream(['a', 'b', 'c'], [[float('nan'), float('inf'), 1.5]])))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<row><c/><c/><c><v>1.5</v></c></row>', sheet)
+
+
+class AttendanceListingTests(ReportTestCase):
+    """The attendance list endpoints read one page in one query, whatever its size."""
+
+    def setUp(self):
+        super().setUp()
+        caches[settings.ACCESS_SCOPE_CACHE_ALIAS].clear()
+        self.employees = self.add_employees(6)
+        now = timezone.now()
+        Attendance.objects.bulk_create([
+            Attendance(employee=employee, date=self.start + timedelta(days=d), check_in_time=now,
+                       check_in_lat=0, check_in_long=0, status='Present')
+            for employee in self.employees
+            for d in range(10)
+        ])
+        other_outlet = Outlet.objects.create(name='Other', address='Street', latitude=0, longitude=0, radius_meters=100)
+        outsider = Employee.objects.create(user=User.objects.create(username='outsider'), fullname='Outsider', date_of_birth='1990-01-01')
+        outsider.outlets.add(other_outlet)
+        Attendance.objects.create(employee=outsider, date=self.start, check_in_time=now, check_in_lat=0, check_in_long=0)
+
+    def test_all_attendance_query_count(self):
+        self.user.is_staff = True
+        self.user.save()
+        for page_size in (5, 50):
+            with self.assertNumQueries(1):
+                body = self.client.get('/api/attendance/get_attall/', {'page_size': page_size}).json()
+            self.assertEqual(len(body['results']), page_size)
+        self.assertEqual(body['results'][0]['employee'], self.employees[-1].fullname)
+
+    def test_outlet_attendance_scoped_and_paged(self):
+        manager = self.employees[0]
+        manager.user.groups.add(Group.objects.create(name='Manager'))
+        self.client.force_authenticate(manager.user)
+
+        seen, params = [], {'page_size': 25}
+        queries = 4  # access scope (groups, employee, outlets) + page
+        while True:
+            with self.assertNumQueries(queries):
+                body = self.client.get('/api/attendance/outlet/', params).json()
+            queries = 1  # scope cached across requests
+            seen += [row['attendance_id'] for row in body['results']]
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+
+        expected = Attendance.objects.filter(employee__in=self.employees).order_by('-date', '-attendance_id')
+        self.assertEqual(seen, list(expected.values_list('attendance_id', flat=True)))
+
+    def test_date_range(self):
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get('/api/attendance/get_attall/', {
+            'start_date': str(self.start + timedelta(days=2)), 'end_date': str(self.start + timedelta(days=3)),
+        }).json()
+        self.assertEqual(len(body['results']), 12)
+        self.assertEqual(self.client.get('/api/attendance/get_attall/', {'start_date': '03/01/2025'}).status_code, 400)
+
+
+class BulkAddAttendanceTests(ReportTestCase):
+    """bulk_add_attendance upserts a whole outlet in a constant number of queries."""
+
+    def post(self, employee_ids, check_out='17:30'):
+        return self.client.post('/api/attendance/bulk-add/', {
+            'employee_ids': employee_ids, 'outlet_id': self.outlet.id,
+            'date': '2025-03-01', 'check_in_time': '08:00', 'check_out_time': check_out,
+        }, format='json').json()
+
+    def test_constant_queries_and_upsert(self):
+        employees = self.add_employees(30)
+        ids = [e.employee_id for e in employees]
+        Attendance.objects.create(employee=employees[0], date=self.start, check_in_time=timezone.now(), check_in_lat=0, check_in_long=0)
+        EmpLeave.objects.create(employee=employees[1], leave_date=self.start, leave_type=self.leave_type, status='approved')
+
+        # outlet, employees (locked), leaves, existing rows, update, insert, rollup queue, savepoint pair
+        for batch in (ids[:10], ids):
+            with self.assertNumQueries(9):
+                body = self.post(batch + [999999])
+        self.assertEqual(len(body['successful_updates']), 29)
+        self.assertEqual(body['leave_updates'], [{'employee_id': ids[1], 'error': 'Employee has an approved leave on this date.'}])
+        self.assertEqual(body['failed_updates'], [{'employee_id': 999999, 'error': 'Employee not found.'}])
+        self.assertEqual(Attendance.objects.filter(date=self.start).count(), 29)
+
+        updated = Attendance.objects.get(employee=employees[0], date=self.start)
+        self.assertEqual((updated.worked_hours, updated.ot_hours, updated.status), (9.5, 1.5, 'Present'))
+        self.assertEqual(updated.punchin_verification, 'Verified')
+
+    def test_hours_match_model_save(self):
+        employee = self.add_employees(1)[0]
+        self.post([employee.employee_id], check_out='11:00')
+        attendance = Attendance.objects.get(employee=employee)
+        self.assertEqual((attendance.worked_hours, attendance.ot_hours, attendance.status), (3.0, 0, 'Half Day'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMPORT_CHUNK_SIZE=2)
+class ImportTests(ReportTestCase):
+    """File imports run chunk by chunk through the bulk ingest services and keep rejected rows."""
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+
+    def upload(self, kind, name, content):
+        response = self.client.post('/api/attendance/imports/', {'kind': kind, 'file': SimpleUploadedFile(name, content)})
+        self.assertEqual(response.status_code, 202)
+        return ImportJob.objects.get(pk=response.json()['id'])
+
+    def run_job(self):
+        job = claim_next_job()
+        process_job(job)
+        return self.client.get(f'/api/attendance/imports/{job.id}/').json()
+
+    def test_attendance_csv(self):
+        first, second = self.add_employees(2)
+        stranger = Employee.objects.create(user=User.objects.create(username='stranger'), fullname='Stranger', date_of_birth='1990-01-01')
+        EmpLeave.objects.create(employee=second, leave_date=date(2025, 3, 2), leave_type=self.leave_type, status='approved')
+        content = (
+            'employee_id,empcode,date,check_in_time,check_out_time,outlet_id\n'
+            f'{first.employee_id},,2025-03-01,08:00,17:30,{self.outlet.id}\n'
+            f',{second.empcode},2025-03-01,08:00,11:00,{self.outlet.id}\n'
+            '\n'
+            f'{stranger.employee_id},,2025-03-01,08:00,17:00,{self.outlet.id}\n'
+            f'{second.employee_id},,2025-03-02,08:00,17:00,{self.outlet.id}\n'
+            f'{first.employee_id},,03/02/2025,08:00,17:00,{self.outlet.id}\n'
+        )
+        job = self.upload('attendance', 'attendance.csv', content.encode())
+        status = self.run_job()
+        self.assertEqual(
+            (status['status'], status['rows_total'], status['rows_done'], status['rows_ok'], status['rows_failed'], status['progress']),
+            ('done', 5, 5, 2, 3, 100.0),
+        )
+        self.assertEqual(Attendance.objects.get(employee=first).worked_hours, 9.5)
+        self.assertEqual(Attendance.objects.get(employee=second).status, 'Half Day')
+
+        response = self.client.get(f'/api/attendance/imports/{job.id}/errors/')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'row,error,date,check_in_time,check_out_time,outlet_id,employee_id,empcode')
+        self.assertEqual([line.split(',')[:2] for line in lines[1:]], [
+            ['5', 'Employee is not assigned to this outlet.'],
+            ['6', 'Employee has an approved leave on this date.'],
+            ['7', 'date must be a date (YYYY-MM-DD).'],
+        ])
+
+    def test_resumes_after_last_written_chunk(self):
+        employees = self.add_employees(3)
+        content = 'employee_id,leave_date,leave_type\n' + ''.join(
+            f'{e.employee_id},2025-03-05,AL\n' for e in employees
+        )
+        job = self.upload('leave', 'leaves.csv', content.encode())
+        ImportJob.objects.filter(pk=job.pk).update(rows_done=2, rows_ok=2)  # a worker died after the first chunk
+        status = self.run_job()
+        self.assertEqual((status['rows_done'], status['rows_ok']), (3, 3))
+        self.assertEqual(list(EmpLeave.objects.values_list('employee_id', 'status')), [(employees[2].employee_id, 'approved')])
+
+    @override_settings(IMPORT_MAX_ATTEMPTS=2)
+    def test_stale_job_fails_after_max_attempts(self):
+        job = self.upload('leave', 'leaves.csv', b'employee_id,leave_date,leave_type\n')
+        stale = timezone.now() - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT + 1)
+        self.assertEqual(claim_next_job().attempts, 1)
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)  # the worker was killed
+        self.assertEqual(claim_next_job().attempts, 2)
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)  # ... again
+
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_employee_xlsx(self):
+        manager = Group.objects.create(name='Manager')
+        Employee.objects.create(user=User.objects.create(username='Taken Name'), fullname='Taken Name', date_of_birth='1990-01-01')
+        header = ['Fullname', 'Email', 'Date of birth', 'Empcode', 'Outlets', 'Group']
+        rows = [
+            ['New One', 'one@example.com', '1991-02-03', 'N1', str(self.outlet.id), 'manager'],
+            ['New Two', 'two@example.com', 33000, 'N2', '', ''],
+            ['Taken Name', 'x@example.com', '1990-01-01', '', '', ''],
+            ['New Three', 'three@example.com', '1990-01-01', '', '999999', ''],
+        ]
+        content = b''.join(xlsx_stream(header, rows))
+        job = self.upload('employee', 'staff.xlsx', content)
+        status = self.run_job()
+        self.assertEqual((status['rows_ok'], status['rows_failed']), (2, 2))
+
+        one = Employee.objects.get(fullname='New One')
+        self.assertEqual(list(one.outlets.all()), [self.outlet])
+        self.assertEqual(list(one.user.groups.all()), [manager])
+        self.assertFalse(one.user.has_usable_password())
+        self.assertEqual(Employee.objects.get(fullname='New Two').date_of_birth, date(1990, 5, 7))
+        self.assertEqual(
+            list(ImportRowError.objects.filter(job=job).values_list('row_number', 'error')),
+            [(4, 'A user with this username already exists.'), (5, 'One or more outlets not found.')],
+        )
+
+    def test_employee_rows_checked_against_model_rules(self):
+        Group.objects.create(name='Manager')
+        content = (
+            'fullname,email,date_of_birth,empcode,phone_number,group\n'
+            'Good One,good@example.com,1990-01-01,G1,0771234567,manager\n'
+            'Bad Group,bg@example.com,1990-01-01,,,supervisors\n'
+            'Bad Group Id,bgi@example.com,1990-01-01,,,424242\n'
+            f'Long Code,lc@example.com,1990-01-01,{"X" * 21},,\n'
+            f'{"N" * 151},ln@example.com,1990-01-01,,,\n'
+            'Bad Email,not-an-email,1990-01-01,,,\n'
+        )
+        job = self.upload('employee', 'staff.csv', content.encode())
+        status = self.run_job()
+        self.assertEqual((status['status'], status['rows_ok'], status['rows_failed']), ('done', 1, 5))
+        errors = list(ImportRowError.objects.filter(job=job).order_by('row_number').values_list('row_number', 'error'))
+        self.assertEqual([number for number, _ in errors], [3, 4, 5, 6, 7])
+        self.assertEqual(errors[0][1], 'Group not found.')
+        self.assertEqual(errors[1][1], 'Group not found.')
+        self.assertTrue(errors[2][1].startswith('empcode: '))
+        self.assertTrue(errors[3][1].startswith('fullname: '))
+        self.assertTrue(errors[4][1].startswith('email: '))
+        self.assertEqual(list(Employee.objects.filter(fullname='Good One').values_list('empcode', flat=True)), ['G1'])
+
+    def test_rejected_chunk_is_retried_row_by_row(self):
+        employees = self.add_employees(3)
+        content = 'employee_id,leave_date,leave_type,remarks\n' + ''.join(
+            f'{e.employee_id},2025-03-05,AL,{"bad" if i == 1 else ""}\n' for i, e in enumerate(employees)
+        )
+        real_create_leaves = imports.create_leaves
+
+        def create_leaves(leaves):
+            leaves = list(leaves)
+            if any(leave.remarks == 'bad' for leave in leaves):
+                raise DataError('value too long')  # as PostgreSQL rejects a whole INSERT
+            return real_create_leaves(leaves)
+
+        job = self.upload('leave', 'leaves.csv', content.encode())
+        with mock.patch.object(imports, 'create_leaves', create_leaves):
+            status = self.run_job()
+        self.assertEqual((status['status'], status['rows_ok'], status['rows_failed']), ('done', 2, 1))
+        self.assertEqual(list(ImportRowError.objects.filter(job=job).values_list('row_number', flat=True)), [3])
+        self.assertEqual(EmpLeave.objects.count(), 2)
+
+    def test_missing_columns_fail_the_job(self):
+        self.upload('attendance', 'attendance.csv', b'employee_id,date\n1,2025-03-01\n')
+        status = self.run_job()
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['last_error'], 'Missing columns: check_in_time, check_out_time, outlet_id')
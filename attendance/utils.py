@@ -81,4 +81,32 @@ def simple_detect_and_crop_face(photo_file):
 
     except Exception as e:
         logger.error(f"Error during simple face cropping: {str(e)}", exc_info=True)
-        return None, "An error occurred while processing the image."
\ No newline at end of file
+        return None, "An error occurred while processing the image."
+
+
+def detect_largest_face(gray_image):
+    """
+    Returns (x, y, w, h) of the largest face in a grayscale image, or None.
+    """
+    faces = get_face_cascade().detectMultiScale(
+        gray_image,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(40, 40)
+    )
+    if len(faces) == 0:
+        return None
+    return max(faces, key=lambda f: f[2] * f[3])
+
+
+def crop_with_margin(image, face_box, margin):
+    """
+    Crops `face_box` out of `image`, widened by `margin` (fraction of the
+    face size) on every side and clamped to the image bounds.
+    """
+    x, y, w, h = face_box
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    top, left = max(y - pad_y, 0), max(x - pad_x, 0)
+    bottom = min(y + h + pad_y, image.shape[0])
+    right = min(x + w + pad_x, image.shape[1])
+    return image[top:bottom, left:right]
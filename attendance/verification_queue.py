@@ -0,0 +1,198 @@
+import time
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction, close_old_connections
+from django.db.models import Q, Min, Count
+from django.utils import timezone
+
+from main.models import Attendance
+from .face_verification import FaceVerificationError, get_face_verifier
+from .models import PunchEvent, VerificationJob
+from .reference_faces import get_reference_template
+
+logger = logging.getLogger(__name__)
+
+
+def is_async_verification():
+    return settings.FACE_VERIFICATION_MODE == 'async'
+
+
+def enqueue_verification(attendance, kind, punch_event):
+    """
+    Queues a face comparison for an attendance row that was saved as 'Pending'.
+    Call inside the same transaction that creates/updates the attendance row
+    and its PunchEvent.
+    """
+    return VerificationJob.objects.create(
+        attendance=attendance,
+        punch_event=punch_event,
+        kind=kind,
+        selfie_name=punch_event.selfie.name,
+    )
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest runnable job to 'running' and returns it.
+    SKIP LOCKED lets any number of worker threads/processes poll the same
+    table without blocking each other. Jobs left 'running' by a crashed
+    worker become runnable again after FACE_VERIFICATION_JOB_TIMEOUT, unless
+    they have used up FACE_VERIFICATION_MAX_ATTEMPTS: those are failed and
+    their punch stays 'Pending' for a manager to review.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.FACE_VERIFICATION_JOB_TIMEOUT)
+
+    with transaction.atomic():
+        VerificationJob.objects.filter(
+            status='running', started_at__lt=stale_before, attempts__gte=settings.FACE_VERIFICATION_MAX_ATTEMPTS,
+        ).update(status='failed', last_error="The verification stopped responding too many times.", finished_at=now)
+
+        job = (
+            VerificationJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | Q(status='running', started_at__lt=stale_before))
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = 'running'
+        job.started_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'attempts'])
+        return job
+
+
+def _apply_result(job, verification_status, note, result=None):
+    field = f"{job.kind}_verification"
+
+    with transaction.atomic():
+        attendance = Attendance.objects.select_for_update().get(pk=job.attendance_id)
+
+        # A manager may already have verified/rejected it by hand
+        if getattr(attendance, field) == 'Pending':
+            setattr(attendance, field, verification_status)
+
+        notes = attendance.verification_notes if isinstance(attendance.verification_notes, dict) else {}
+        notes[f"{job.kind}_auto_verification"] = note
+        attendance.verification_notes = notes
+        attendance.save(update_fields=[field, 'verification_notes', 'updated_at'])
+
+        if job.punch_event_id:
+            PunchEvent.objects.filter(pk=job.punch_event_id).update(
+                verification_status=verification_status,
+                similarity=result.similarity if result else None,
+                backend=result.backend if result else '',
+                latency_ms=result.latency_ms if result else None,
+                error=note.get("error"),
+                verified_at=timezone.now(),
+            )
+
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.last_error = None
+        job.save(update_fields=['status', 'finished_at', 'last_error'])
+
+
+def process_job(job):
+    """
+    Runs one claimed job and writes the outcome back to the attendance row.
+    Unusable images reject the punch; transient errors (e.g. AWS timeouts)
+    are retried up to FACE_VERIFICATION_MAX_ATTEMPTS.
+    """
+    try:
+        employee = Attendance.objects.select_related('employee').get(pk=job.attendance_id).employee
+
+        with default_storage.open(job.selfie_name, 'rb') as selfie:
+            target_bytes = selfie.read()
+
+        result = get_face_verifier().verify(get_reference_template(employee), target_bytes)
+        note = dict(result.as_dict(), checked_at=timezone.now().isoformat(), attempts=job.attempts)
+        _apply_result(job, 'Verified' if result.matched else 'Rejected', note, result)
+
+    except Attendance.DoesNotExist:
+        # Deleted since the punch; the cascade usually took the job with it
+        logger.warning(f"Verification job {job.id} dropped: attendance {job.attendance_id} no longer exists")
+        VerificationJob.objects.filter(pk=job.pk).update(
+            status='failed', last_error="Attendance no longer exists.", finished_at=timezone.now(),
+        )
+
+    except FaceVerificationError as e:
+        note = {"matched": False, "error": str(e), "checked_at": timezone.now().isoformat()}
+        _apply_result(job, 'Rejected', note)
+
+    except Exception as e:
+        logger.error(f"Verification job {job.id} failed (attempt {job.attempts}): {str(e)}")
+        job.last_error = str(e)
+        job.status = 'failed' if job.attempts >= settings.FACE_VERIFICATION_MAX_ATTEMPTS else 'queued'
+        job.finished_at = timezone.now() if job.status == 'failed' else None
+        job.save(update_fields=['status', 'last_error', 'finished_at'])
+
+
+def run_worker(stop_event, poll_interval=1.0):
+    """
+    Worker loop for one thread: claim, process, repeat; sleep when idle.
+    """
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            logger.error(f"Could not claim verification job: {str(e)}")
+            job = None
+
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        try:
+            process_job(job)
+        except Exception as e:
+            # Left 'running'; claimed again after FACE_VERIFICATION_JOB_TIMEOUT
+            logger.error(f"Verification job {job.id} could not be recorded: {str(e)}")
+            continue
+        logger.info(f"Verification job {job.id} ({job.kind}) finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    close_old_connections()
+
+
+def queue_metrics():
+    """
+    Queue depth and lag. `oldest_queued_seconds` is how long the oldest
+    waiting punch has been pending; `recent_avg_lag_seconds` is the average
+    enqueue-to-start delay over jobs finished in the last 15 minutes.
+    """
+    now = timezone.now()
+    counts = {s: 0 for s, _ in VerificationJob.STATUS_CHOICES}
+    grouped = (
+        VerificationJob.objects
+        .exclude(status='done')
+        .values('status')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in grouped:
+        counts[row['status']] = row['n']
+
+    oldest = VerificationJob.objects.filter(status='queued').aggregate(oldest=Min('created_at'))['oldest']
+
+    recent = VerificationJob.objects.filter(
+        status='done',
+        finished_at__gte=now - timedelta(minutes=15)
+    ).values_list('created_at', 'started_at')
+    lags = [(started - created).total_seconds() for created, started in recent if started]
+
+    return {
+        "queued": counts['queued'],
+        "running": counts['running'],
+        "failed": counts['failed'],
+        "oldest_queued_seconds": round((now - oldest).total_seconds(), 1) if oldest else 0,
+        "recent_completed": len(lags),
+        "recent_avg_lag_seconds": round(sum(lags) / len(lags), 2) if lags else 0,
+    }
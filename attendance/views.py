@@ -11,6 +11,7 @@ import subprocess
 from datetime import datetime
 from django.http import HttpResponse
 import psycopg2
+from main.access import get_access_scope
 
 
 
@@ -43,7 +44,8 @@ def db_health_check(request):
 @permission_classes([IsAuthenticated])
 def download_db_backup(request):
     # Permission check
-    if not request.user.groups.filter(name__in=["Manager", "Admin"]).exists() and not request.user.is_staff:
+    scope = get_access_scope(request)
+    if not scope.in_group("Manager", "Admin") and not scope.is_staff:
         return HttpResponse("Permission denied", status=403)
 
     # SQL filename with timestamp
@@ -0,0 +1,165 @@
+"""
+AccessScope: the requesting user's groups, employee and permitted outlet
+ids, resolved once instead of by a groups / employee / outlets query in
+every view and permission check.
+
+A scope is kept on the request, and across requests in the shared
+ACCESS_SCOPE_CACHE_ALIAS cache. Cache entries carry the user's scope
+version and a global one; main.signals bumps the user's version when their
+groups, employee or outlets change, and the global one for changes whose
+users aren't known (a group renamed, an outlet deleted,
+outlet.employees.clear()). Staff/superuser flags are read from the user
+object loaded for the request, so they are never stale.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Employee
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'access_scope'
+GLOBAL_VERSION_KEY = f'{PREFIX}:version'
+
+
+def _cache():
+    return caches[settings.ACCESS_SCOPE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'{PREFIX}:version:{user_id}'
+
+
+def _new_version():
+    # Never repeats a value a culled version key had, so an old entry can't match again
+    return time.time_ns()
+
+
+def _scope_key(user):
+    # date_joined tells apart users that reuse an id (e.g. a recreated test database)
+    return f'{PREFIX}:{user.pk}:{user.date_joined.timestamp()}'
+
+
+class AccessScope:
+    """What a user may see. `outlet_ids` are the outlets of the user's employee (empty without one)."""
+    __slots__ = ('user_id', 'is_staff', 'is_superuser', 'groups', 'employee_id', 'outlet_ids')
+
+    def __init__(self, user_id, is_staff, is_superuser, groups, employee_id, outlet_ids):
+        self.user_id = user_id
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.groups = frozenset(groups)
+        self.employee_id = employee_id
+        self.outlet_ids = frozenset(outlet_ids)
+
+    def __repr__(self):
+        return f"<AccessScope user={self.user_id} groups={sorted(self.groups)} employee={self.employee_id} outlets={sorted(self.outlet_ids)}>"
+
+    @property
+    def is_admin(self):
+        return self.is_staff or self.is_superuser
+
+    @property
+    def is_manager(self):
+        return 'Manager' in self.groups
+
+    def in_group(self, *names):
+        return not self.groups.isdisjoint(names)
+
+    def has_outlet(self, outlet_id):
+        return outlet_id in self.outlet_ids
+
+    def shares_outlet(self, outlet_ids):
+        """Whether any of `outlet_ids` (e.g. another employee's outlets) is one of the user's."""
+        return not self.outlet_ids.isdisjoint(outlet_ids)
+
+
+def _load(user):
+    groups = list(user.groups.values_list('name', flat=True))
+    employee_id = Employee.objects.filter(user=user).values_list('employee_id', flat=True).first()
+    outlet_ids = []
+    if employee_id is not None:
+        outlet_ids = list(Employee.outlets.through.objects.filter(employee_id=employee_id).values_list('outlet_id', flat=True))
+    return groups, employee_id, outlet_ids
+
+
+def _cached_or_load(user):
+    if not settings.ACCESS_SCOPE_CACHE_TTL:
+        return _load(user)
+    cache = _cache()
+    keys = [GLOBAL_VERSION_KEY, _version_key(user.pk), _scope_key(user)]
+    try:
+        found = cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f"Access scope cache read failed: {str(e)}")
+        return _load(user)
+
+    missing = {key: _new_version() for key in keys[:2] if key not in found}
+    if missing:
+        try:
+            cache.set_many(missing, None)
+        except Exception as e:
+            logger.warning(f"Access scope cache write failed: {str(e)}")
+            return _load(user)
+        found.update(missing)
+    versions = (found[keys[0]], found[keys[1]])
+    entry = found.get(keys[2])
+    if entry is not None and entry[0] == versions:
+        return entry[1]
+
+    # Versions read before loading: a change committed meanwhile leaves this entry outdated, not stale
+    data = _load(user)
+    try:
+        cache.set(keys[2], (versions, data), settings.ACCESS_SCOPE_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Access scope cache write failed: {str(e)}")
+    return data
+
+
+def get_access_scope(request):
+    """The AccessScope of request.user, resolved at most once per request."""
+    http_request = getattr(request, '_request', request)  # DRF Request -> HttpRequest
+    user = request.user
+    scope = getattr(http_request, '_access_scope', None)
+    if scope is not None and scope.user_id == user.pk:
+        return scope
+
+    if user.is_authenticated:
+        groups, employee_id, outlet_ids = _cached_or_load(user)
+        scope = AccessScope(user.pk, user.is_staff, user.is_superuser, groups, employee_id, outlet_ids)
+    else:
+        scope = AccessScope(None, False, False, (), None, ())
+    http_request._access_scope = scope
+    return scope
+
+
+def _bump(user_ids=None):
+    cache = _cache()
+    keys = [GLOBAL_VERSION_KEY] if user_ids is None else [_version_key(u) for u in user_ids]
+    for key in keys:
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:  # not set yet (or culled)
+                cache.set(key, _new_version(), None)
+        except Exception as e:
+            logger.warning(f"Access scope version bump failed for {key}: {str(e)}")
+
+
+def invalidate_users(user_ids):
+    """Outdates the cached scopes of `user_ids`, now and again once the current transaction commits."""
+    user_ids = {u for u in user_ids if u is not None}
+    if user_ids:
+        _bump(user_ids)
+        # Again after commit, in case a request re-cached the pre-commit rows in between
+        transaction.on_commit(lambda: _bump(user_ids))
+
+
+def invalidate_all():
+    """Outdates every cached scope (changes whose users aren't known)."""
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,116 @@
+"""
+Bulk attendance upsert keyed on (employee, date), used by
+bulk_add_attendance and the attendance file import.
+
+main_attendance has no unique (employee, date) constraint to upsert on
+(legacy data holds duplicates), so rows are matched in one query: existing
+ones are updated with bulk_update, missing ones inserted with bulk_create,
+all in one transaction with the employees locked like a punch does. Query
+count is constant in the number of rows.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Attendance, EmpLeave, Employee
+from .signals import bulk_written
+
+BATCH_SIZE = 500
+# Written on existing rows; employee / date are the key, created_at stays
+UPDATE_FIELDS = [
+    f.name for f in Attendance._meta.concrete_fields
+    if not f.primary_key and f.name not in ('employee', 'date', 'created_at')
+]
+
+
+def manual_attendance(employee_id, day, check_in, check_out, outlet, notes):
+    """
+    Unsaved Attendance for a shift entered by hand: located at `outlet`,
+    both punches verified, hours and status as bulk_add_attendance sets them.
+    """
+    delta = check_out - check_in
+    worked_hours = round(delta.total_seconds() / 3600, 2)
+    return Attendance(
+        employee_id=employee_id,
+        date=day,
+        check_in_time=check_in,
+        check_out_time=check_out,
+        worked_hours=worked_hours,
+        ot_hours=max(0, worked_hours - 8),
+        status='Present' if worked_hours >= 4 else 'Half Day',
+        check_in_lat=outlet.latitude,
+        check_in_long=outlet.longitude,
+        check_out_lat=outlet.latitude,
+        check_out_long=outlet.longitude,
+        punchin_verification='Verified',
+        punchout_verification='Verified',
+        verification_notes=notes,
+    )
+
+
+def upsert_attendance(records, skip_on_leave=True):
+    """
+    Saves unsaved Attendance `records` (employee_id and date set): a record
+    replaces the employee's attendance of that date or is inserted. Status,
+    worked and OT hours are derived as Attendance.save() does. With
+    skip_on_leave, employees with an approved leave that day are skipped.
+
+    Returns one result per record, in order:
+    {"employee_id", "date", "result": "created" | "updated" | None, "error", "on_leave": bool}.
+    """
+    records = list(records)
+    employee_ids = {r.employee_id for r in records}
+    dates = {r.date for r in records}
+    results = [
+        {"employee_id": r.employee_id, "date": r.date, "result": None, "error": None, "on_leave": False}
+        for r in records
+    ]
+
+    with transaction.atomic():
+        found = set(
+            Employee.objects.select_for_update()
+            .filter(employee_id__in=employee_ids)
+            .values_list('employee_id', flat=True)
+        )
+        on_leave = set()
+        if skip_on_leave:
+            on_leave = set(
+                EmpLeave.objects
+                .filter(employee_id__in=found, leave_date__in=dates, status='approved')
+                .values_list('employee_id', 'leave_date')
+            )
+        existing = {}
+        for employee_id, day, attendance_id in (
+            Attendance.objects.filter(employee_id__in=found, date__in=dates)
+            .values_list('employee_id', 'date', 'attendance_id')
+        ):
+            existing.setdefault((employee_id, day), []).append(attendance_id)
+
+        now = timezone.now()
+        to_update, to_create, seen = [], [], set()
+        for record, result in zip(records, results):
+            key = (record.employee_id, record.date)
+            if record.employee_id not in found:
+                result["error"] = "Employee not found."
+            elif key in on_leave:
+                result["on_leave"] = True
+                result["error"] = "Employee has an approved leave on this date."
+            elif key in seen:
+                result["error"] = "Duplicate record for this employee and date."
+            elif len(existing.get(key, ())) > 1:
+                result["error"] = "Multiple attendance records exist for this date."
+            else:
+                seen.add(key)
+                record.apply_worked_hours()
+                if key in existing:
+                    record.pk = existing[key][0]
+                    record.updated_at = now  # bulk_update skips auto_now
+                    to_update.append(record)
+                    result["result"] = "updated"
+                else:
+                    to_create.append(record)
+                    result["result"] = "created"
+
+        Attendance.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        Attendance.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        bulk_written.send(sender=Attendance, pairs=seen)
+    return results
@@ -0,0 +1,27 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# One background thread per process; storage deletes (S3/disk) never block a request
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='file-cleanup')
+
+
+def _delete_files(files):
+    for storage, name in files:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error(f"Could not delete replaced file {name}: {str(e)}")
+
+
+def delete_files_on_commit(files):
+    """
+    Deletes `files` (a list of (storage, name) pairs) in the background once
+    the current transaction commits. Nothing is deleted if it rolls back, so
+    a failed save never loses the file the row still points at.
+    """
+    if files:
+        transaction.on_commit(lambda: _executor.submit(_delete_files, list(files)))
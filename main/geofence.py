@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+import logging
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE = 111320
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Vectorised haversine: distance in meters from (lat, lon) to every point
+    in the `lats`/`lons` arrays. `lat`/`lon` may also be arrays that
+    broadcast against them.
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class GeofenceIndex:
+    """
+    In-memory index of active outlet geofences (latitude, longitude,
+    radius_meters) bucketed on a lat/long grid.
+
+    Every outlet is registered in each grid cell its circle overlaps, so a
+    point only needs to be tested against the outlets in its own cell.
+    Those candidates are checked with one vectorised haversine call.
+    Outlets can be added, changed or removed one at a time; the NumPy
+    arrays are rebuilt lazily on the next lookup after a change.
+
+    Only geometry is kept here: which outlets an employee belongs to is read
+    from the database per punch (see attendance.punch_context), so it is
+    never stale in other processes. Cell members are frozensets replaced on
+    write, so lookups can read them without the lock.
+    """
+
+    def __init__(self, cell_degrees=0.05):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._outlets = {}  # outlet_id -> (lat, lon, radius_meters)
+        self._cells = {}  # (row, col) -> frozenset(outlet_id)
+        self._arrays = None  # (ids, lats, lons, radii, row_by_id), rebuilt when dirty
+        self.built_at = None
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _covered_cells(self, lat, lon, radius):
+        lat_pad = radius / METERS_PER_DEGREE
+        lon_pad = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        top, left = self._cell(lat - lat_pad, lon - lon_pad)
+        bottom, right = self._cell(lat + lat_pad, lon + lon_pad)
+        return [(r, c) for r in range(top, bottom + 1) for c in range(left, right + 1)]
+
+    def _add(self, outlet_id, lat, lon, radius):
+        self._outlets[outlet_id] = (lat, lon, radius)
+        for cell in self._covered_cells(lat, lon, radius):
+            self._cells[cell] = self._cells.get(cell, frozenset()) | {outlet_id}
+
+    def _discard(self, outlet_id):
+        previous = self._outlets.pop(outlet_id, None)
+        if previous is None:
+            return
+        for cell in self._covered_cells(*previous):
+            members = self._cells.get(cell, frozenset()) - {outlet_id}
+            if members:
+                self._cells[cell] = members
+            else:
+                self._cells.pop(cell, None)
+
+    @staticmethod
+    def _is_indexable(outlet):
+        return (
+            outlet.status == 1
+            and outlet.latitude is not None
+            and outlet.longitude is not None
+            and outlet.radius_meters is not None
+        )
+
+    def rebuild(self):
+        from .models import Outlet
+
+        rows = Outlet.objects.filter(status=1).values_list('id', 'latitude', 'longitude', 'radius_meters')
+        outlets, cells = {}, {}
+        for outlet_id, lat, lon, radius in rows:
+            if lat is not None and lon is not None and radius is not None:
+                outlets[outlet_id] = (lat, lon, radius)
+                for cell in self._covered_cells(lat, lon, radius):
+                    cells.setdefault(cell, set()).add(outlet_id)
+
+        # Built aside and swapped in, so lookups never see a half-built index
+        with self._lock:
+            self._outlets = outlets
+            self._cells = {cell: frozenset(members) for cell, members in cells.items()}
+            self._arrays = None
+            self.built_at = time.monotonic()
+        logger.info(f"Geofence index built with {len(self._outlets)} active outlets")
+
+    def upsert(self, outlet):
+        with self._lock:
+            self._discard(outlet.id)
+            if self._is_indexable(outlet):
+                self._add(outlet.id, outlet.latitude, outlet.longitude, outlet.radius_meters)
+            self._arrays = None
+
+    def remove(self, outlet_id):
+        with self._lock:
+            self._discard(outlet_id)
+            self._arrays = None
+
+    def invalidate(self):
+        """Forces a full rebuild on the next get_geofence_index() call."""
+        self.built_at = None
+
+    def _get_arrays(self):
+        arrays = self._arrays
+        if arrays is None:
+            with self._lock:
+                ids = np.fromiter(self._outlets.keys(), dtype=np.int64, count=len(self._outlets))
+                values = np.array(list(self._outlets.values()), dtype=np.float64).reshape(-1, 3)
+                row_by_id = {int(outlet_id): row for row, outlet_id in enumerate(ids)}
+                arrays = (ids, values[:, 0], values[:, 1], values[:, 2], row_by_id)
+                self._arrays = arrays
+        return arrays
+
+    def _candidate_rows(self, cells, outlet_ids, row_by_id):
+        cells_by_key = self._cells  # a rebuild swaps in a new dict; members are never mutated
+        candidates = set()
+        for cell in cells:
+            candidates |= cells_by_key.get(cell, frozenset())
+        if outlet_ids is not None:
+            candidates = candidates.intersection(outlet_ids)
+        return np.array(sorted(row_by_id[c] for c in candidates if c in row_by_id), dtype=np.int64)
+
+    def containing_outlets(self, lat, lon, outlet_ids=None):
+        """
+        Returns the ids of active outlets whose geofence contains the point,
+        optionally restricted to `outlet_ids` (e.g. the employee's outlets).
+        """
+        ids, lats, lons, radii, row_by_id = self._get_arrays()
+        rows = self._candidate_rows([self._cell(lat, lon)], outlet_ids, row_by_id)
+        if rows.size == 0:
+            return []
+        distances = haversine_many(lat, lon, lats[rows], lons[rows])
+        return ids[rows][distances <= radii[rows]].tolist()
+
+    def bulk_containing(self, points, outlet_ids=None):
+        """
+        Bulk form of containing_outlets for many (lat, lon) pairs at once.
+        Returns one list of outlet ids per point, in input order.
+        """
+        if not points:
+            return []
+        ids, lats, lons, radii, row_by_id = self._get_arrays()
+        point_lats = np.array([p[0] for p in points], dtype=np.float64)
+        point_lons = np.array([p[1] for p in points], dtype=np.float64)
+
+        # Points are grouped by grid cell; each group is tested against its
+        # cell's candidates in one points x outlets distance matrix
+        by_cell = {}
+        for i, (lat, lon) in enumerate(points):
+            by_cell.setdefault(self._cell(lat, lon), []).append(i)
+
+        results = [[] for _ in points]
+        for cell, members in by_cell.items():
+            rows = self._candidate_rows([cell], outlet_ids, row_by_id)
+            if rows.size == 0:
+                continue
+            members = np.array(members)
+            distances = haversine_many(
+                point_lats[members, None], point_lons[members, None], lats[rows][None, :], lons[rows][None, :]
+            )
+            inside = distances <= radii[rows][None, :]
+            candidate_ids = ids[rows]
+            for i, mask in zip(members, inside):
+                results[i] = candidate_ids[mask].tolist()
+        return results
+
+
+# --- Global index, built on first use and refreshed every GEOFENCE_INDEX_TTL ---
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_geofence_index():
+    """
+    Returns the process-wide geofence index. Outlet saves in this process
+    update it immediately (see main.signals); the periodic rebuild picks
+    up outlet changes made by other worker processes.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = GeofenceIndex(settings.GEOFENCE_CELL_DEGREES)
+        index = _index
+        stale = index.built_at is None or time.monotonic() - index.built_at > settings.GEOFENCE_INDEX_TTL
+        if stale:
+            index.rebuild()
+    return index
+
+
+def peek_geofence_index():
+    """Returns the index only if it has already been built (used by signals)."""
+    return _index
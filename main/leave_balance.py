@@ -0,0 +1,188 @@
+"""
+Leave-balance ledger (main_leavebalance): pending and approved leave
+counts per (employee, leave type, leave year), so a balance is one indexed
+read instead of a COUNT per leave type.
+
+Counts move in the same transaction as the leave write: EmpLeave.save() and
+delete() do it for single rows; set-based writes (bulk_create,
+queryset.update) must report their changes with apply_deltas() or go
+through update_leave_status(). `manage.py rebuild_leave_balances`
+recomputes the ledger from main_empleave.
+
+A leave year starts on the anniversary of LeaveType.year_start_date.
+"""
+from collections import defaultdict
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Value, When
+from django.utils.dateparse import parse_date
+
+from .models import EmpLeave, LeaveBalance, LeaveType
+from .signals import bulk_written
+
+logger = logging.getLogger(__name__)
+
+COUNTED_STATUSES = ('pending', 'approved')
+
+
+def _anniversary(day, year):
+    try:
+        return day.replace(year=year)
+    except ValueError:  # 29 February
+        return day.replace(year=year, day=28)
+
+
+def leave_year_start(year_start_date, day):
+    """First day of the leave year (starting on year_start_date's anniversary) that contains `day`."""
+    start = _anniversary(year_start_date, day.year)
+    return start if start <= day else _anniversary(year_start_date, day.year - 1)
+
+
+def _fold(changes, leave_types):
+    """{(employee_id, leave_type_id, year_start): {'pending': n, 'approved': n}} of the non-zero changes."""
+    totals = defaultdict(lambda: dict.fromkeys(COUNTED_STATUSES, 0))
+    for employee_id, leave_type_id, leave_date, status, delta in changes:
+        leave_type = leave_types.get(leave_type_id)
+        if leave_type is None:
+            continue
+        if isinstance(leave_date, str):
+            leave_date = parse_date(leave_date)
+        key = (employee_id, leave_type_id, leave_year_start(leave_type.year_start_date, leave_date))
+        totals[key][status] += delta
+    return {key: counts for key, counts in totals.items() if any(counts.values())}
+
+
+def apply_deltas(changes):
+    """
+    Moves the ledger counts by `changes`, an iterable of (employee_id,
+    leave_type_id, leave_date, status, delta). Statuses that don't count
+    and leaves without a type are ignored. A fixed number of queries
+    however many rows change: existing rows are updated in one statement,
+    missing ones created in one bulk insert.
+    """
+    changes = [c for c in changes if c[3] in COUNTED_STATUSES and c[1] is not None and c[4]]
+    if not changes:
+        return
+    leave_types = LeaveType.objects.in_bulk({c[1] for c in changes})
+    totals = _fold(changes, leave_types)
+    if not totals:
+        return
+
+    with transaction.atomic(savepoint=False):
+        existing = {
+            (row.employee_id, row.leave_type_id, row.year_start): row.pk
+            for row in LeaveBalance.objects.filter(
+                employee_id__in={k[0] for k in totals},
+                leave_type_id__in={k[1] for k in totals},
+                year_start__in={k[2] for k in totals},
+            ).only('pk', 'employee_id', 'leave_type_id', 'year_start')
+        }
+        _add_to_rows({existing[key]: counts for key, counts in totals.items() if key in existing})
+
+        missing = {key: counts for key, counts in totals.items() if key not in existing}
+        if not missing:
+            return
+        rows = [
+            LeaveBalance(
+                employee_id=employee_id, leave_type_id=leave_type_id, year_start=year_start,
+                allowed=leave_types[leave_type_id].att_type_no_of_days_in_year, **counts,
+            )
+            for (employee_id, leave_type_id, year_start), counts in missing.items()
+        ]
+        try:
+            with transaction.atomic():
+                LeaveBalance.objects.bulk_create(rows)
+        except IntegrityError:
+            # Some were created concurrently; add to those instead
+            for (employee_id, leave_type_id, year_start), counts in missing.items():
+                _add_to_row(employee_id, leave_type_id, year_start, leave_types[leave_type_id], counts)
+
+
+def _add_to_rows(counts_by_pk):
+    if not counts_by_pk:
+        return
+    changes = {}
+    for status in COUNTED_STATUSES:
+        whens = [When(pk=pk, then=Value(counts[status])) for pk, counts in counts_by_pk.items() if counts[status]]
+        if whens:
+            changes[status] = F(status) + Case(*whens, default=Value(0), output_field=IntegerField())
+    LeaveBalance.objects.filter(pk__in=counts_by_pk).update(**changes)
+
+
+def _add_to_row(employee_id, leave_type_id, year_start, leave_type, counts):
+    rows = LeaveBalance.objects.filter(employee_id=employee_id, leave_type_id=leave_type_id, year_start=year_start)
+    if rows.update(**{status: F(status) + n for status, n in counts.items() if n}):
+        return
+    LeaveBalance.objects.create(
+        employee_id=employee_id, leave_type_id=leave_type_id, year_start=year_start,
+        allowed=leave_type.att_type_no_of_days_in_year, **counts,
+    )
+
+
+def update_leave_status(queryset, status, **fields):
+    """
+    queryset.update(status=status, **fields) with the ledger moved to
+    match, in one transaction, and bulk_written sent for the rollups.
+    Returns the number of leaves updated.
+    """
+    with transaction.atomic(savepoint=False):
+        before = list(queryset.select_for_update().values_list(*EmpLeave.BALANCE_FIELDS))
+        updated = queryset.update(status=status, **fields)
+        apply_deltas(
+            [(*row, -1) for row in before] +
+            [(employee_id, leave_type_id, leave_date, status, 1) for employee_id, leave_type_id, leave_date, _ in before]
+        )
+        bulk_written.send(sender=EmpLeave, pairs={(employee_id, leave_date) for employee_id, _, leave_date, _ in before})
+    return updated
+
+
+def leave_types_with_balance(employee_id, leave_types):
+    """
+    `leave_types` annotated with the employee's allowed / pending / approved
+    counts for the leave year each type is configured for (year_start_date),
+    in the same query. Types without a ledger row get None.
+    """
+    balance = LeaveBalance.objects.filter(employee_id=employee_id, leave_type=OuterRef('pk'), year_start=OuterRef('year_start_date'))
+    return leave_types.annotate(
+        balance_allowed=Subquery(balance.values('allowed')[:1]),
+        balance_pending=Subquery(balance.values('pending')[:1]),
+        balance_approved=Subquery(balance.values('approved')[:1]),
+    )
+
+
+def get_balance(employee_id, leave_type, day):
+    """The employee's LeaveBalance for the leave year of `day` (unsaved and empty if there is none yet)."""
+    year_start = leave_year_start(leave_type.year_start_date, day)
+    balance = LeaveBalance.objects.filter(employee_id=employee_id, leave_type=leave_type, year_start=year_start).first()
+    return balance or LeaveBalance(
+        employee_id=employee_id, leave_type=leave_type, year_start=year_start,
+        allowed=leave_type.att_type_no_of_days_in_year,
+    )
+
+
+def rebuild(employee_ids=None):
+    """Recomputes the ledger (of `employee_ids`, or everyone) from main_empleave. Returns the number of rows."""
+    leave_types = LeaveType.objects.in_bulk()
+    leaves = EmpLeave.objects.filter(status__in=COUNTED_STATUSES, leave_type__isnull=False)
+    balances = LeaveBalance.objects.all()
+    if employee_ids is not None:
+        leaves = leaves.filter(employee_id__in=employee_ids)
+        balances = balances.filter(employee_id__in=employee_ids)
+
+    with transaction.atomic():
+        rows = leaves.values_list(*EmpLeave.BALANCE_FIELDS).iterator(chunk_size=5000)
+        totals = _fold(((*row, 1) for row in rows), leave_types)
+        balances.delete()
+        LeaveBalance.objects.bulk_create(
+            [
+                LeaveBalance(
+                    employee_id=employee_id, leave_type_id=leave_type_id, year_start=year_start,
+                    allowed=leave_types[leave_type_id].att_type_no_of_days_in_year, **counts,
+                )
+                for (employee_id, leave_type_id, year_start), counts in totals.items()
+            ],
+            batch_size=1000,
+        )
+    logger.info("Rebuilt %d leave balance rows", len(totals))
+    return len(totals)
@@ -0,0 +1,80 @@
+"""
+Bulk leave ingestion shared by the leave-creating endpoints
+(LeaveBulkCreateAPIView, LeaveRequestAPIView, bulk_add_leave) and the
+leave file import.
+
+Duplicates are found with one query over all requested (employee, date)
+pairs, the new leaves are written with chunked bulk_create in one
+transaction, and the leave-balance ledger and dashboard rollups are moved
+set-based (bulk_create skips EmpLeave.save() and the model signals).
+"""
+from django.db import transaction
+
+from .leave_balance import apply_deltas
+from .models import EmpLeave
+from .signals import bulk_written
+
+# An employee can't hold two of these on the same day
+ACTIVE_STATUSES = ('pending', 'approved')
+BATCH_SIZE = 500
+
+
+def create_leaves(leaves):
+    """
+    Saves unsaved EmpLeave `leaves` (employee_id, leave_date, leave_type
+    set; the employees must exist), skipping those whose employee already
+    has a pending/approved leave that day or that repeat an earlier one.
+
+    Returns one result per leave, in order:
+    {"employee_id", "leave_date", "created": bool, "leave_refno", "error"}.
+    """
+    leaves = list(leaves)
+    with transaction.atomic():
+        taken = set(
+            EmpLeave.objects
+            .filter(
+                employee_id__in={l.employee_id for l in leaves},
+                leave_date__in={l.leave_date for l in leaves},
+                status__in=ACTIVE_STATUSES,
+            )
+            .values_list('employee_id', 'leave_date')
+        )
+
+        results, new = [], []
+        for leave in leaves:
+            key = (leave.employee_id, leave.leave_date)
+            result = {"employee_id": key[0], "leave_date": key[1], "created": False, "leave_refno": None, "error": None}
+            results.append((result, leave))
+            if key in taken:
+                result["error"] = "An active leave already exists for this date."
+                continue
+            leave.status = EmpLeave.normalize_status(leave.status)
+            if leave.status in ACTIVE_STATUSES:
+                taken.add(key)  # repeated within the request
+            new.append(leave)
+            result["created"] = True
+
+        EmpLeave.objects.bulk_create(new, batch_size=BATCH_SIZE)
+        apply_deltas((l.employee_id, l.leave_type_id, l.leave_date, l.status, 1) for l in new)
+        bulk_written.send(sender=EmpLeave, pairs={(l.employee_id, l.leave_date) for l in new})
+
+    for result, leave in results:
+        if result["created"]:
+            result["leave_refno"] = leave.leave_refno
+    return [result for result, _ in results]
+
+
+def ingest_leaves(employee_ids, leave_dates, leave_type, status='pending', remarks='', action_user=None, action_date=None):
+    """
+    Creates a leave for every (employee, date) of employee_ids x leave_dates
+    that has no pending/approved leave yet (see create_leaves()). Results
+    are in employee, then date order.
+    """
+    return create_leaves(
+        EmpLeave(
+            employee_id=employee_id, leave_date=leave_date, leave_type=leave_type, remarks=remarks,
+            status=status, action_user=action_user, action_date=action_date,
+        )
+        for employee_id in employee_ids
+        for leave_date in leave_dates
+    )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main.leave_balance import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the leave-balance ledger (main_leavebalance) from main_empleave."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employee', type=int, action='append', dest='employees',
+                            help="Employee id to rebuild (repeatable). Default: everyone.")
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['employees'])
+        self.stdout.write(self.style.SUCCESS(f"Leave balances: {rows} rows"))
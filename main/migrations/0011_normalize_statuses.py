@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+ATTENDANCE_STATUSES = ('Present', 'Late', 'Half Day', 'Absent', 'On Leave')
+LEAVE_STATUSES = ('pending', 'approved', 'rejected', 'cancelled')
+
+
+def _sql_list(values):
+    return ', '.join(f"'{v}'" for v in values)
+
+
+class Migration(migrations.Migration):
+    """
+    Rewrites status values to their canonical spelling (Attendance: the
+    choice codes, legacy '1' -> 'Present'; EmpLeave: lower case), so the
+    report SQL can compare the column directly instead of LOWER(status).
+    Attendance/EmpLeave.save() keep new rows canonical.
+    """
+
+    dependencies = [
+        ('main', '0010_alter_attendance_options_attendance_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"""
+            UPDATE main_attendance
+            SET status = CASE LOWER(TRIM(status))
+                {' '.join(f"WHEN '{s.lower()}' THEN '{s}'" for s in ATTENDANCE_STATUSES)}
+                WHEN '1' THEN 'Present'
+            END
+            WHERE status NOT IN ({_sql_list(ATTENDANCE_STATUSES)})
+              AND LOWER(TRIM(status)) IN ({_sql_list([s.lower() for s in ATTENDANCE_STATUSES] + ['1'])});
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            f"""
+            UPDATE main_empleave
+            SET status = LOWER(TRIM(status))
+            WHERE status NOT IN ({_sql_list(LEAVE_STATUSES)})
+              AND LOWER(TRIM(status)) IN ({_sql_list(LEAVE_STATUSES)});
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import Q
+
+
+# (index, table, columns, predicate) - mirrors Attendance/EmpLeave.Meta.indexes
+INDEXES = [
+    (models.Index(fields=['employee', 'date'], name='attendance_employee_date_idx'),
+     'main_attendance', 'employee_id, date', None),
+    (models.Index(fields=['date'], name='attendance_date_idx'),
+     'main_attendance', 'date', None),
+    (models.Index(fields=['date', 'employee'], condition=Q(status__in=['Present', 'Late']), name='attendance_present_date_idx'),
+     'main_attendance', 'date, employee_id', "status IN ('Present', 'Late')"),
+    (models.Index(fields=['employee', 'leave_date', 'status'], name='empleave_emp_date_status_idx'),
+     'main_empleave', 'employee_id, leave_date, status', None),
+    (models.Index(fields=['leave_date', 'employee'], condition=Q(status='approved'), name='empleave_approved_date_idx'),
+     'main_empleave', 'leave_date, employee_id', "status = 'approved'"),
+    (models.Index(fields=['employee'], condition=Q(status='pending'), name='empleave_pending_idx'),
+     'main_empleave', 'employee_id', "status = 'pending'"),
+]
+
+
+def _operation(index, table, columns, predicate):
+    model_name = 'attendance' if table == 'main_attendance' else 'empleave'
+    where = f" WHERE {predicate}" if predicate else ""
+    return migrations.RunSQL(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {table} ({columns}){where};",
+        f"DROP INDEX CONCURRENTLY IF EXISTS {index.name};",
+        state_operations=[migrations.AddIndex(model_name=model_name, index=index)],
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes behind the report/dashboard predicates, built without locking
+    writes on the live tables (hence non-atomic raw SQL; the tracked model
+    state of these tables predates some of the indexed columns).
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0011_normalize_statuses'),
+    ]
+
+    operations = [_operation(*spec) for spec in INDEXES]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Replaces the (date) index on main_attendance with (date, attendance_id):
+    same date ranges, and also serves the keyset pagination ordering without
+    a sort. Built/dropped concurrently, like 0012.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0012_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS attendance_date_id_idx ON main_attendance (date, attendance_id);",
+            "DROP INDEX CONCURRENTLY IF EXISTS attendance_date_id_idx;",
+            state_operations=[migrations.AddIndex(
+                model_name='attendance',
+                index=models.Index(fields=['date', 'attendance_id'], name='attendance_date_id_idx'),
+            )],
+        ),
+        migrations.RunSQL(
+            "DROP INDEX CONCURRENTLY IF EXISTS attendance_date_idx;",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS attendance_date_idx ON main_attendance (date);",
+            state_operations=[migrations.RemoveIndex(model_name='attendance', name='attendance_date_idx')],
+        ),
+    ]
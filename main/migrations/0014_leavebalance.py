@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Leave-balance ledger (main.leave_balance), filled from the existing
+    pending/approved leaves. The fill is plain SQL (leave year = the
+    anniversary of leave_type.year_start_date on or before the leave date,
+    29 Feb rolling to 28 Feb like the Python side); the tracked model
+    state of main_empleave predates its status column.
+    """
+
+    dependencies = [
+        ('main', '0013_attendance_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_start', models.DateField()),
+                ('allowed', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to='main.employee')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='main.leavetype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leavebalance',
+            constraint=models.UniqueConstraint(fields=('employee', 'leave_type', 'year_start'), name='leavebalance_employee_type_year_uniq'),
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO main_leavebalance (employee_id, leave_type_id, year_start, allowed, pending, approved, updated_at)
+            SELECT y.employee_id, y.leave_type_id, y.year_start, MAX(y.allowed),
+                   COUNT(*) FILTER (WHERE y.status = 'pending'),
+                   COUNT(*) FILTER (WHERE y.status = 'approved'),
+                   NOW()
+            FROM (
+                SELECT l.employee_id, l.leave_type_id, l.status, lt.att_type_no_of_days_in_year AS allowed,
+                       CASE WHEN a.this_year <= l.leave_date THEN a.this_year ELSE a.last_year END AS year_start
+                FROM main_empleave l
+                JOIN leave_type lt ON lt.id = l.leave_type_id
+                CROSS JOIN LATERAL (
+                    SELECT
+                        (lt.year_start_date + make_interval(years => (EXTRACT(YEAR FROM l.leave_date) - EXTRACT(YEAR FROM lt.year_start_date))::int))::date AS this_year,
+                        (lt.year_start_date + make_interval(years => (EXTRACT(YEAR FROM l.leave_date) - EXTRACT(YEAR FROM lt.year_start_date))::int - 1))::date AS last_year
+                ) a
+                WHERE l.status IN ('pending', 'approved')
+            ) y
+            GROUP BY y.employee_id, y.leave_type_id, y.year_start;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,11 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import ValidationError
 import os
+import uuid
 from django.utils import timezone
+from .file_cleanup import delete_files_on_commit
 
 def reference_photo_upload_path(instance, filename):
-    return os.path.join('reference_photos', str(instance.employee_id), filename)
+    # Unique prefix so a replaced photo never reuses the old storage name,
+    # which is what cached reference templates are keyed on
+    return os.path.join('reference_photos', str(instance.employee_id), f"{uuid.uuid4().hex[:8]}_{filename}")
 
 def punchin_selfie_upload_path(instance, filename):
     return os.path.join('daily_selfies', str(instance.employee_id), 'punchin', filename)
@@ -56,31 +61,58 @@ class Employee(models.Model):
         blank=True
     )
 
+    IMAGE_FIELDS = ('reference_photo', 'punchin_selfie', 'punchout_selfie')
+
     def __str__(self):
         return self.fullname
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored file names as loaded, so save() can tell which images were replaced without a re-read
+        instance._original_images = {
+            name: instance.__dict__[name] or None
+            for name in cls.IMAGE_FIELDS if name in instance.__dict__
+        }
+        return instance
+
+    def _current_images(self, names):
+        return {name: getattr(self, name).name or None for name in names}
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            try:
-                original_instance = Employee.objects.get(pk=self.pk)
-                
-                # CORRECTED: Check and delete old punchin_selfie
-                if original_instance.punchin_selfie and self.punchin_selfie != original_instance.punchin_selfie:
-                    original_instance.punchin_selfie.delete(save=False)
-                
-                # CORRECTED: Check and delete old punchout_selfie
-                if original_instance.punchout_selfie and self.punchout_selfie != original_instance.punchout_selfie:
-                    original_instance.punchout_selfie.delete(save=False)
-
-                # Check if the reference_photo has changed
-                if original_instance.reference_photo and self.reference_photo != original_instance.reference_photo:
-                    original_instance.reference_photo.delete(save=False)
-                    
-            except Employee.DoesNotExist:
-                pass
-        
+        update_fields = kwargs.get('update_fields')
+        adding = self.pk is None
+        original = getattr(self, '_original_images', None)
+
+        if original is None and not adding:
+            # Built without loading (e.g. Employee(pk=...)); fall back to reading just the image columns
+            original = Employee.objects.filter(pk=self.pk).values(*self.IMAGE_FIELDS).first() or {}
+            original = {name: value or None for name, value in original.items()}
+        original = original or {}
+
+        tracked = [
+            name for name in self.IMAGE_FIELDS
+            if name in original and (update_fields is None or name in update_fields)
+        ]
+        current = self._current_images(tracked)
+        replaced = [
+            (self._meta.get_field(name).storage, original[name])
+            for name in tracked if original[name] and current[name] != original[name]
+        ]
+
+        # Picked up by the post_save hook that rebuilds the reference face template
+        if adding:
+            self._reference_photo_changed = bool(self.reference_photo)
+        else:
+            self._reference_photo_changed = 'reference_photo' in tracked and current['reference_photo'] != original['reference_photo']
+
         super().save(*args, **kwargs)
 
+        # Old files go once the new row is committed, off the request thread
+        delete_files_on_commit(replaced)
+        saved = [name for name in self.IMAGE_FIELDS if update_fields is None or name in update_fields]
+        self._original_images = dict(original, **self._current_images(saved))
+
 class Attendance(models.Model):
     STATUS_CHOICES = [('Present', 'Present'), ('Late', 'Late'), ('Half Day', 'Half Day'), ('Absent', 'Absent'), ('On Leave', 'On Leave')]
     VERIFICATION_CHOICES = [('Pending', 'Pending'), ('Verified', 'Verified'), ('Rejected', 'Rejected')]
@@ -109,11 +141,28 @@ class Attendance(models.Model):
     class Meta:
         #unique_together = ('employee', 'date')
         ordering = ['-date', 'employee']
+        # Built concurrently by migrations 0012/0013; report SQL and keyset pagination rely on them
+        indexes = [
+            models.Index(fields=['employee', 'date'], name='attendance_employee_date_idx'),
+            models.Index(fields=['date', 'attendance_id'], name='attendance_date_id_idx'),
+            models.Index(fields=['date', 'employee'], condition=Q(status__in=['Present', 'Late']), name='attendance_present_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.employee.fullname} - {self.date} - {self.status}"
+
+    @classmethod
+    def normalize_status(cls, value):
+        """Canonical spelling of a status ('present ' -> 'Present'; legacy '1' -> 'Present')."""
+        key = str(value or '').strip().lower()
+        if key == '1':
+            return 'Present'
+        return next((code for code, _ in cls.STATUS_CHOICES if code.lower() == key), value)
     
-    def save(self, *args, **kwargs):
+    def apply_worked_hours(self):
+        """Canonical status, and worked / OT hours from the punch times, as stored by save() (bulk writes call it too)."""
+        # Stored canonically so queries can match the indexed value without LOWER()
+        self.status = self.normalize_status(self.status)
         if self.check_out_time and self.check_in_time:
             delta = self.check_out_time - self.check_in_time
             self.worked_hours = round(delta.total_seconds() / 3600, 2)
@@ -122,6 +171,9 @@ class Attendance(models.Model):
                 self.status = 'Half Day'
             elif self.worked_hours > 8:
                 self.ot_hours = self.worked_hours - 8
+
+    def save(self, *args, **kwargs):
+        self.apply_worked_hours()
         super().save(*args, **kwargs)
     
 class LeaveType(models.Model):
@@ -142,6 +194,13 @@ class LeaveType(models.Model):
     class Meta:
         db_table = 'leave_type'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The ledger carries the allowance alongside the counts
+        LeaveBalance.objects.filter(leave_type=self).exclude(allowed=self.att_type_no_of_days_in_year).update(
+            allowed=self.att_type_no_of_days_in_year
+        )
+
 class Holiday(models.Model):
     id = models.AutoField(primary_key=True)  # Auto-incrementing primary key
     hcode = models.CharField(max_length=50)  # Holiday code, unique for each holiday
@@ -177,9 +236,95 @@ class EmpLeave(models.Model):
     action_date = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
+    class Meta:
+        # Built concurrently by migration 0012; report SQL relies on them
+        indexes = [
+            models.Index(fields=['employee', 'leave_date', 'status'], name='empleave_emp_date_status_idx'),
+            models.Index(fields=['leave_date', 'employee'], condition=Q(status='approved'), name='empleave_approved_date_idx'),
+            models.Index(fields=['employee'], condition=Q(status='pending'), name='empleave_pending_idx'),
+        ]
+
     def __str__(self):
         return f"Leave {self.leave_refno} - {self.employee.fullname}"
 
+    @classmethod
+    def normalize_status(cls, value):
+        """Canonical (lower-case) spelling of a status ('Approved' -> 'approved')."""
+        key = str(value or '').strip().lower()
+        return key if key in dict(cls.STATUS_CHOICES) else value
+
+    # Fields the leave-balance ledger is keyed and counted on
+    BALANCE_FIELDS = ('employee_id', 'leave_type_id', 'leave_date', 'status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # As loaded, so save()/delete() can move the ledger counts without re-reading the row
+        loaded = instance.__dict__
+        if all(name in loaded for name in cls.BALANCE_FIELDS):
+            instance._balance_state = tuple(loaded[name] for name in cls.BALANCE_FIELDS)
+        return instance
+
+    def _stored_balance_state(self):
+        if self._state.adding:
+            return None
+        if hasattr(self, '_balance_state'):
+            return self._balance_state
+        return EmpLeave.objects.filter(pk=self.pk).values_list(*self.BALANCE_FIELDS).first()
+
+    def save(self, *args, **kwargs):
+        from .leave_balance import apply_deltas
+
+        self.status = self.normalize_status(self.status)
+        with transaction.atomic(savepoint=False):
+            previous = self._stored_balance_state()
+            super().save(*args, **kwargs)
+            current = tuple(getattr(self, name) for name in self.BALANCE_FIELDS)
+            if previous != current:
+                apply_deltas([*([(*previous, -1)] if previous else []), (*current, 1)])
+            self._balance_state = current
+
+    def delete(self, *args, **kwargs):
+        from .leave_balance import apply_deltas
+
+        with transaction.atomic(savepoint=False):
+            previous = self._stored_balance_state()
+            result = super().delete(*args, **kwargs)
+            if previous:
+                apply_deltas([(*previous, -1)])
+        return result
+
+
+class LeaveBalance(models.Model):
+    """
+    Leave-balance ledger: one row per (employee, leave type, leave year)
+    with the allowance and the pending / approved leave counts. Kept in
+    the same transaction as the EmpLeave writes (see main.leave_balance).
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, related_name='balances')
+    year_start = models.DateField()  # First day of the leave year
+    allowed = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'leave_type', 'year_start'], name='leavebalance_employee_type_year_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} {self.leave_type_id} {self.year_start}: {self.approved}+{self.pending}/{self.allowed}"
+
+    @property
+    def used(self):
+        return self.pending + self.approved
+
+    @property
+    def remaining(self):
+        return max(self.allowed - self.used, 0)
+
 # Agency Model (Optional for context)
 class Agency(models.Model):
     id = models.AutoField(primary_key=True)
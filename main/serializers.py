@@ -1,11 +1,35 @@
 # serializers.py
 from rest_framework import serializers
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.functional import cached_property
 from .models import Outlet, EmpLeave, Holiday, Attendance, Employee, Agency, Holiday , LeaveType
 
+
+class FieldSelectionMixin:
+    """
+    Keeps only the fields named in the `fields` argument, or in the request's
+    ?fields=a,b,c when the serializer is the one the view created. Fields
+    that are not asked for are dropped before any row is serialized, so
+    their sources (and method fields) are never evaluated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        selected = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if selected is None:
+            request = self.context.get('request')
+            param = request.query_params.get('fields') if request is not None else None
+            selected = [name.strip() for name in param.split(',') if name.strip()] if param else None
+        if selected:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
 class AttendanceSerializer(serializers.ModelSerializer):
     employee_name = serializers.CharField(source='employee.fullname', read_only=True)
-    punchin_selfie_url = serializers.ImageField(source='employee.punchin_selfie', read_only=True)
-    punchout_selfie_url = serializers.ImageField(source='employee.punchout_selfie', read_only=True)
+    punchin_selfie_url = serializers.SerializerMethodField()
+    punchout_selfie_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Attendance
@@ -37,6 +61,68 @@ class AttendanceSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
+    def to_representation(self, instance):
+        # One punch_events query per row unless the queryset already prefetched it
+        prefetch_related_objects([instance], 'punch_events')
+        return super().to_representation(instance)
+
+    def _selfie_url(self, obj, kind):
+        # Selfie of the accepted punch (PunchEvent); iterates punch_events.all()
+        # so list views can prefetch it. Rows recorded before punch events
+        # existed fall back to the employee's last selfie.
+        events = list(obj.punch_events.all())
+        if events:
+            matching = [e for e in events if e.kind == kind and e.selfie]
+            selfie = max(matching, key=lambda e: e.id).selfie if matching else None
+        else:
+            selfie = getattr(obj.employee, f"{kind}_selfie")
+        if not selfie:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(selfie.url) if request else selfie.url
+
+    def get_punchin_selfie_url(self, obj):
+        return self._selfie_url(obj, 'punchin')
+
+    def get_punchout_selfie_url(self, obj):
+        return self._selfie_url(obj, 'punchout')
+
+
+class AttendanceListSerializer(FieldSelectionMixin, AttendanceSerializer):
+    """
+    Read-only AttendanceSerializer for lists and nested collections. Rows
+    must come with employee selected and punch_events prefetched; unlike
+    AttendanceSerializer it does not check (and fetch) punch_events per row.
+    """
+
+    class Meta(AttendanceSerializer.Meta):
+        read_only_fields = AttendanceSerializer.Meta.fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Look the active timezone up once per response, not once per datetime value
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        for field in self.fields.values():
+            if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+                field.timezone = tz
+
+    @cached_property
+    def _plan(self):
+        # (name, field, source attrs) of the readable fields, resolved once per serializer
+        return [(field.field_name, field, field.source_attrs) for field in self._readable_fields]
+
+    def to_representation(self, instance):
+        # ModelSerializer.to_representation without the per-field generic
+        # attribute lookup (and without AttendanceSerializer's punch_events fetch)
+        data = {}
+        for name, field, attrs in self._plan:
+            value = instance
+            for attr in attrs:
+                value = getattr(value, attr)
+                if value is None:
+                    break
+            data[name] = None if value is None else field.to_representation(value)
+        return data
 
 class OutletSerializer(serializers.ModelSerializer):
     class Meta:
@@ -142,13 +228,14 @@ class LeaveTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id',)
 
-class EmployeeDetailSerializer(EmployeeSerializer):
+class EmployeeDetailSerializer(FieldSelectionMixin, EmployeeSerializer):
     """
     A detailed serializer for an employee that includes their related
-    attendance and leave records.
+    attendance and leave records (whatever the queryset prefetched into
+    `attendances` / `empleave_set`, with attendances__punch_events).
     """
     # The 'attendances' related_name comes from the ForeignKey in the Attendance model
-    attendances = AttendanceSerializer(many=True, read_only=True)
+    attendances = AttendanceListSerializer(many=True, read_only=True)
     
     # The 'empleave_set' is the default related_name for the ForeignKey in EmpLeave
     leaves = EmpLeaveSerializer(many=True, read_only=True, source='empleave_set')
@@ -158,7 +245,7 @@ class EmployeeDetailSerializer(EmployeeSerializer):
         # and add the new nested fields to the fields list.
         fields = EmployeeSerializer.Meta.fields + ['attendances', 'leaves']
 
-class OutletDetailSerializer(serializers.ModelSerializer):
+class OutletDetailSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     employees = serializers.SerializerMethodField()
 
     class Meta:
@@ -0,0 +1,86 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from .access import invalidate_all, invalidate_users
+from .geofence import peek_geofence_index
+from .models import Employee, Outlet
+
+# Sent (sender=Attendance or EmpLeave, pairs={(employee_id, date), ...}) by
+# set-based writes that skip the model signals (bulk_create, queryset.update);
+# sender=Employee with pairs={(employee_id, None), ...} for bulk-created employees
+bulk_written = Signal()
+
+
+@receiver(post_save, sender=Outlet)
+def update_outlet_geofence(sender, instance, **kwargs):
+    index = peek_geofence_index()
+    if index is not None:
+        index.upsert(instance)
+
+
+@receiver(post_delete, sender=Outlet)
+def remove_outlet_geofence(sender, instance, **kwargs):
+    index = peek_geofence_index()
+    if index is not None:
+        index.remove(instance.id)
+
+
+# --- Cached access scopes (main.access) ---
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_users([instance.pk])
+    elif pk_set:
+        invalidate_users(pk_set)
+    else:
+        # group.user_set.clear(): affected users are unknown here
+        invalidate_all()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee_user(sender, instance, **kwargs):
+    instance._access_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def employee_user_changed(sender, instance, **kwargs):
+    previous = instance._access_user_id
+    instance._access_user_id = instance.user_id
+    if kwargs.get('created') is False and previous == instance.user_id:
+        return
+    invalidate_users([previous, instance.user_id])
+
+
+@receiver(bulk_written, sender=Employee)
+def employees_bulk_created_access(sender, pairs, **kwargs):
+    employee_ids = {employee_id for employee_id, _ in pairs}
+    invalidate_users(Employee.objects.filter(pk__in=employee_ids).values_list('user_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Employee.outlets.through)
+def employee_outlets_access_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_users([instance.user_id])
+    elif pk_set:
+        invalidate_users(Employee.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    else:
+        invalidate_all()
+
+
+@receiver(post_delete, sender=Outlet)
+def outlet_deleted_access(sender, instance, **kwargs):
+    # Its memberships go with it (cascade), without m2m_changed
+    invalidate_all()
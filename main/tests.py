@@ -1,3 +1,508 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from aas.pagination import estimate_count
+from main.access import get_access_scope
+from main.geofence import GeofenceIndex, get_geofence_index
+from main.leave_balance import leave_year_start, rebuild, update_leave_status
+from main.leave_ingest import ingest_leaves
+from main.models import Attendance, EmpLeave, Employee, LeaveBalance, LeaveType, Outlet
+from main.serializers import AttendanceListSerializer, AttendanceSerializer
+
+
+class NormalizedStatusTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='emp1', password='x')
+        self.employee = Employee.objects.create(user=user, fullname='Emp One', date_of_birth='1990-01-01')
+
+    def test_attendance_status_saved_canonically(self):
+        for raw, expected in [('present', 'Present'), (' LATE ', 'Late'), ('half day', 'Half Day'), ('1', 'Present')]:
+            attendance = Attendance.objects.create(
+                employee=self.employee, date=date(2025, 1, 1), check_in_time=timezone.now(),
+                check_in_lat=0, check_in_long=0, status=raw,
+            )
+            self.assertEqual(Attendance.objects.get(pk=attendance.pk).status, expected)
+
+    def test_leave_status_saved_canonically(self):
+        leave = EmpLeave.objects.create(employee=self.employee, leave_date=date(2025, 1, 1), status='Approved')
+        self.assertEqual(EmpLeave.objects.get(pk=leave.pk).status, 'approved')
+
+
+class LeaveBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='emp1', password='x')
+        self.employee = Employee.objects.create(user=self.user, fullname='Emp One', date_of_birth='1990-01-01')
+        self.annual = LeaveType.objects.create(
+            att_type='AL', att_type_name='Annual', att_type_group='Leave', att_type_per_day_hours=8,
+            pay_percentage=100, att_type_no_of_days_in_year=14, year_start_date='2025-04-01', year_end_date='2026-03-31',
+        )
+        self.annual.refresh_from_db()
+
+    def balance(self, year_start=date(2025, 4, 1)):
+        row = LeaveBalance.objects.filter(employee=self.employee, leave_type=self.annual, year_start=year_start).first()
+        return (row.allowed, row.pending, row.approved) if row else None
+
+    def leave(self, day, status='pending'):
+        return EmpLeave.objects.create(employee=self.employee, leave_type=self.annual, leave_date=day, status=status)
+
+    def test_leave_year_start(self):
+        self.assertEqual(leave_year_start(date(2025, 4, 1), date(2026, 3, 31)), date(2025, 4, 1))
+        self.assertEqual(leave_year_start(date(2025, 4, 1), date(2026, 4, 1)), date(2026, 4, 1))
+        self.assertEqual(leave_year_start(date(2025, 4, 1), date(2025, 1, 15)), date(2024, 4, 1))
+        self.assertEqual(leave_year_start(date(2024, 2, 29), date(2025, 3, 1)), date(2025, 2, 28))
+
+    def test_ledger_follows_leave_writes(self):
+        first = self.leave(date(2025, 5, 1))
+        second = self.leave('2025-05-02')
+        self.leave(date(2025, 3, 31))  # previous leave year
+        self.assertEqual(self.balance(), (14, 2, 0))
+        self.assertEqual(self.balance(date(2024, 4, 1)), (14, 1, 0))
+
+        first.status = 'approved'
+        first.save()
+        self.assertEqual(self.balance(), (14, 1, 1))
+
+        loaded = EmpLeave.objects.get(pk=second.pk)
+        loaded.status = 'rejected'
+        loaded.save()
+        self.assertEqual(self.balance(), (14, 0, 1))
+
+        EmpLeave.objects.get(pk=first.pk).delete()
+        self.assertEqual(self.balance(), (14, 0, 0))
+
+    def test_queryset_status_update_and_allowance_change(self):
+        leaves = [self.leave(date(2025, 6, d)) for d in (1, 2, 3)]
+        update_leave_status(EmpLeave.objects.filter(pk__in=[l.pk for l in leaves[:2]]), 'approved')
+        self.assertEqual(self.balance(), (14, 1, 2))
+
+        self.annual.att_type_no_of_days_in_year = 20
+        self.annual.save()
+        self.assertEqual(self.balance(), (20, 1, 2))
+
+    def test_rebuild_matches_incremental(self):
+        for d, status in [(1, 'pending'), (2, 'approved'), (3, 'rejected'), (4, 'approved')]:
+            self.leave(date(2025, 7, d), status)
+        EmpLeave.objects.create(employee=self.employee, leave_date=date(2025, 7, 5))  # no type: not counted
+        incremental = list(LeaveBalance.objects.values_list('employee', 'leave_type', 'year_start', 'allowed', 'pending', 'approved'))
+        LeaveBalance.objects.all().delete()
+        self.assertEqual(rebuild(), 1)
+        self.assertEqual(list(LeaveBalance.objects.values_list('employee', 'leave_type', 'year_start', 'allowed', 'pending', 'approved')), incremental)
+
+    def test_pending_leave_requests_reads_ledger(self):
+        LeaveType.objects.create(
+            att_type='SL', att_type_name='Sick', att_type_group='Leave', att_type_per_day_hours=8,
+            pay_percentage=100, att_type_no_of_days_in_year=7, year_start_date='2025-04-01', year_end_date='2026-03-31',
+        )
+        self.leave(date(2025, 8, 1))
+        self.leave(date(2025, 8, 2), 'approved')
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(2):  # employee + leave types with their balance
+            body = client.get('/api/attendance/pendingleave/').json()
+        by_code = {row['leave_code']: row for row in body}
+        self.assertEqual((by_code['AL']['allowed'], by_code['AL']['used'], by_code['AL']['remaining']), (14, 2, 12))
+        self.assertEqual((by_code['SL']['allowed'], by_code['SL']['used'], by_code['SL']['remaining']), (7, 0, 7))
+
+
+class LeaveIngestTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.employees = [
+            Employee.objects.create(
+                user=User.objects.create_user(username=f'emp{i}', password='x'),
+                fullname=f'Emp {i}', date_of_birth='1990-01-01',
+            )
+            for i in range(20)
+        ]
+        self.annual = LeaveType.objects.create(
+            att_type='AL', att_type_name='Annual', att_type_group='Leave', att_type_per_day_hours=8,
+            pay_percentage=100, att_type_no_of_days_in_year=14, year_start_date='2025-04-01', year_end_date='2026-03-31',
+        )
+        self.annual.refresh_from_db()
+
+    def test_ingest_is_set_based_and_skips_active_leaves(self):
+        first = self.employees[0]
+        EmpLeave.objects.create(employee=first, leave_type=self.annual, leave_date=date(2025, 5, 1), status='approved')
+        days = [date(2025, 5, 1) + timedelta(days=d) for d in range(5)]
+        employee_ids = [e.employee_id for e in self.employees]
+
+        # duplicates, insert, leave types, ledger read / update / insert, rollup queue, and savepoints: none per row
+        with self.assertNumQueries(11):
+            results = ingest_leaves(employee_ids, days + [days[1]], self.annual)
+        self.assertEqual(len(results), 20 * 6)
+        self.assertEqual([(r['employee_id'], r['leave_date']) for r in results[:6]], [(first.employee_id, d) for d in days + [days[1]]])
+        skipped = [(r['employee_id'], r['leave_date']) for r in results if not r['created']]
+        self.assertEqual(skipped[:2], [(first.employee_id, days[0]), (first.employee_id, days[1])])
+        self.assertEqual(len(skipped), 1 + 20)  # the existing leave, and the repeated date for everyone
+        self.assertTrue(all(r['leave_refno'] for r in results if r['created']))
+        self.assertEqual(EmpLeave.objects.count(), 1 + 20 * 5 - 1)
+        self.assertEqual(
+            LeaveBalance.objects.get(employee=first, leave_type=self.annual).pending, 4,
+        )
+
+    def test_bulk_add_leave_reports_duplicates_and_unknown_employees(self):
+        first, second = self.employees[:2]
+        EmpLeave.objects.create(employee=first, leave_type=self.annual, leave_date=date(2025, 5, 1), status='pending')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/attendance/bulk-addleave/', {
+            'employee_ids': [first.employee_id, second.employee_id, 999999],
+            'leave_date': '2025-05-01', 'leave_type': self.annual.id,
+        }, format='json')
+        body = response.json()
+        self.assertEqual(body['successful_adds'], [second.employee_id])
+        self.assertEqual(sorted(f['employee_id'] for f in body['failed_adds']), [first.employee_id, 999999])
+        self.assertEqual(EmpLeave.objects.get(employee=second).status, 'approved')
+        self.assertEqual(LeaveBalance.objects.get(employee=second).approved, 1)
+
+
+class GeofenceIndexTests(TestCase):
+    def outlet(self, outlet_id, lat, lon, radius, status=1):
+        return Outlet(id=outlet_id, latitude=lat, longitude=lon, radius_meters=radius, status=status)
+
+    def test_radius_across_cell_edge(self):
+        index = GeofenceIndex(cell_degrees=0.05)
+        index.upsert(self.outlet(1, 0.0499, 0.02, 500))  # just below the edge between rows 0 and 1
+        self.assertEqual(sorted(cell for cell, members in index._cells.items() if 1 in members), [(0, 0), (1, 0)])
+
+        points = [(0.0499, 0.02), (0.0501, 0.02), (0.0540, 0.02), (0.0550, 0.02), (0.0, 0.0)]
+        expected = [[1], [1], [1], [], []]  # 0, 22, 456, 567 and ~6 km away
+        self.assertEqual([index.containing_outlets(lat, lon) for lat, lon in points], expected)
+        self.assertEqual(index.bulk_containing(points), expected)
+        self.assertEqual(index.containing_outlets(0.0501, 0.02, outlet_ids={2}), [])
+
+    def test_outlet_changes_update_index(self):
+        index = get_geofence_index()
+        outlet = Outlet.objects.create(name='O', address='A', latitude=10.0, longitude=10.0, radius_meters=100)
+        self.assertEqual(index.containing_outlets(10.0, 10.0), [outlet.id])
+
+        outlet.latitude = outlet.longitude = 20.0
+        outlet.save()
+        self.assertEqual(index.containing_outlets(10.0, 10.0), [])
+        self.assertEqual(index.containing_outlets(20.0, 20.0), [outlet.id])
+
+        outlet.status = 0
+        outlet.save()
+        self.assertEqual(index.containing_outlets(20.0, 20.0), [])
+
+        outlet.status = 1
+        outlet.save()
+        outlet_id = outlet.id
+        outlet.delete()
+        self.assertEqual(index.containing_outlets(20.0, 20.0), [])
+        self.assertNotIn(outlet_id, index._outlets)
+
+    def test_lookups_while_outlets_change(self):
+        index = GeofenceIndex(cell_degrees=0.05)
+        stop, errors = threading.Event(), []
+
+        def churn():
+            n = 0
+            while not stop.is_set():
+                n += 1
+                index.upsert(self.outlet(n % 50, 0.001 * (n % 50), 0.0, 300))
+                index.remove((n + 25) % 50)
+
+        writer = threading.Thread(target=churn)
+        writer.start()
+        try:
+            for i in range(3000):
+                index.containing_outlets(0.001 * (i % 50), 0.0)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(errors, [])
+
+
+class AccessScopeTests(TestCase):
+    def setUp(self):
+        caches[settings.ACCESS_SCOPE_CACHE_ALIAS].clear()
+        self.outlet = Outlet.objects.create(name='O1', address='A', latitude=0, longitude=0, radius_meters=100)
+        self.manager = Employee.objects.create(
+            user=User.objects.create_user(username='manager', password='x'), fullname='Manager', date_of_birth='1990-01-01',
+        )
+        self.manager.outlets.add(self.outlet)
+        self.manager.user.groups.add(Group.objects.create(name='Manager'))
+
+    def scope(self):
+        request = RequestFactory().get('/')
+        request.user = self.manager.user
+        return get_access_scope(request)
+
+    def test_scope_cached_across_requests(self):
+        with self.assertNumQueries(3):  # groups, employee, outlets
+            scope = self.scope()
+        self.assertTrue(scope.is_manager)
+        self.assertEqual(scope.employee_id, self.manager.employee_id)
+        self.assertTrue(scope.has_outlet(self.outlet.id))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scope().outlet_ids, {self.outlet.id})
+
+    def test_group_and_outlet_changes_invalidate(self):
+        self.scope()
+        other = Outlet.objects.create(name='O2', address='B', latitude=0, longitude=0, radius_meters=100)
+        other.employees.add(self.manager)
+        self.assertEqual(self.scope().outlet_ids, {self.outlet.id, other.id})
+
+        self.manager.user.groups.clear()
+        self.assertFalse(self.scope().is_manager)
+
+        Group.objects.get(name='Manager').user_set.add(self.manager.user)
+        self.assertTrue(self.scope().is_manager)
+
+        other.delete()
+        self.assertEqual(self.scope().outlet_ids, {self.outlet.id})
+
+        self.manager.user.is_staff = True  # staff flags aren't cached
+        self.assertTrue(self.scope().is_admin)
+
+    def test_culled_version_key_is_not_reused(self):
+        group = Group.objects.get(name='Manager')
+        self.manager.user.groups.remove(group)
+        self.assertFalse(self.scope().is_manager)
+        caches[settings.ACCESS_SCOPE_CACHE_ALIAS].delete(f'access_scope:version:{self.manager.user.pk}')  # culled
+        self.manager.user.groups.add(group)
+        self.assertTrue(self.scope().is_manager)
+
+
+class PaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        outlet = Outlet.objects.create(name='O1', address='A', latitude=0, longitude=0, radius_meters=100)
+        employees = [
+            Employee.objects.create(
+                user=User.objects.create_user(username=f'emp{i}', password='x'),
+                fullname=f'Emp {i}', date_of_birth='1990-01-01',
+            )
+            for i in range(4)
+        ]
+        outlet.employees.add(*employees)
+        cls.outlet = outlet
+        now = timezone.now()
+        # Several rows per date, so pages split inside a date
+        Attendance.objects.bulk_create([
+            Attendance(employee=employee, date=date(2025, 1, 1) + timedelta(days=d), check_in_time=now,
+                       check_in_lat=0, check_in_long=0, status='Present')
+            for d in range(5)
+            for employee in employees
+        ])
+        EmpLeave.objects.bulk_create([
+            EmpLeave(employee=employee, leave_date=date(2025, 2, 1) + timedelta(days=d), status='pending')
+            for d in range(3)
+            for employee in employees
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+class KeysetPaginationTests(PaginationTestCase):
+    def walk(self, url, key, **filters):
+        seen, params = [], {'pagination': 'keyset', 'page_size': 7, **filters}
+        while True:
+            body = self.client.get(url, params).json()
+            seen += [row[key] for row in body['results']]
+            if not body['next_cursor']:
+                return seen, body
+            params['cursor'] = body['next_cursor']
+
+    def test_attendance_pages_follow_date_then_id(self):
+        seen, body = self.walk('/api/attendance/all/', 'attendance_id')
+        expected = list(Attendance.objects.order_by('-date', '-attendance_id').values_list('attendance_id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertIsNone(body['count'])
+
+    def test_leave_pages(self):
+        seen, _ = self.walk('/api/simple-leave-requests/', 'leave_refno', outlet_id=self.outlet.pk)
+        expected = list(EmpLeave.objects.order_by('-leave_refno').values_list('leave_refno', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_count_on_request(self):
+        body = self.client.get('/api/attendance/all/', {'pagination': 'keyset', 'count': 'exact'}).json()
+        self.assertEqual(body['count'], 20)
+        self.assertFalse(body['count_is_estimate'])
+
+    def test_page_number_pagination_by_default(self):
+        body = self.client.get('/api/attendance/all/').json()
+        self.assertEqual(body['count'], 20)
+        self.assertIn('total_pages', body)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/attendance/all/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PAGINATION_ESTIMATE_THRESHOLD=10)
+class EstimatedCountTests(PaginationTestCase):
+    def test_exact_count_at_or_below_threshold(self):
+        with mock.patch('aas.pagination.estimate_count', return_value=10):
+            body = self.client.get('/api/attendance/all/').json()
+        self.assertEqual(body['count'], 20)
+        self.assertFalse(body['count_is_estimate'])
+
+    def test_estimate_above_threshold(self):
+        with mock.patch('aas.pagination.estimate_count', return_value=12):
+            body = self.client.get('/api/attendance/all/', {'page_size': 5, 'page': 3}).json()
+        self.assertEqual(body['count'], 12)
+        self.assertTrue(body['count_is_estimate'])
+        # Pages past the (low) estimate are still served, and `next` follows the real rows
+        self.assertEqual(len(body['results']), 5)
+        self.assertIsNotNone(body['next'])
+        last = self.client.get('/api/attendance/all/', {'page_size': 5, 'page': 4}).json()
+        self.assertEqual(len(last['results']), 5)
+        self.assertIsNone(last['next'])
+        self.assertEqual(self.client.get('/api/attendance/all/', {'page_size': 5, 'page': 5}).status_code, 404)
+
+    def test_count_cached_per_filter(self):
+        with mock.patch('aas.pagination.estimate_count', return_value=12) as estimate:
+            self.client.get('/api/attendance/all/', {'page': 1})
+            self.client.get('/api/attendance/all/', {'page': 2, 'page_size': 5})
+            self.assertEqual(estimate.call_count, 1)
+            self.client.get('/api/attendance/all/', {'start_date': '2025-01-03'})
+            self.assertEqual(estimate.call_count, 2)
+
+
+class LeanSerializerTests(PaginationTestCase):
+    def test_list_serializer_matches_full_serializer(self):
+        rows = list(Attendance.objects.select_related('employee').prefetch_related('punch_events'))
+        self.assertEqual(
+            AttendanceListSerializer(rows, many=True).data,
+            AttendanceSerializer(rows, many=True).data,
+        )
+
+    def test_fields_selection(self):
+        body = self.client.get('/api/attendance/all/', {'fields': 'attendance_id,date'}).json()
+        self.assertEqual(set(body['results'][0]), {'attendance_id', 'date'})
+
+    def test_outlet_detail_date_bounded(self):
+        with self.assertNumQueries(7):
+            body = self.client.get(f'/outletsalldata/{self.outlet.pk}/', {'start_date': '2025-01-02', 'end_date': '2025-01-03'}).json()
+        self.assertEqual(len(body['employees']), 4)
+        for employee in body['employees']:
+            self.assertEqual(sorted(a['date'] for a in employee['attendances']), ['2025-01-02', '2025-01-03'])
+            self.assertEqual(employee['leaves'], [])
+        body = self.client.get(f'/outletsalldata/{self.outlet.pk}/', {'start_date': '2025-02-01', 'end_date': '2025-02-28', 'fields': 'id,employees'}).json()
+        self.assertEqual(set(body), {'id', 'employees'})
+        self.assertEqual(len(body['employees'][0]['leaves']), 3)
+        self.assertEqual(self.client.get(f'/outletsalldata/{self.outlet.pk}/', {'start_date': '2025-02-30'}).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN plans are PostgreSQL-specific")
+class ReportIndexUsageTests(TestCase):
+    """
+    The report predicates must stay answerable from the indexes added in
+    migrations 0012/0013 (e.g. a LOWER(status) creeping back in would not be).
+    Sequential scans are disabled so the plans don't depend on table size.
+    """
+    DAYS = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        outlet = Outlet.objects.create(name='O1', address='A', latitude=0, longitude=0, radius_meters=100)
+        employees = [
+            Employee.objects.create(
+                user=User.objects.create_user(username=f'emp{i}', password='x'),
+                fullname=f'Emp {i}', date_of_birth='1990-01-01',
+            )
+            for i in range(40)
+        ]
+        outlet.employees.add(*employees)
+
+        cls.start = date(2025, 1, 1)
+        now = timezone.now()
+        statuses = ['Present', 'Late', 'Half Day', 'Absent']
+        Attendance.objects.bulk_create([
+            Attendance(
+                employee=employee, date=cls.start + timedelta(days=d), check_in_time=now,
+                check_in_lat=0, check_in_long=0, status=statuses[(i + d) % len(statuses)],
+            )
+            for i, employee in enumerate(employees)
+            for d in range(cls.DAYS)
+        ])
+        EmpLeave.objects.bulk_create([
+            EmpLeave(employee=employee, leave_date=cls.start + timedelta(days=d), status=['approved', 'pending', 'rejected'][(i + d) % 3])
+            for i, employee in enumerate(employees)
+            for d in range(0, cls.DAYS, 4)
+        ])
+        cls.employee = employees[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE main_attendance")
+            cursor.execute("ANALYZE main_empleave")
+
+    def plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql, params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, *index_names):
+        self.assertTrue(any(name in plan for name in index_names), f"none of {index_names} used:\n{plan}")
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_attendance_employee_day(self):
+        plan = self.plan(
+            "SELECT status FROM main_attendance WHERE employee_id = %s AND date = %s",
+            [self.employee.pk, self.start],
+        )
+        self.assertUsesIndex(plan, 'attendance_employee_date_idx')
+
+    def test_attendance_date_range(self):
+        plan = self.plan(
+            "SELECT employee_id FROM main_attendance WHERE date BETWEEN %s AND %s",
+            [self.start, self.start + timedelta(days=6)],
+        )
+        self.assertUsesIndex(plan, 'attendance_date_id_idx', 'attendance_present_date_idx')
+
+    def test_attendance_present_on_date(self):
+        plan = self.plan(
+            "SELECT COUNT(DISTINCT employee_id) FROM main_attendance WHERE date = %s AND status IN ('Present', 'Late')",
+            [self.start],
+        )
+        self.assertUsesIndex(plan, 'attendance_present_date_idx', 'attendance_date_id_idx')
+
+    def test_approved_leave_range(self):
+        plan = self.plan(
+            "SELECT employee_id FROM main_empleave WHERE leave_date BETWEEN %s AND %s AND status = 'approved'",
+            [self.start, self.start + timedelta(days=6)],
+        )
+        self.assertUsesIndex(plan, 'empleave_approved_date_idx')
+
+    def test_employee_approved_leave(self):
+        plan = self.plan(
+            "SELECT leave_refno FROM main_empleave WHERE employee_id = %s AND leave_date BETWEEN %s AND %s AND status = 'approved'",
+            [self.employee.pk, self.start, self.start + timedelta(days=30)],
+        )
+        self.assertUsesIndex(plan, 'empleave_emp_date_status_idx', 'empleave_approved_date_idx')
+
+    def test_attendance_keyset_page(self):
+        # (date, attendance_id) seek used by KeysetPagination on AllAttendanceRecordsView
+        last = Attendance.objects.order_by('-date', '-attendance_id').values_list('date', 'attendance_id')[10]
+        plan = self.plan(
+            "SELECT attendance_id FROM main_attendance WHERE date <= %s AND (date < %s OR (date = %s AND attendance_id < %s))"
+            " ORDER BY date DESC, attendance_id DESC LIMIT 51",
+            [last[0], last[0], last[0], last[1]],
+        )
+        self.assertUsesIndex(plan, 'attendance_date_id_idx')
+        self.assertNotIn("Sort", plan)
+
+    def test_estimate_count(self):
+        self.assertGreater(estimate_count(Attendance.objects.all()), 0)
+        self.assertGreater(estimate_count(Attendance.objects.filter(date__gte=self.start).distinct()), 0)
+
+    def test_pending_leave_count(self):
+        plan = self.plan("SELECT COUNT(*) FROM main_empleave WHERE status = 'pending'")
+        self.assertUsesIndex(plan, 'empleave_pending_idx', 'empleave_emp_date_status_idx')
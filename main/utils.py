@@ -1,5 +1,9 @@
+import logging
 from math import radians, cos, sin, asin, sqrt
-from .models import Outlet
+from .models import Employee, Outlet
+from .geofence import get_geofence_index
+
+logger = logging.getLogger(__name__)
 
 def haversine(lat1, lon1, lat2, lon2):
     # Earth radius in meters
@@ -10,16 +14,34 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * asin(sqrt(a))
     return R * c
 
+def _employee_outlet_ids(employee):
+    # Read per call: the geofence index only holds outlet geometry
+    return set(Employee.outlets.through.objects.filter(employee_id=employee.pk).values_list('outlet_id', flat=True))
+
+def matching_outlets(employee, lat, lon):
+    """
+    Ids of the employee's active outlets whose geofence contains the point:
+    geometry from the in-memory geofence index, membership in one query.
+    """
+    return get_geofence_index().containing_outlets(float(lat), float(lon), _employee_outlet_ids(employee))
+
 def verify_location(employee, lat, lon):
     try:
-        for outlet in employee.outlets.all():
-            # Calculate the distance using the haversine formula
-            distance = haversine(lat, lon, outlet.latitude, outlet.longitude)
-
-            # If within the radius of any outlet, location is verified
-            if distance <= outlet.radius_meters:
-                return True
-        return False
-    except (Outlet.DoesNotExist, TypeError, AttributeError) as e:
+        # If within the radius of any of the employee's outlets, location is verified
+        return bool(matching_outlets(employee, lat, lon))
+    except (Outlet.DoesNotExist, TypeError, ValueError, AttributeError) as e:
         print(f"Location verification error: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def verify_locations(employee, points):
+    """
+    Bulk form of verify_location: `points` is a list of (lat, lon) pairs,
+    returns a list of booleans in the same order.
+    """
+    try:
+        points = [(float(lat), float(lon)) for lat, lon in points]
+        matches = get_geofence_index().bulk_containing(points, _employee_outlet_ids(employee))
+        return [bool(m) for m in matches]
+    except (TypeError, ValueError, AttributeError) as e:
+        logger.error(f"Location verification error: {str(e)}")
+        return [False] * len(points)
@@ -6,19 +6,22 @@ from django.contrib.auth.hashers import make_password
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.contrib.auth.models import User, Group
-from .serializers import  OutletSerializer, EmployeeSerializer, AgencySerializer, HolidaySerializer, LeaveTypeSerializer, AttendanceSerializer,EmployeeDetailSerializer,OutletDetailSerializer,LeaveEmployeeSerializer,SimpleLeaveSerializer
+from .serializers import  OutletSerializer, EmployeeSerializer, AgencySerializer, HolidaySerializer, LeaveTypeSerializer, AttendanceSerializer, AttendanceListSerializer, EmployeeDetailSerializer,OutletDetailSerializer,LeaveEmployeeSerializer,SimpleLeaveSerializer
 from django.shortcuts import render
 from rest_framework import viewsets
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
-from datetime import datetime
+from datetime import datetime, timedelta
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from django.db.models import Q
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.db.models import Prefetch
 from django.db import transaction
-from aas.pagination import paginate_queryset, StandardPagination
+from aas.pagination import EstimatedCountPagination, get_paginator, paginate_queryset, StandardPagination
+from aas.exports import export_format, streaming_export
+from .access import get_access_scope
 
 
 
@@ -151,17 +154,20 @@ def get_simple_leave_requests(request):
 
     leaves = leaves.order_by('-leave_refno')
 
-    return paginate_queryset(request, leaves, SimpleLeaveSerializer)
+    return paginate_queryset(
+        request, leaves, SimpleLeaveSerializer,
+        keyset_ordering=('-leave_refno',), pagination_class=EstimatedCountPagination,
+    )
 
     
 
 
 @api_view(['GET'])
 def get_outlet_employees(request):
-    user = request.user
+    scope = get_access_scope(request)
 
     # Ensure user is a manager
-    if not user.groups.filter(name="Manager").exists():
+    if not scope.is_manager:
         return Response({"detail": "Access denied. User is not a manager."}, status=403)
 
     outlet_id = request.query_params.get('outlet_id')
@@ -175,12 +181,11 @@ def get_outlet_employees(request):
         return Response({"detail": "Invalid outlet_id."}, status=400)
 
     # Ensure user has an associated employee profile
-    employee = getattr(user, 'employee', None)
-    if not employee:
+    if scope.employee_id is None:
         return Response({"detail": "Employee profile not found."}, status=404)
 
     # Check that outlet_id is in manager's outlet list
-    if not employee.outlets.filter(id=outlet_id).exists():
+    if not scope.has_outlet(outlet_id):
         return Response({"detail": "You are not assigned to this outlet."}, status=403)
 
     # Filter employees by outlet
@@ -749,35 +754,40 @@ def delete_device(request):
         return Response({"error": "Device not found."}, status=status.HTTP_404_NOT_FOUND)
     
 class AllAttendanceRecordsView(generics.ListAPIView):
-    serializer_class = AttendanceSerializer
+    serializer_class = AttendanceListSerializer
+    pagination_class = EstimatedCountPagination
+    keyset_ordering = ('-date', '-attendance_id')
+
+    @property
+    def paginator(self):
+        # ?pagination=keyset switches to cursor pages over (date, attendance_id)
+        if not hasattr(self, '_paginator'):
+            self._paginator = get_paginator(self.request, self.keyset_ordering, self.pagination_class)
+        return self._paginator
 
     def get_queryset(self):
-        user = self.request.user
-        base_queryset = Attendance.objects.select_related('employee')
+        scope = get_access_scope(self.request)
+        base_queryset = Attendance.objects.select_related('employee').prefetch_related('punch_events')
         outlet_id_str = self.request.query_params.get('outlet_id')
         queryset = None  # define early
 
         # --- Admin: access to all attendance records ---
-        if user.is_staff:
+        if scope.is_staff:
             queryset = base_queryset.all()
             if outlet_id_str and outlet_id_str != '0':
                 queryset = queryset.filter(employee__outlets__id=outlet_id_str)
 
         # --- Manager: access to records only in their outlets ---
-        elif user.groups.filter(name="Manager").exists():
-            try:
-                manager_outlets = user.employee.outlets.all()
-                if not manager_outlets.exists():
-                    return Attendance.objects.none()
-
-                queryset = base_queryset.filter(employee__outlets__in=manager_outlets)
+        elif scope.is_manager:
+            # No employee profile means no outlets
+            if not scope.outlet_ids:
+                return Attendance.objects.none()
 
-                # Manager can only filter within their own outlets
-                if outlet_id_str and outlet_id_str != '0':
-                    queryset = queryset.filter(employee__outlets__id=outlet_id_str, employee__outlets__in=manager_outlets)
+            queryset = base_queryset.filter(employee__outlets__in=scope.outlet_ids)
 
-            except Employee.DoesNotExist:
-                return Attendance.objects.none()
+            # Manager can only filter within their own outlets
+            if outlet_id_str and outlet_id_str != '0':
+                queryset = queryset.filter(employee__outlets__id=outlet_id_str, employee__outlets__in=scope.outlet_ids)
 
         # --- Others: not allowed ---
         else:
@@ -812,12 +822,37 @@ class AllAttendanceRecordsView(generics.ListAPIView):
 
         return queryset.distinct() if queryset is not None else Attendance.objects.none()
 
+class AllAttendanceRecordsExportView(AllAttendanceRecordsView):
+    """
+    AllAttendanceRecordsView (same access rules and filters) as a streamed
+    CSV/XLSX download; ?file_format=csv|xlsx.
+    """
+    COLUMNS = (
+        'attendance_id', 'employee_id', 'employee__empcode', 'employee__fullname', 'date',
+        'check_in_time', 'check_out_time', 'worked_hours', 'ot_hours', 'status',
+        'punchin_verification', 'punchout_verification',
+    )
+
+    def list(self, request, *args, **kwargs):
+        file_format = export_format(request)
+        if file_format is None:
+            return Response({"detail": "file_format must be csv or xlsx."}, status=status.HTTP_400_BAD_REQUEST)
+        rows = (
+            self.get_queryset()
+            .prefetch_related(None)
+            .order_by('-date', 'employee_id', 'attendance_id')
+            .values_list(*self.COLUMNS)
+            .iterator(chunk_size=2000)
+        )
+        header = [c.replace('employee__', '') for c in self.COLUMNS]
+        return streaming_export(f"attendance_{timezone.now().date()}", header, rows, file_format)
+
+
 class ChangepswrdView(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request, employee_id, format=None):
-        requesting_user = request.user
-        if not requesting_user.groups.filter(name__in=['Manager', 'Admin']).exists():
+        if not get_access_scope(request).in_group('Manager', 'Admin'):
             return Response(
                 {"error": "You do not have permission to perform this action."},
                 status=status.HTTP_403_FORBIDDEN
@@ -846,26 +881,51 @@ class EmployeeDetailView(generics.RetrieveAPIView):
     API view to retrieve all details for a single employee,
     including their attendance and leave records.
     """
-    queryset = Employee.objects.all().prefetch_related('attendances', 'empleave_set')
+    queryset = Employee.objects.all().prefetch_related('attendances', 'attendances__punch_events', 'empleave_set')
     serializer_class = EmployeeDetailSerializer
     lookup_field = 'employee_id' # Or 'pk' if you prefer to use the primary key
 
 
 
 class OutletDetailView(generics.RetrieveAPIView):
+    """
+    An outlet with its active employees and their attendance and leaves
+    between ?start_date and ?end_date (YYYY-MM-DD); by default the last
+    NESTED_DAYS days. ?fields= narrows the outlet fields.
+    """
     serializer_class = OutletDetailSerializer
-    queryset = Outlet.objects.all().prefetch_related(
-        Prefetch(
-            'employees',
-            queryset=Employee.objects.filter(user__is_active=True)
-                .select_related('user')
-                .prefetch_related(
-                    'attendances',
-                    'empleave_set',
-                    'empleave_set__leave_type'
-                ),
-            to_attr='active_employees'  # store filtered employees here
+    NESTED_DAYS = 31
+
+    def get_date_range(self):
+        params = self.request.query_params
+        dates = {}
+        for name in ('start_date', 'end_date'):
+            try:
+                dates[name] = parse_date(params[name]) if params.get(name) else None
+            except ValueError:
+                dates[name] = None
+            if params.get(name) and dates[name] is None:
+                raise ValidationError({"detail": f"{name} must be YYYY-MM-DD."})
+        end_date = dates['end_date'] or timezone.localdate()
+        return dates['start_date'] or end_date - timedelta(days=self.NESTED_DAYS - 1), end_date
+
+    def get_queryset(self):
+        date_range = self.get_date_range()
+        attendances = Attendance.objects.filter(date__range=date_range).prefetch_related('punch_events')
+        leaves = EmpLeave.objects.filter(leave_date__range=date_range).select_related('leave_type')
+        return Outlet.objects.all().prefetch_related(
+            Prefetch(
+                'employees',
+                queryset=Employee.objects.filter(user__is_active=True)
+                    .select_related('user')
+                    .prefetch_related(
+                        'user__groups',
+                        'outlets',
+                        Prefetch('attendances', queryset=attendances),
+                        Prefetch('empleave_set', queryset=leaves),
+                    ),
+                to_attr='active_employees'  # store filtered employees here
+            )
         )
-    )
 
 
@@ -0,0 +1,186 @@
+"""
+Short-TTL response cache for the report dashboard endpoints.
+
+Entries are keyed by endpoint and parameters plus the current version of
+every "tag" the response depends on:
+
+    day:<outlet id|all>:<date>   attendance/leave outcome counts of that day
+    pending:<outlet id|all>      pending leave requests
+    staff                        employees, outlets and their membership
+
+The rollup worker (report.rollup_queue) bumps the day and pending tags once
+it has refreshed the rollups, and report.signals the staff tag after an
+employee or outlet change commits, so the next poll misses and recomputes;
+the TTL only bounds staleness for anything the signals don't see (e.g. raw
+SQL writes). Versions live in the same cache
+(the "dashboard" alias), so with the file backend every gunicorn worker
+sees the bumps.
+"""
+from datetime import timedelta
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'dashboard'
+STATS_KEYS = {'hits': f'{PREFIX}:stats:hits', 'misses': f'{PREFIX}:stats:misses'}
+
+
+def _cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def _scope(outlet_id):
+    return 'all' if outlet_id is None else str(outlet_id)
+
+
+def day_tags(outlet_id, days):
+    return [f'day:{_scope(outlet_id)}:{d.isoformat()}' for d in days]
+
+
+def pending_tag(outlet_id):
+    return f'pending:{_scope(outlet_id)}'
+
+
+STAFF_TAG = 'staff'
+
+
+def dashboard_tags(outlet_id, days, pending=False):
+    """Tags of a dashboard response covering `days` for one outlet (None = all)."""
+    tags = day_tags(outlet_id, days) + [STAFF_TAG]
+    if pending:
+        tags.append(pending_tag(outlet_id))
+    return tags
+
+
+def today():
+    # The dashboard SQL uses CURRENT_DATE of the (UTC) database session
+    return timezone.now().date()
+
+
+def last_days(days):
+    end = today()
+    return [end - timedelta(days=n) for n in range(days - 1, -1, -1)]
+
+
+def month_to_date():
+    end = today()
+    return [end.replace(day=n) for n in range(1, end.day + 1)]
+
+
+def _version_key(tag):
+    return f'{PREFIX}:v:{tag}'
+
+
+def _new_version():
+    # Never repeats an earlier value if a version key gets evicted
+    return time.time_ns()
+
+
+def _versions(cache, tags):
+    keys = [_version_key(t) for t in tags]
+    found = cache.get_many(keys)
+    missing = {k: _new_version() for k in keys if k not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[k] for k in keys]
+
+
+def _count(cache, outcome):
+    key = STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def cached(endpoint, params, tags, compute):
+    """
+    Returns compute() for (endpoint, params), from the cache while none of
+    `tags` has been invalidated and the TTL hasn't passed. Cache errors
+    fall back to computing.
+    """
+    if settings.DASHBOARD_CACHE_TTL <= 0:
+        return compute()
+    try:
+        cache = _cache()
+        versions = _versions(cache, tags)
+        digest = hashlib.sha1(repr((params, tags, versions)).encode()).hexdigest()
+        key = f'{PREFIX}:r:{endpoint}:{digest}'
+        value = cache.get(key)
+    except Exception as e:
+        logger.error(f"Dashboard cache read failed for {endpoint}: {str(e)}")
+        return compute()
+
+    if value is not None:
+        _count(cache, 'hits')
+        return value
+
+    _count(cache, 'misses')
+    value = compute()
+    try:
+        cache.set(key, value, timeout=settings.DASHBOARD_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Dashboard cache write failed for {endpoint}: {str(e)}")
+    return value
+
+
+def invalidate(tags):
+    """Bumps the version of each tag; entries depending on them stop matching."""
+    tags = set(tags)
+    if not tags:
+        return
+    try:
+        cache = _cache()
+        for tag in tags:
+            key = _version_key(tag)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_version(), timeout=None)
+    except Exception as e:
+        logger.error(f"Dashboard cache invalidation failed: {str(e)}")
+
+
+def invalidate_employee_days(pairs, employee_outlets, pending=False):
+    """
+    Invalidates the day tags of (employee_id, date) pairs for each of the
+    employee's outlets and company-wide; `pending` also invalidates the
+    pending-leave tags of those outlets.
+    """
+    tags = set()
+    for employee_id, day in pairs:
+        for outlet_id in list(employee_outlets.get(employee_id, ())) + [None]:
+            tags.update(day_tags(outlet_id, [day]))
+            if pending:
+                tags.add(pending_tag(outlet_id))
+    invalidate(tags)
+
+
+def stats():
+    """Hit/miss counters since the cache was last cleared."""
+    try:
+        found = _cache().get_many(list(STATS_KEYS.values()))
+    except Exception as e:
+        logger.error(f"Dashboard cache stats failed: {str(e)}")
+        found = {}
+    hits = found.get(STATS_KEYS['hits'], 0)
+    misses = found.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'ttl_seconds': settings.DASHBOARD_CACHE_TTL,
+        'backend': settings.CACHES[settings.DASHBOARD_CACHE_ALIAS]['BACKEND'],
+    }
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report import dashboard_cache
+from report.models import EmployeeDayRollup
+from report.rollups import rebuild_employee_days, rebuild_outlet_days
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily attendance rollups behind the report dashboards from main_attendance and main_empleave."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First date to rebuild (YYYY-MM-DD). Default: all history.")
+        parser.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD). Default: all history.")
+        parser.add_argument(
+            '--if-empty', action='store_true',
+            help="Only rebuild when there are no rollups yet (the deploy backfill; a no-op afterwards).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], "%Y-%m-%d").date() if options['start'] else None
+            end = datetime.strptime(options['end'], "%Y-%m-%d").date() if options['end'] else None
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD.")
+
+        if options['if_empty'] and EmployeeDayRollup.objects.exists():
+            self.stdout.write("Rollups already built; nothing to backfill.")
+            return
+
+        employee_rows = rebuild_employee_days(start, end)
+        self.stdout.write(f"Employee-day rollups: {employee_rows} rows")
+
+        outlet_rows = rebuild_outlet_days(start, end)
+        dashboard_cache.invalidate([dashboard_cache.STAFF_TAG])  # every cached dashboard depends on it
+        self.stdout.write(self.style.SUCCESS(f"Outlet-day rollups: {outlet_rows} rows"))
@@ -0,0 +1,42 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from report.rollup_queue import run_worker, queue_metrics
+
+
+class Command(BaseCommand):
+    help = "Refreshes the daily attendance rollups of the employee-days queued by attendance and leave changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Employee-days refreshed per transaction.")
+        parser.add_argument('--metrics-interval', type=float, default=60.0, help="Seconds between queue metric log lines (0 disables).")
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping rollup worker...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        # One thread: refreshes are serialized by the rollup lock anyway
+        worker = threading.Thread(
+            target=run_worker,
+            args=(stop_event, options['poll_interval'], options['batch_size']),
+            name="rollup-worker",
+            daemon=True,
+        )
+        worker.start()
+
+        self.stdout.write(self.style.SUCCESS("Started the rollup worker."))
+
+        metrics_interval = options['metrics_interval']
+        while not stop_event.wait(metrics_interval or None):
+            self.stdout.write(f"Rollup queue: {queue_metrics()}")
+
+        worker.join()
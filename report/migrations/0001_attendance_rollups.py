@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('main', '0010_alter_attendance_options_attendance_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutletDayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('half_day', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('on_leave', models.IntegerField(default=0)),
+                ('outlet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='day_rollups', to='main.outlet')),
+            ],
+            options={
+                'db_table': 'rollup_outlet_day',
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeDayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.SmallIntegerField(default=0)),
+                ('late', models.SmallIntegerField(default=0)),
+                ('half_day', models.SmallIntegerField(default=0)),
+                ('absent', models.SmallIntegerField(default=0)),
+                ('on_leave', models.SmallIntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_rollups', to='main.employee')),
+            ],
+            options={
+                'db_table': 'rollup_employee_day',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='outletdayrollup',
+            constraint=models.UniqueConstraint(fields=('outlet', 'date'), name='rollup_outlet_day_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='outletdayrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('outlet__isnull', True)), fields=('date',), name='rollup_all_outlets_day_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='employeedayrollup',
+            index=models.Index(fields=['date'], name='rollup_employee_day_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='employeedayrollup',
+            constraint=models.UniqueConstraint(fields=('employee', 'date'), name='rollup_employee_day_unique'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0001_attendance_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.IntegerField()),
+                ('date', models.DateField()),
+                ('leave', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'rollup_refresh_queue',
+                'indexes': [models.Index(fields=['date', 'id'], name='rollup_refresh_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rolluprefresh',
+            constraint=models.UniqueConstraint(fields=('employee_id', 'date', 'leave'), name='rollup_refresh_unique'),
+        ),
+    ]
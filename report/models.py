@@ -1,3 +1,78 @@
 from django.db import models
+from django.db.models import Q
+from main.models import Employee, Outlet
 
-# Create your models here.
+
+class EmployeeDayRollup(models.Model):
+    """
+    Outcome of one employee on one day, derived from main_attendance and
+    main_empleave and kept current by report.rollups. Each metric is 0/1.
+    """
+    date = models.DateField()
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='day_rollups')
+    present = models.SmallIntegerField(default=0)  # any Present/Late attendance
+    late = models.SmallIntegerField(default=0)
+    half_day = models.SmallIntegerField(default=0)
+    absent = models.SmallIntegerField(default=0)  # marked Absent and not present
+    on_leave = models.SmallIntegerField(default=0)  # approved leave that day
+
+    def __str__(self):
+        return f"{self.employee_id} on {self.date}"
+
+    class Meta:
+        db_table = 'rollup_employee_day'
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='rollup_employee_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='rollup_employee_day_date_idx'),
+        ]
+
+
+class OutletDayRollup(models.Model):
+    """
+    Number of active employees per outcome for one outlet on one day. The
+    row with no outlet counts every active employee once (company-wide),
+    since employees can belong to several outlets.
+    """
+    date = models.DateField()
+    outlet = models.ForeignKey(Outlet, null=True, blank=True, on_delete=models.CASCADE, related_name='day_rollups')
+    present = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    half_day = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    on_leave = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.outlet_id or 'all outlets'} on {self.date}"
+
+    class Meta:
+        db_table = 'rollup_outlet_day'
+        constraints = [
+            models.UniqueConstraint(fields=['outlet', 'date'], name='rollup_outlet_day_unique'),
+            models.UniqueConstraint(fields=['date'], condition=Q(outlet__isnull=True), name='rollup_all_outlets_day_unique'),
+        ]
+
+
+class RollupRefresh(models.Model):
+    """
+    An employee-day whose rollups are out of date: queued by report.signals
+    in the transaction that changed it, refreshed and removed by
+    `manage.py run_rollup_workers` (report.rollup_queue).
+    """
+    employee_id = models.IntegerField()  # not a foreign key: the employee may be deleted before the refresh
+    date = models.DateField()
+    leave = models.BooleanField(default=False)  # queued by a leave change: also invalidates pending-leave dashboards
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.employee_id} on {self.date}"
+
+    class Meta:
+        db_table = 'rollup_refresh_queue'
+        constraints = [
+            models.UniqueConstraint(fields=['employee_id', 'date', 'leave'], name='rollup_refresh_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id'], name='rollup_refresh_date_idx'),
+        ]
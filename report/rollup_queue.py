@@ -0,0 +1,85 @@
+"""
+Queue of employee-days whose rollups need a refresh.
+
+report.signals queues the (employee_id, date) pairs an attendance or leave
+write touches, with one INSERT in the writing transaction; the refresh
+itself and the dashboard cache invalidation run in `manage.py
+run_rollup_workers`, so punches and leave actions don't pay for them. The
+dashboards lag the writes by about the worker's poll interval.
+"""
+import logging
+import time
+
+from django.db import close_old_connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from . import dashboard_cache, rollups
+from .models import RollupRefresh
+
+logger = logging.getLogger(__name__)
+
+
+def queue_refresh(pairs, leave=False):
+    """Queues (employee_id, date) pairs; call inside the transaction that changed them."""
+    rows = [
+        RollupRefresh(employee_id=employee_id, date=day, leave=leave)
+        for employee_id, day in set(pairs)
+        if employee_id is not None and day is not None
+    ]
+    if rows:
+        RollupRefresh.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+
+
+def refresh_queued(batch_size=500):
+    """
+    Refreshes up to `batch_size` queued employee-days (oldest dates first)
+    and removes them in one transaction, then invalidates their dashboard
+    entries. Returns the number of employee-days refreshed; on an error
+    they stay queued.
+    """
+    with transaction.atomic():
+        rollups.lock_rollups()
+        queued = list(RollupRefresh.objects.select_for_update(skip_locked=True).order_by('date', 'id')[:batch_size])
+        if not queued:
+            return 0
+        pairs = {(r.employee_id, r.date) for r in queued}
+        rollups.refresh_employee_days_bulk(pairs)
+        RollupRefresh.objects.filter(pk__in=[r.pk for r in queued]).delete()
+
+    # Only once the rollups are committed, or a poll in between would re-cache old counts
+    employee_outlets = rollups.employee_outlet_ids({employee_id for employee_id, _ in pairs})
+    leave_pairs = {(r.employee_id, r.date) for r in queued if r.leave}
+    dashboard_cache.invalidate_employee_days(pairs - leave_pairs, employee_outlets)
+    dashboard_cache.invalidate_employee_days(leave_pairs, employee_outlets, pending=True)
+    return len(pairs)
+
+
+def run_worker(stop_event, poll_interval=1.0, batch_size=500):
+    """Worker loop: refresh queued batches until the queue is empty, then sleep."""
+    while not stop_event.is_set():
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            refreshed = refresh_queued(batch_size)
+        except Exception as e:
+            logger.error(f"Rollup refresh failed: {str(e)}")
+            refreshed = 0
+
+        if not refreshed:
+            stop_event.wait(poll_interval)
+            continue
+        logger.info(f"Refreshed the rollups of {refreshed} employee-days in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    close_old_connections()
+
+
+def queue_metrics():
+    """Queued employee-days and how long the oldest has waited."""
+    now = timezone.now()
+    summary = RollupRefresh.objects.aggregate(oldest=Min('created_at'))
+    oldest = summary['oldest']
+    return {
+        "queued": RollupRefresh.objects.count(),
+        "oldest_queued_seconds": round((now - oldest).total_seconds(), 1) if oldest else 0,
+    }
@@ -0,0 +1,205 @@
+"""
+Daily attendance rollups behind the report dashboards.
+
+rollup_employee_day holds one row per (employee, date) with 0/1 flags;
+rollup_outlet_day holds the counts of active employees per (outlet, date)
+plus a company-wide row (outlet NULL). Employee changes (active flag,
+outlets, deletion) re-aggregate the outlet rows they affect (see
+report.signals); `manage.py rebuild_attendance_rollups` recomputes
+everything from scratch for backfill or repair.
+
+Attendance and leave changes only queue the employee-days they touch
+(report.rollup_queue, in the writing transaction); `manage.py
+run_rollup_workers` refreshes them set-based (refresh_employee_days_bulk())
+off the request path. Bulk writes that skip model signals (bulk_create,
+queryset.update) must send main.signals.bulk_written for the
+(employee_id, date) pairs they touch. All writers rebuild rows (delete and
+insert) under lock_rollups(), so they never overwrite each other.
+"""
+from collections import defaultdict
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from main.models import Attendance, EmpLeave, Employee
+from .models import EmployeeDayRollup, OutletDayRollup
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('present', 'late', 'half_day', 'absent', 'on_leave')
+
+# pg_advisory_xact_lock key of lock_rollups()
+ROLLUP_LOCK_ID = 48151623
+
+# Same rules as the dashboard SQL used on the raw tables
+PRESENT_STATUSES = {'present', 'late', '1'}
+
+
+def day_flags(statuses, on_leave):
+    """0/1 metrics for one employee-day from its attendance statuses and leave."""
+    statuses = {(s or '').strip().lower() for s in statuses}
+    present = bool(statuses & PRESENT_STATUSES)
+    return {
+        'present': int(present),
+        'late': int('late' in statuses),
+        'half_day': int('half day' in statuses),
+        'absent': int('absent' in statuses and not present),
+        'on_leave': int(bool(on_leave)),
+    }
+
+
+def employee_outlet_ids(employee_ids):
+    outlets = defaultdict(list)
+    rows = Employee.outlets.through.objects.filter(employee_id__in=employee_ids).values_list('employee_id', 'outlet_id')
+    for employee_id, outlet_id in rows:
+        outlets[employee_id].append(outlet_id)
+    return outlets
+
+
+def lock_rollups():
+    """
+    Serializes the rollup writers (the refresh worker, employee rebuilds,
+    rebuild_attendance_rollups) until the current transaction ends, so a
+    rebuild never replaces rows another writer has just changed. PostgreSQL
+    only; a no-op elsewhere.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [ROLLUP_LOCK_ID])
+
+
+def _date_runs(days, max_gap=7):
+    """Sorted `days` split where they are more than `max_gap` days apart."""
+    runs = []
+    for day in sorted(days):
+        if runs and (day - runs[-1][-1]).days <= max_gap:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def refresh_employee_days_bulk(pairs):
+    """
+    Set-based refresh of (employee_id, date) pairs: rebuilds the employees'
+    rows over each run of nearby dates (one old date doesn't widen the
+    span), then the rows of their outlets and the company-wide row.
+    """
+    pairs = set(pairs)
+    with transaction.atomic():
+        lock_rollups()
+        for run in _date_runs({day for _, day in pairs}):
+            first, last = run[0], run[-1]
+            employee_ids = {employee_id for employee_id, day in pairs if first <= day <= last}
+            rebuild_employee_days(first, last, employee_ids)
+            outlet_ids = {o for ids in employee_outlet_ids(employee_ids).values() for o in ids}
+            rebuild_outlet_days(first, last, outlet_ids)
+
+
+def rebuild_employee_days(start=None, end=None, employee_ids=None):
+    """
+    Recomputes rollup_employee_day from the raw tables, optionally limited
+    to a date range and/or employees. Returns the number of rows written.
+    """
+    with transaction.atomic():
+        lock_rollups()
+        return _rebuild_employee_days(start, end, employee_ids)
+
+
+def _rebuild_employee_days(start, end, employee_ids):
+    attendance = Attendance.objects.all()
+    leaves = EmpLeave.objects.filter(status='approved')
+    existing = EmployeeDayRollup.objects.all()
+    if start:
+        attendance, leaves, existing = attendance.filter(date__gte=start), leaves.filter(leave_date__gte=start), existing.filter(date__gte=start)
+    if end:
+        attendance, leaves, existing = attendance.filter(date__lte=end), leaves.filter(leave_date__lte=end), existing.filter(date__lte=end)
+    if employee_ids is not None:
+        attendance, leaves, existing = (
+            attendance.filter(employee_id__in=employee_ids),
+            leaves.filter(employee_id__in=employee_ids),
+            existing.filter(employee_id__in=employee_ids),
+        )
+
+    statuses = defaultdict(set)
+    for employee_id, day, status in attendance.values_list('employee_id', 'date', 'status').iterator(chunk_size=5000):
+        statuses[(employee_id, day)].add(status)
+    on_leave = set(leaves.values_list('employee_id', 'leave_date').distinct().iterator(chunk_size=5000))
+
+    rows = [
+        EmployeeDayRollup(employee_id=employee_id, date=day, **day_flags(statuses.get((employee_id, day), ()), (employee_id, day) in on_leave))
+        for employee_id, day in set(statuses) | on_leave
+    ]
+    existing.delete()
+    EmployeeDayRollup.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def rebuild_outlet_days(start=None, end=None, outlet_ids=None, include_all_outlets=True):
+    """
+    Recomputes rollup_outlet_day from rollup_employee_day, current outlet
+    membership and Employee.is_active. `outlet_ids=None` means every outlet;
+    `include_all_outlets` also rebuilds the company-wide rows. Returns the
+    number of rows written.
+    """
+    with transaction.atomic():
+        lock_rollups()
+        return _rebuild_outlet_days(start, end, outlet_ids, include_all_outlets)
+
+
+def _rebuild_outlet_days(start, end, outlet_ids, include_all_outlets):
+    days = EmployeeDayRollup.objects.filter(employee__is_active=True)
+    existing = OutletDayRollup.objects.all()
+    if start:
+        days, existing = days.filter(date__gte=start), existing.filter(date__gte=start)
+    if end:
+        days, existing = days.filter(date__lte=end), existing.filter(date__lte=end)
+
+    if outlet_ids is not None:
+        outlet_ids = set(outlet_ids)
+        scoped = existing.filter(outlet_id__in=outlet_ids)
+        existing = (scoped | existing.filter(outlet__isnull=True)) if include_all_outlets else scoped
+        if not include_all_outlets:
+            days = days.filter(employee__outlets__id__in=outlet_ids).distinct()
+    elif not include_all_outlets:
+        existing = existing.filter(outlet__isnull=False)
+
+    membership = employee_outlet_ids(Employee.objects.filter(is_active=True).values('pk'))
+    totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for row in days.values('employee_id', 'date', *METRICS).iterator(chunk_size=5000):
+        targets = [o for o in membership.get(row['employee_id'], ()) if outlet_ids is None or o in outlet_ids]
+        if include_all_outlets:
+            targets.append(None)
+        for outlet_id in targets:
+            total = totals[(outlet_id, row['date'])]
+            for metric in METRICS:
+                total[metric] += row[metric]
+
+    rows = [
+        OutletDayRollup(outlet_id=outlet_id, date=day, **counts)
+        for (outlet_id, day), counts in totals.items()
+        if any(counts.values())
+    ]
+    existing.delete()
+    OutletDayRollup.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def employee_date_span(employee_ids):
+    """(first, last) rollup date of the given employees, or (None, None)."""
+    span = EmployeeDayRollup.objects.filter(employee_id__in=employee_ids).aggregate(first=Min('date'), last=Max('date'))
+    return span['first'], span['last']
+
+
+def rebuild_for_employees(employee_ids, outlet_ids, span=None, include_all_outlets=True):
+    """
+    Re-aggregates the outlet rows an employee change affects (active flag,
+    outlet membership, deletion): `outlet_ids`, plus the company-wide row
+    unless `include_all_outlets` is False (membership changes don't move
+    it), over the dates those employees have rollups for.
+    """
+    first, last = span or employee_date_span(employee_ids)
+    if first is None or (not outlet_ids and not include_all_outlets):
+        return
+    rebuild_outlet_days(start=first, end=last, outlet_ids=outlet_ids, include_all_outlets=include_all_outlets)
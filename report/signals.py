@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from main.models import Attendance, EmpLeave, Employee, Outlet
+from main.signals import bulk_written
+from . import dashboard_cache, rollups
+from .rollup_queue import queue_refresh
+
+
+# --- Attendance / leave rows -> queued employee-day refresh (run_rollup_workers) ---
+
+@receiver(post_init, sender=Attendance)
+def remember_attendance_key(sender, instance, **kwargs):
+    d = instance.__dict__
+    instance._rollup_original = (d.get('employee_id'), d.get('date'), d.get('status'))
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    original = getattr(instance, '_rollup_original', (None, None, None))
+    current = (instance.employee_id, instance.date, instance.status)
+    if kwargs.get('created') is False and original == current:
+        return  # e.g. punch-out: times/location only
+    queue_refresh([original[:2], current[:2]])
+    instance._rollup_original = current
+
+
+@receiver(post_init, sender=EmpLeave)
+def remember_leave_key(sender, instance, **kwargs):
+    d = instance.__dict__
+    instance._rollup_original = (d.get('employee_id'), d.get('leave_date'), d.get('status'))
+
+
+@receiver(post_save, sender=EmpLeave)
+@receiver(post_delete, sender=EmpLeave)
+def leave_changed(sender, instance, **kwargs):
+    original = getattr(instance, '_rollup_original', (None, None, None))
+    current = (instance.employee_id, instance.leave_date, instance.status)
+    if kwargs.get('created') is False and original == current:
+        return
+    queue_refresh([original[:2], current[:2]], leave=True)
+    instance._rollup_original = current
+
+
+@receiver(bulk_written, sender=Attendance)
+@receiver(bulk_written, sender=EmpLeave)
+def rows_bulk_written(sender, pairs, **kwargs):
+    queue_refresh(pairs, leave=sender is EmpLeave)
+
+
+# --- Employee changes -> re-aggregate the affected outlet rows ---
+
+def _rebuild(employee_ids, outlet_ids, span, include_all_outlets):
+    rollups.rebuild_for_employees(employee_ids, outlet_ids, span, include_all_outlets)
+    dashboard_cache.invalidate([dashboard_cache.STAFF_TAG])
+
+
+def _schedule_rebuild(employee_ids, outlet_ids, span=None, include_all_outlets=True):
+    transaction.on_commit(lambda: _rebuild(employee_ids, outlet_ids, span, include_all_outlets))
+
+
+def _schedule_staff_invalidation():
+    transaction.on_commit(lambda: dashboard_cache.invalidate([dashboard_cache.STAFF_TAG]))
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee_active(sender, instance, **kwargs):
+    instance._rollup_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, created, **kwargs):
+    previous = instance._rollup_is_active
+    instance._rollup_is_active = instance.is_active
+    if created or previous is None or previous == instance.is_active:
+        # Headcounts/names on the dashboards may still have changed
+        _schedule_staff_invalidation()
+        return
+    outlet_ids = list(instance.outlets.values_list('id', flat=True))
+    _schedule_rebuild([instance.pk], outlet_ids)
+
+
+@receiver(pre_delete, sender=Employee)
+def employee_deleting(sender, instance, **kwargs):
+    # Rollup rows go with the employee (cascade); remember what they counted towards
+    instance._rollup_outlets = list(instance.outlets.values_list('id', flat=True))
+    instance._rollup_span = rollups.employee_date_span([instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def employee_deleted(sender, instance, **kwargs):
+    if instance._rollup_span[0] is not None:
+        _schedule_rebuild([instance.pk], instance._rollup_outlets, instance._rollup_span)
+    else:
+        _schedule_staff_invalidation()
+
+
+@receiver(bulk_written, sender=Employee)
+def employees_bulk_created(sender, pairs, **kwargs):
+    # New employees have no rollup rows yet; only headcounts/names change
+    _schedule_staff_invalidation()
+
+
+@receiver(m2m_changed, sender=Employee.outlets.through)
+def employee_outlets_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The cleared ids are unknown after the fact
+        if reverse:
+            instance._rollup_cleared = list(instance.employees.values_list('pk', flat=True))
+        else:
+            instance._rollup_cleared = list(instance.outlets.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    changed = list(pk_set or ()) if action != 'post_clear' else getattr(instance, '_rollup_cleared', [])
+    if not changed:
+        return
+    # Membership doesn't change the company-wide row: only the changed outlets' rows
+    if reverse:
+        # outlet.employees.add/remove(...): one outlet, several employees
+        _schedule_rebuild(changed, [instance.pk], include_all_outlets=False)
+    else:
+        _schedule_rebuild([instance.pk], changed, include_all_outlets=False)
+
+
+@receiver(post_save, sender=Outlet)
+@receiver(post_delete, sender=Outlet)
+def outlet_changed(sender, instance, **kwargs):
+    _schedule_staff_invalidation()
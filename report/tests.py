@@ -1,3 +1,264 @@
-from django.test import TestCase
+from datetime import date
+import io
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from main.models import Attendance, EmpLeave, Employee, Outlet
+from report import dashboard_cache
+from report.models import EmployeeDayRollup, OutletDayRollup, RollupRefresh
+from report.rollup_queue import refresh_queued
+from report.rollups import rebuild_employee_days, rebuild_outlet_days
+from report.views import EmployeeBatchReportAPIView
+
+
+class RollupTests(TestCase):
+    """The queued refreshes and employee rebuilds keep the rollups equal to a full rebuild."""
+
+    def setUp(self):
+        self.first_outlet = Outlet.objects.create(name='O1', address='A', latitude=0, longitude=0, radius_meters=100)
+        self.second_outlet = Outlet.objects.create(name='O2', address='B', latitude=0, longitude=0, radius_meters=100)
+        self.a, self.b = [
+            Employee.objects.create(user=User.objects.create(username=name), fullname=name, date_of_birth='1990-01-01')
+            for name in ('a', 'b')
+        ]
+        self.a.outlets.add(self.first_outlet)
+        self.b.outlets.add(self.first_outlet, self.second_outlet)
+        self.day = date(2025, 3, 1)
+
+    def attend(self, employee, day, status):
+        return Attendance.objects.create(
+            employee=employee, date=day, check_in_time=timezone.now(), check_in_lat=0, check_in_long=0, status=status,
+        )
+
+    def outlet_row(self, outlet, day):
+        return OutletDayRollup.objects.filter(outlet=outlet, date=day).values('present', 'late', 'absent', 'on_leave').first()
+
+    def rows(self):
+        return (
+            list(EmployeeDayRollup.objects.order_by('employee', 'date').values_list(
+                'employee', 'date', 'present', 'late', 'half_day', 'absent', 'on_leave')),
+            list(OutletDayRollup.objects.order_by('outlet', 'date').values_list(
+                'outlet', 'date', 'present', 'late', 'half_day', 'absent', 'on_leave')),
+        )
+
+    def test_punch_is_queued_and_refreshed_by_worker(self):
+        self.attend(self.a, self.day, 'Present')
+        self.assertEqual(list(RollupRefresh.objects.values_list('employee_id', 'date', 'leave')), [(self.a.pk, self.day, False)])
+        self.assertFalse(EmployeeDayRollup.objects.exists())
+
+        self.assertEqual(refresh_queued(), 1)
+        self.assertFalse(RollupRefresh.objects.exists())
+        self.assertEqual(self.outlet_row(self.first_outlet, self.day), {'present': 1, 'late': 0, 'absent': 0, 'on_leave': 0})
+        self.assertEqual(self.outlet_row(None, self.day)['present'], 1)
+        self.assertIsNone(self.outlet_row(self.second_outlet, self.day))
+        self.assertEqual(refresh_queued(), 0)
+
+    def test_incremental_matches_rebuild(self):
+        old_day = date(2024, 6, 1)  # far from the others: refreshed as its own date run
+        second_day = date(2025, 3, 2)
+        self.attend(self.a, self.day, 'Present')
+        self.attend(self.b, self.day, 'Late')
+        self.attend(self.a, second_day, 'Absent')
+        self.attend(self.b, old_day, 'Present')
+        revoked = EmpLeave.objects.create(employee=self.b, leave_date=second_day, status='approved')
+        EmpLeave.objects.create(employee=self.a, leave_date=date(2025, 3, 3), status='approved')
+        refresh_queued()
+        self.assertEqual(self.outlet_row(self.second_outlet, second_day)['on_leave'], 1)
+
+        # leave revoked
+        revoked.status = 'rejected'
+        revoked.save()
+        refresh_queued()
+        self.assertIsNone(self.outlet_row(self.second_outlet, second_day))
+
+        # deactivation and outlet changes rebuild after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.is_active = False
+            self.b.save()
+        self.assertEqual(self.outlet_row(None, self.day), {'present': 1, 'late': 0, 'absent': 0, 'on_leave': 0})
+
+        company_rows = list(OutletDayRollup.objects.filter(outlet__isnull=True).values_list('date', 'present', 'absent', 'on_leave'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.outlets.add(self.second_outlet)
+            self.first_outlet.employees.remove(self.a)
+        self.assertEqual(self.outlet_row(self.second_outlet, second_day)['absent'], 1)
+        self.assertIsNone(self.outlet_row(self.first_outlet, second_day))
+        self.assertEqual(
+            list(OutletDayRollup.objects.filter(outlet__isnull=True).values_list('date', 'present', 'absent', 'on_leave')),
+            company_rows,
+        )
+
+        self.attend(self.a, date(2025, 3, 4), 'Present')
+        refresh_queued()
+
+        incremental = self.rows()
+        rebuild_employee_days()
+        rebuild_outlet_days()
+        self.assertEqual(self.rows(), incremental)
+
+    def test_deploy_backfill_runs_once(self):
+        self.attend(self.a, self.day, 'Present')
+        RollupRefresh.objects.all().delete()  # history from before the rollups existed
+        call_command('rebuild_attendance_rollups', '--if-empty', stdout=io.StringIO())
+        self.assertEqual(self.outlet_row(self.first_outlet, self.day)['present'], 1)
+
+        EmployeeDayRollup.objects.update(present=0)
+        call_command('rebuild_attendance_rollups', '--if-empty', stdout=io.StringIO())
+        self.assertFalse(EmployeeDayRollup.objects.filter(present=1).exists())
+
+
+@override_settings(
+    DASHBOARD_CACHE_TTL=60,
+    CACHES=dict(settings.CACHES, **{settings.DASHBOARD_CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard-tests',
+    }}),
+)
+class DashboardCacheTests(TestCase):
+    """Dashboard responses are cached per endpoint, parameters and tag versions."""
+
+    def setUp(self):
+        dashboard_cache._cache().clear()
+        self.day = date(2025, 3, 1)
+        self.compute = mock.Mock(side_effect=lambda: {'n': self.compute.call_count})
+
+    def get(self, outlet_id, params=None, pending=False):
+        tags = dashboard_cache.dashboard_tags(outlet_id, [self.day], pending=pending)
+        return dashboard_cache.cached('overview', params or {'outlet': outlet_id}, tags, self.compute)
+
+    def test_tags(self):
+        self.assertEqual(dashboard_cache.dashboard_tags(5, [self.day], pending=True), ['day:5:2025-03-01', 'staff', 'pending:5'])
+        self.assertEqual(dashboard_cache.dashboard_tags(None, [self.day]), ['day:all:2025-03-01', 'staff'])
+
+    def test_keyed_by_params(self):
+        self.assertEqual(self.get(5), {'n': 1})
+        self.assertEqual(self.get(5), {'n': 1})
+        self.assertEqual(self.get(5, {'outlet': 5, 'days': 7}), {'n': 2})
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_invalidate_employee_days(self):
+        for outlet_id in (5, 6, None):
+            self.get(outlet_id)
+            self.get(outlet_id, pending=True)
+        self.assertEqual(self.compute.call_count, 6)
+
+        dashboard_cache.invalidate_employee_days({(1, self.day)}, {1: [5]})
+        self.get(6)  # not one of the employee's outlets
+        self.get(6, pending=True)
+        self.assertEqual(self.compute.call_count, 6)
+        self.get(5)
+        self.get(None)
+        self.assertEqual(self.compute.call_count, 8)
+
+        dashboard_cache.invalidate_employee_days({(1, date(2025, 3, 2))}, {1: [5]}, pending=True)
+        self.get(5)  # other day, pending not part of it
+        self.assertEqual(self.compute.call_count, 8)
+        self.get(5, pending=True)
+        self.assertEqual(self.compute.call_count, 9)
+
+    def test_culled_version_is_not_reused(self):
+        self.get(5)
+        dashboard_cache.invalidate(['day:5:2025-03-01'])
+        self.get(5)
+        dashboard_cache._cache().delete(dashboard_cache._version_key('day:5:2025-03-01'))
+        self.get(5)
+        self.assertEqual(self.compute.call_count, 3)
+
+    def test_stats(self):
+        self.assertEqual(dashboard_cache.stats()['hit_rate'], None)
+        self.get(5)
+        self.get(5)
+        self.get(5)
+        stats = dashboard_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (2, 1, 0.6667))
+
+    def test_stats_view_is_staff_only(self):
+        user = User.objects.create(username='viewer')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/report/dashboard/cache-stats/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = client.get('/report/dashboard/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ttl_seconds'], 60)
+
+
+class EmployeeBatchReportTests(TestCase):
+    """report/employees/batch/ streams the daily reports of an outlet or an id list, one employee at a time."""
+
+    def setUp(self):
+        self.first_outlet = Outlet.objects.create(name='O1', address='A', latitude=0, longitude=0, radius_meters=100)
+        self.second_outlet = Outlet.objects.create(name='O2', address='B', latitude=0, longitude=0, radius_meters=100)
+        self.manager, self.colleague, self.other = [
+            Employee.objects.create(user=User.objects.create(username=name), fullname=name, date_of_birth='1990-01-01')
+            for name in ('manager', 'colleague', 'other')
+        ]
+        self.manager.outlets.add(self.first_outlet)
+        self.colleague.outlets.add(self.first_outlet)
+        self.other.outlets.add(self.second_outlet)
+        self.manager.user.groups.add(Group.objects.create(name='Manager'))
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager.user)
+
+    def batch(self, **params):
+        return self.client.get('/report/employees/batch/', dict({'start_date': '2025-03-01', 'end_date': '2025-03-02'}, **params))
+
+    def test_stream_groups_rows_by_employee(self):
+        rows = [
+            {'employee_id': 1, 'fullname': 'One', 'work_date': date(2025, 3, 2), 'attendance_status': 'Present'},
+            {'employee_id': 1, 'fullname': 'One', 'work_date': date(2025, 3, 1)},
+            {'employee_id': 2, 'fullname': 'Two', 'work_date': date(2025, 3, 2), 'leave_refno': 'L1'},
+        ]
+        document = json.loads(''.join(EmployeeBatchReportAPIView._stream(iter(rows), date(2025, 3, 1), date(2025, 3, 2))))
+        self.assertEqual(document['start_date'], '2025-03-01')
+        self.assertEqual([r['employee_details']['fullname'] for r in document['results']], ['One', 'Two'])
+        self.assertEqual(
+            [e['attendance_status'] for e in document['results'][0]['daily_report']], ['Present', 'Blank Day'],
+        )
+
+    def test_empty_selection_is_valid_json(self):
+        document = json.loads(''.join(EmployeeBatchReportAPIView._stream(iter([]), date(2025, 3, 1), date(2025, 3, 2))))
+        self.assertEqual(document, {'start_date': '2025-03-01', 'end_date': '2025-03-02', 'results': []})
+
+    def test_selection_is_required_and_limited(self):
+        self.assertEqual(self.batch().status_code, 400)
+        too_many = ','.join(str(n) for n in range(EmployeeBatchReportAPIView.MAX_EMPLOYEE_IDS + 1))
+        self.assertEqual(self.batch(employee_ids=too_many).status_code, 400)
+
+    def test_non_admins_see_their_outlets_and_themselves(self):
+        self.assertEqual(self.batch(outlet_id=self.first_outlet.pk).status_code, 200)
+        self.assertEqual(self.batch(employee_ids=f'{self.manager.pk},{self.colleague.pk}').status_code, 200)
+        self.assertEqual(self.batch(outlet_id=self.second_outlet.pk).status_code, 403)
+        self.assertEqual(self.batch(employee_ids=f'{self.colleague.pk},{self.other.pk}').status_code, 403)
+        self.assertEqual(self.batch(employee_ids='424242').status_code, 403)
+
+        self.client.force_authenticate(self.colleague.user)  # no outlets beyond their own
+        self.assertEqual(self.batch(employee_ids=str(self.colleague.pk)).status_code, 200)
+
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(self.batch(outlet_id=self.second_outlet.pk).status_code, 200)
+
+    @skipUnless(connection.vendor == 'postgresql', "The report SQL is PostgreSQL-specific")
+    def test_outlet_and_id_list_selection(self):
+        def employee_ids(response):
+            document = json.loads(b''.join(response.streaming_content))
+            return [r['employee_details']['employee_id'] for r in document['results']]
+
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(employee_ids(self.batch(outlet_id=self.first_outlet.pk)), [self.manager.pk, self.colleague.pk])
+        self.assertEqual(employee_ids(self.batch(employee_ids=f'{self.other.pk},{self.manager.pk}')), [self.manager.pk, self.other.pk])
+        self.assertEqual(
+            employee_ids(self.batch(outlet_id=self.first_outlet.pk, employee_ids=f'{self.colleague.pk},{self.other.pk}')),
+            [self.colleague.pk],
+        )
+        self.assertEqual(employee_ids(self.batch(outlet_id=self.first_outlet.pk, employee_ids=str(self.other.pk))), [])
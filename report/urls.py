@@ -5,10 +5,13 @@ from .views import (
     OutletSummaryAPIView,
     EmployeeAttendanceSummaryAPIView,
     EmployeeReportAPIView,
+    EmployeeReportExportAPIView,
+    EmployeeBatchReportAPIView,
     # New outlet-filtered views
     DashboardOverviewByOutletAPIView,
     LeavePresenceTrendByOutletAPIView,
     EmployeeAttendanceSummaryByOutletAPIView,
+    DashboardCacheStatsAPIView,
     EmployeesByManagerAPIView,
     OutletLeaveListAPIView,
     LeaveStatusUpdateAPIView,
@@ -56,14 +59,22 @@ urlpatterns = [
     path('dashboard/leave-presence-trend/filter', LeavePresenceTrendByOutletAPIView.as_view()),
     path('dashboard/employee-attendance-summary/filter', EmployeeAttendanceSummaryByOutletAPIView.as_view()),
 
+    # Dashboard response cache counters
+    path('dashboard/cache-stats/', DashboardCacheStatsAPIView.as_view(), name='dashboard_cache_stats'),
+    path('dashboard/cache-stats', DashboardCacheStatsAPIView.as_view()),
+
     # -------------------------------------------------------------------------
     # Employee endpoints
     # -------------------------------------------------------------------------
     path('employee/<int:employee_id>/', EmployeeReportAPIView.as_view(), name='employee_report'),
+    path('employee/<int:employee_id>/export/', EmployeeReportExportAPIView.as_view(), name='employee_report_export'),
+    path('employees/batch/', EmployeeBatchReportAPIView.as_view(), name='employee_batch_report'),
     path('employees/user/<int:user_id>/', EmployeesByManagerAPIView.as_view(), name='employees_by_user'),
 
     # No-slash aliases (this one fixes your issue)
     path('employee/<int:employee_id>', EmployeeReportAPIView.as_view()),
+    path('employee/<int:employee_id>/export', EmployeeReportExportAPIView.as_view()),
+    path('employees/batch', EmployeeBatchReportAPIView.as_view()),
     path('employees/user/<int:user_id>', EmployeesByManagerAPIView.as_view()),
 
     # -------------------------------------------------------------------------
@@ -3,14 +3,24 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import connection
+from django.db.models import Q
+import json
+from itertools import groupby
+from operator import itemgetter
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from datetime import datetime, date, timedelta
 from django.utils import timezone
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.utils.dateparse import parse_date
 from django.contrib.auth.models import User
 from main.models import EmpLeave, Employee, LeaveType, Outlet
+from main.access import get_access_scope
+from main.leave_ingest import ingest_leaves
 from .serializers import EmpLeaveSerializer, LeaveCreateSerializer
-from aas.pagination import StandardPagination
+from aas.pagination import EstimatedCountPagination, StandardPagination, get_paginator
+from aas.exports import export_format, iter_sql, streaming_export
+from . import dashboard_cache
 
 from django.utils.timezone import now
 
@@ -66,39 +76,33 @@ class DashboardOverviewAPIView(APIView):
             outlet_summary AS (
               SELECT COUNT(*) AS outlet_count FROM public.main_outlet
             ),
-            attendance_summary AS (
-              SELECT COUNT(DISTINCT a.employee_id) AS present_emp
-              FROM public.main_attendance a
-              WHERE a.date = CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-            ),
-            leave_today AS (
-              SELECT COUNT(DISTINCT l.employee_id) AS on_leave
-              FROM public.main_empleave l
-              WHERE l.leave_date = CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
+            today AS (
+              -- company-wide rollup row (outlet_id NULL), see report.rollups
+              SELECT r.present, r.on_leave
+              FROM public.rollup_outlet_day r
+              WHERE r.date = CURRENT_DATE AND r.outlet_id IS NULL
             ),
             pending_leaves AS (
               SELECT COUNT(*) AS pending_leave_req
               FROM public.main_empleave
-              WHERE LOWER(status) = 'pending'
+              WHERE status = 'pending'
             )
             SELECT
               e.total_emp,
               e.active_emp,
               e.inactive_emp,
               o.outlet_count AS outlets,
-              COALESCE(a.present_emp, 0) AS present,
-              COALESCE(l.on_leave, 0) AS on_leave,
-              (e.active_emp - COALESCE(a.present_emp, 0) - COALESCE(l.on_leave, 0)) AS absentee,
+              COALESCE(t.present, 0) AS present,
+              COALESCE(t.on_leave, 0) AS on_leave,
+              (e.active_emp - COALESCE(t.present, 0) - COALESCE(t.on_leave, 0)) AS absentee,
               p.pending_leave_req
             FROM emp_summary e
             CROSS JOIN outlet_summary o
-            CROSS JOIN attendance_summary a
-            CROSS JOIN leave_today l
-            CROSS JOIN pending_leaves p;
+            CROSS JOIN pending_leaves p
+            LEFT JOIN today t ON TRUE;
             """
-            rows = run_sql(query)
+            tags = dashboard_cache.dashboard_tags(None, [dashboard_cache.today()], pending=True)
+            rows = dashboard_cache.cached('overview', None, tags, lambda: run_sql(query))
             data = rows[0] if rows else {}
             return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -121,44 +125,25 @@ class LeavePresenceTrendAPIView(APIView):
 
             # We will use INTERVAL placeholders - pass days as string to avoid SQL injection via formatting
             query = """
-            WITH active_emp AS (
-              SELECT employee_id FROM public.main_employee WHERE is_active = TRUE
-            ),
-            dates AS (
+            WITH dates AS (
               SELECT generate_series(CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day', CURRENT_DATE, INTERVAL '1 day')::date AS date
             ),
-            present_summary AS (
-              SELECT a.date::date AS date, COUNT(DISTINCT a.employee_id) AS present_count
-              FROM public.main_attendance a
-              INNER JOIN active_emp e ON e.employee_id = a.employee_id
-              WHERE a.date BETWEEN CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day' AND CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-              GROUP BY a.date::date
-            ),
-            leave_summary AS (
-              SELECT l.leave_date::date AS date, COUNT(DISTINCT l.employee_id) AS leave_count
-              FROM public.main_empleave l
-              INNER JOIN active_emp e ON e.employee_id = l.employee_id
-              WHERE l.leave_date BETWEEN CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day' AND CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
-              GROUP BY l.leave_date::date
-            ),
             total_emp AS (
-              SELECT COUNT(*) AS active_count FROM active_emp
+              SELECT COUNT(*) AS active_count FROM public.main_employee WHERE is_active = TRUE
             )
             SELECT
               to_char(d.date, 'DD-Mon') AS date_label,
-              COALESCE(l.leave_count, 0) AS leave,
-              COALESCE(p.present_count, 0) AS present,
-              (t.active_count - COALESCE(p.present_count, 0) - COALESCE(l.leave_count, 0)) AS not_marked
+              COALESCE(r.on_leave, 0) AS leave,
+              COALESCE(r.present, 0) AS present,
+              (t.active_count - COALESCE(r.present, 0) - COALESCE(r.on_leave, 0)) AS not_marked
             FROM dates d
             CROSS JOIN total_emp t
-            LEFT JOIN present_summary p ON d.date = p.date
-            LEFT JOIN leave_summary l ON d.date = l.date
+            LEFT JOIN public.rollup_outlet_day r ON r.date = d.date AND r.outlet_id IS NULL
             ORDER BY d.date;
             """
-            params = [days, days, days]
-            rows = run_sql(query, params)
+            params = [days]
+            tags = dashboard_cache.dashboard_tags(None, dashboard_cache.last_days(days))
+            rows = dashboard_cache.cached('trend', params, tags, lambda: run_sql(query, params))
             return Response(rows, status=status.HTTP_200_OK)
         except Exception as e:
             print("LeavePresenceTrendAPIView error:", e)
@@ -182,34 +167,26 @@ class OutletSummaryAPIView(APIView):
               INNER JOIN public.main_employee e ON e.employee_id = eo.employee_id
               WHERE e.is_active = TRUE
             ),
-            present AS (
-              SELECT DISTINCT a.employee_id
-              FROM public.main_attendance a
-              WHERE a.date = CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-            ),
-            on_leave AS (
-              SELECT DISTINCT l.employee_id
-              FROM public.main_empleave l
-              WHERE l.leave_date = CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
+            today AS (
+              SELECT r.outlet_id, r.present, r.on_leave
+              FROM public.rollup_outlet_day r
+              WHERE r.date = CURRENT_DATE AND r.outlet_id IS NOT NULL
             )
             SELECT
               o.id AS outlet_id,
               o.name,
               COUNT(DISTINCT eo.employee_id) AS totalemp,
-              COUNT(DISTINCT eo.employee_id) FILTER (WHERE eo.employee_id IN (SELECT employee_id FROM present)) AS presentemp,
-              COUNT(DISTINCT eo.employee_id) FILTER (WHERE eo.employee_id IN (SELECT employee_id FROM on_leave)) AS onleave,
-              COUNT(DISTINCT eo.employee_id)
-                - COUNT(DISTINCT eo.employee_id) FILTER (WHERE eo.employee_id IN (SELECT employee_id FROM present))
-                - COUNT(DISTINCT eo.employee_id) FILTER (WHERE eo.employee_id IN (SELECT employee_id FROM on_leave))
-                AS absentemp
+              COALESCE(t.present, 0) AS presentemp,
+              COALESCE(t.on_leave, 0) AS onleave,
+              COUNT(DISTINCT eo.employee_id) - COALESCE(t.present, 0) - COALESCE(t.on_leave, 0) AS absentemp
             FROM emp_outlet eo
             INNER JOIN public.main_outlet o ON o.id = eo.outlet_id
-            GROUP BY o.id, o.name
+            LEFT JOIN today t ON t.outlet_id = o.id
+            GROUP BY o.id, o.name, t.present, t.on_leave
             ORDER BY o.id;
             """
-            rows = run_sql(query)
+            tags = dashboard_cache.dashboard_tags(None, [dashboard_cache.today()])
+            rows = dashboard_cache.cached('outlet_summary', None, tags, lambda: run_sql(query))
             return Response(rows, status=status.HTTP_200_OK)
         except Exception as e:
             print("OutletSummaryAPIView error:", e)
@@ -241,21 +218,12 @@ class EmployeeAttendanceSummaryAPIView(APIView):
             date_range AS (
               SELECT generate_series(date_trunc('month', CURRENT_DATE)::date, CURRENT_DATE, '1 day'::interval) AS day
             ),
-            present_days AS (
-              SELECT a.employee_id, COUNT(DISTINCT a.date) AS present_days
-              FROM public.main_attendance a
-              WHERE a.date >= date_trunc('month', CURRENT_DATE)
-                AND a.date <= CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-              GROUP BY a.employee_id
-            ),
-            leave_days AS (
-              SELECT l.employee_id, COUNT(DISTINCT l.leave_date) AS leave_days
-              FROM public.main_empleave l
-              WHERE l.leave_date >= date_trunc('month', CURRENT_DATE)
-                AND l.leave_date <= CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
-              GROUP BY l.employee_id
+            month_days AS (
+              SELECT r.employee_id, SUM(r.present) AS present_days, SUM(r.on_leave) AS leave_days
+              FROM public.rollup_employee_day r
+              WHERE r.date >= date_trunc('month', CURRENT_DATE)
+                AND r.date <= CURRENT_DATE
+              GROUP BY r.employee_id
             ),
             working_days AS (SELECT COUNT(*) AS total_days FROM date_range)
             SELECT
@@ -263,16 +231,16 @@ class EmployeeAttendanceSummaryAPIView(APIView):
               eo.outlet_name,
               eo.fullname,
               eo.empcode,
-              COALESCE(pd.present_days, 0) AS present_days,
-              COALESCE(ld.leave_days, 0) AS leave_days,
-              wd.total_days - COALESCE(pd.present_days, 0) - COALESCE(ld.leave_days, 0) AS absent_days
+              COALESCE(md.present_days, 0) AS present_days,
+              COALESCE(md.leave_days, 0) AS leave_days,
+              wd.total_days - COALESCE(md.present_days, 0) - COALESCE(md.leave_days, 0) AS absent_days
             FROM emp_outlet eo
-            LEFT JOIN present_days pd ON pd.employee_id = eo.employee_id
-            LEFT JOIN leave_days ld ON ld.employee_id = eo.employee_id
+            LEFT JOIN month_days md ON md.employee_id = eo.employee_id
             CROSS JOIN working_days wd
             ORDER BY eo.outlet_name, eo.fullname;
             """
-            rows = run_sql(query)
+            tags = dashboard_cache.dashboard_tags(None, dashboard_cache.month_to_date())
+            rows = dashboard_cache.cached('employee_summary', None, tags, lambda: run_sql(query))
             return Response(rows, status=status.HTTP_200_OK)
         except Exception as e:
             print("EmployeeAttendanceSummaryAPIView error:", e)
@@ -312,25 +280,16 @@ class DashboardOverviewByOutletAPIView(APIView):
                 COUNT(fe.employee_id) FILTER (WHERE fe.is_active = FALSE) AS inactive_emp
               FROM filtered_employees fe
             ),
-            attendance_summary AS (
-              SELECT COUNT(DISTINCT a.employee_id) AS present_emp
-              FROM public.main_attendance a
-              INNER JOIN filtered_employees fe ON fe.employee_id = a.employee_id
-              WHERE a.date = CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-            ),
-            leave_today AS (
-              SELECT COUNT(DISTINCT l.employee_id) AS on_leave
-              FROM public.main_empleave l
-              INNER JOIN filtered_employees fe ON fe.employee_id = l.employee_id
-              WHERE l.leave_date = CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
+            today AS (
+              SELECT r.present, r.on_leave
+              FROM public.rollup_outlet_day r
+              WHERE r.date = CURRENT_DATE AND r.outlet_id = %s
             ),
             pending_leaves AS (
               SELECT COUNT(*) AS pending_leave_req
               FROM public.main_empleave l
               INNER JOIN filtered_employees fe ON fe.employee_id = l.employee_id
-              WHERE LOWER(l.status) = 'pending'
+              WHERE l.status = 'pending'
             ),
             outlet_summary AS (SELECT 1 AS outlet_count) -- since single outlet selected
             SELECT
@@ -338,18 +297,19 @@ class DashboardOverviewByOutletAPIView(APIView):
               e.active_emp,
               e.inactive_emp,
               o.outlet_count AS outlets,
-              COALESCE(a.present_emp, 0) AS present,
-              COALESCE(l.on_leave, 0) AS on_leave,
-              (e.active_emp - COALESCE(a.present_emp, 0) - COALESCE(l.on_leave, 0)) AS absentee,
+              COALESCE(t.present, 0) AS present,
+              COALESCE(t.on_leave, 0) AS on_leave,
+              (e.active_emp - COALESCE(t.present, 0) - COALESCE(t.on_leave, 0)) AS absentee,
               p.pending_leave_req
             FROM emp_summary e
             CROSS JOIN outlet_summary o
-            CROSS JOIN attendance_summary a
-            CROSS JOIN leave_today l
-            CROSS JOIN pending_leaves p;
+            CROSS JOIN pending_leaves p
+            LEFT JOIN today t ON TRUE;
             """
-            rows = run_sql(query, [int(outlet_id)])
-            data = rows[0] if rows else {}
+            outlet_id = int(outlet_id)
+            tags = dashboard_cache.dashboard_tags(outlet_id, [dashboard_cache.today()], pending=True)
+            rows = dashboard_cache.cached('overview', outlet_id, tags, lambda: run_sql(query, [outlet_id, outlet_id]))
+            data = dict(rows[0]) if rows else {}
             data['filter_outlet_id'] = int(outlet_id)
             return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -383,38 +343,22 @@ class LeavePresenceTrendByOutletAPIView(APIView):
             dates AS (
               SELECT generate_series(CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day', CURRENT_DATE, INTERVAL '1 day')::date AS date
             ),
-            present_summary AS (
-              SELECT a.date::date AS date, COUNT(DISTINCT a.employee_id) AS present_count
-              FROM public.main_attendance a
-              INNER JOIN active_emp e ON e.employee_id = a.employee_id
-              WHERE a.date BETWEEN CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day' AND CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-              GROUP BY a.date::date
-            ),
-            leave_summary AS (
-              SELECT l.leave_date::date AS date, COUNT(DISTINCT l.employee_id) AS leave_count
-              FROM public.main_empleave l
-              INNER JOIN active_emp e ON e.employee_id = l.employee_id
-              WHERE l.leave_date BETWEEN CURRENT_DATE - INTERVAL '%s days'::interval + INTERVAL '1 day' AND CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
-              GROUP BY l.leave_date::date
-            ),
             total_emp AS (
               SELECT COUNT(*) AS active_count FROM active_emp
             )
             SELECT
               to_char(d.date, 'DD-Mon') AS date_label,
-              COALESCE(l.leave_count, 0) AS leave,
-              COALESCE(p.present_count, 0) AS present,
-              (t.active_count - COALESCE(p.present_count, 0) - COALESCE(l.leave_count, 0)) AS not_marked
+              COALESCE(r.on_leave, 0) AS leave,
+              COALESCE(r.present, 0) AS present,
+              (t.active_count - COALESCE(r.present, 0) - COALESCE(r.on_leave, 0)) AS not_marked
             FROM dates d
             CROSS JOIN total_emp t
-            LEFT JOIN present_summary p ON d.date = p.date
-            LEFT JOIN leave_summary l ON d.date = l.date
+            LEFT JOIN public.rollup_outlet_day r ON r.date = d.date AND r.outlet_id = %s
             ORDER BY d.date;
             """
-            params = [int(outlet_id), days, days, days]
-            rows = run_sql(query, params)
+            params = [int(outlet_id), days, int(outlet_id)]
+            tags = dashboard_cache.dashboard_tags(int(outlet_id), dashboard_cache.last_days(days))
+            rows = dashboard_cache.cached('trend', params, tags, lambda: run_sql(query, params))
             return Response(rows, status=status.HTTP_200_OK)
         except Exception as e:
             print("LeavePresenceTrendByOutletAPIView error:", e)
@@ -450,23 +394,13 @@ class EmployeeAttendanceSummaryByOutletAPIView(APIView):
             date_range AS (
               SELECT generate_series(date_trunc('month', CURRENT_DATE)::date, CURRENT_DATE, '1 day'::interval) AS day
             ),
-            present_days AS (
-              SELECT a.employee_id, COUNT(DISTINCT a.date) AS present_days
-              FROM public.main_attendance a
-              INNER JOIN emp_outlet eo ON eo.employee_id = a.employee_id
-              WHERE a.date >= date_trunc('month', CURRENT_DATE)
-                AND a.date <= CURRENT_DATE
-                AND (LOWER(a.status) IN ('present','late') OR a.status = '1')
-              GROUP BY a.employee_id
-            ),
-            leave_days AS (
-              SELECT l.employee_id, COUNT(DISTINCT l.leave_date) AS leave_days
-              FROM public.main_empleave l
-              INNER JOIN emp_outlet eo ON eo.employee_id = l.employee_id
-              WHERE l.leave_date >= date_trunc('month', CURRENT_DATE)
-                AND l.leave_date <= CURRENT_DATE
-                AND LOWER(l.status) = 'approved'
-              GROUP BY l.employee_id
+            month_days AS (
+              SELECT r.employee_id, SUM(r.present) AS present_days, SUM(r.on_leave) AS leave_days
+              FROM public.rollup_employee_day r
+              INNER JOIN emp_outlet eo ON eo.employee_id = r.employee_id
+              WHERE r.date >= date_trunc('month', CURRENT_DATE)
+                AND r.date <= CURRENT_DATE
+              GROUP BY r.employee_id
             ),
             working_days AS (SELECT COUNT(*) AS total_days FROM date_range)
             SELECT
@@ -474,25 +408,181 @@ class EmployeeAttendanceSummaryByOutletAPIView(APIView):
               eo.outlet_name,
               eo.fullname,
               eo.empcode,
-              COALESCE(pd.present_days, 0) AS present_days,
-              COALESCE(ld.leave_days, 0) AS leave_days,
-              wd.total_days - COALESCE(pd.present_days, 0) - COALESCE(ld.leave_days, 0) AS absent_days
+              COALESCE(md.present_days, 0) AS present_days,
+              COALESCE(md.leave_days, 0) AS leave_days,
+              wd.total_days - COALESCE(md.present_days, 0) - COALESCE(md.leave_days, 0) AS absent_days
             FROM emp_outlet eo
-            LEFT JOIN present_days pd ON pd.employee_id = eo.employee_id
-            LEFT JOIN leave_days ld ON ld.employee_id = eo.employee_id
+            LEFT JOIN month_days md ON md.employee_id = eo.employee_id
             CROSS JOIN working_days wd
             ORDER BY eo.outlet_name, eo.fullname;
             """
-            rows = run_sql(query, [int(outlet_id)])
+            outlet_id = int(outlet_id)
+            tags = dashboard_cache.dashboard_tags(outlet_id, dashboard_cache.month_to_date())
+            rows = dashboard_cache.cached('employee_summary', outlet_id, tags, lambda: run_sql(query, [outlet_id]))
             return Response(rows, status=status.HTTP_200_OK)
         except Exception as e:
             print("EmployeeAttendanceSummaryByOutletAPIView error:", e)
             return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class DashboardCacheStatsAPIView(APIView):
+    """
+    Hit/miss counters of the dashboard response cache (report.dashboard_cache).
+    Staff only.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(dashboard_cache.stats(), status=status.HTTP_200_OK)
+
+
 # ------------------------------------------------
 # 6) Employee report (full-range) and employee details
 # ------------------------------------------------
+def employees_report_sql(start_date, end_date, employee_ids=None, outlet_id=None):
+    """
+    (query, params) of the daily report of several employees, selected by
+    id list and/or outlet membership; one row per employee and day, grouped
+    by employee (ascending id), newest day first.
+    """
+    filters, filter_params = [], []
+    if employee_ids is not None:
+        filters.append("e.employee_id = ANY(%s)")
+        filter_params.append(list(employee_ids))
+    if outlet_id is not None:
+        filters.append("e.employee_id IN (SELECT x.employee_id FROM public.main_employee_outlets x WHERE x.outlet_id = %s)")
+        filter_params.append(outlet_id)
+
+    query = f"""
+    WITH selected AS (
+        SELECT e.employee_id
+        FROM public.main_employee e
+        WHERE {' AND '.join(filters) or 'TRUE'}
+    ),
+    emp_outlets AS (
+        SELECT
+            e.employee_id,
+            STRING_AGG(o.name, ', ') AS outlet_names,
+            ARRAY_AGG(o.id) AS outlet_ids,
+            e.user_id,
+            e.fullname,
+            e.inactive_date
+        FROM public.main_employee e
+        INNER JOIN selected s ON s.employee_id = e.employee_id
+        LEFT JOIN public.main_employee_outlets eo ON e.employee_id = eo.employee_id
+        LEFT JOIN public.main_outlet o ON eo.outlet_id = o.id
+        GROUP BY e.employee_id, e.user_id, e.fullname, e.inactive_date
+    ),
+    dates AS (
+        SELECT generate_series(%s::date, %s::date, interval '1 day')::date AS day
+    ),
+    attendance AS (
+        SELECT
+            a.employee_id,
+            a.date AS work_date,
+            MIN(a.check_in_time) AS check_in_time,
+            MAX(a.check_out_time) AS check_out_time,
+            ROUND(EXTRACT(EPOCH FROM (MAX(a.check_out_time) - MIN(a.check_in_time))) / 3600, 2) AS worked_hours,
+            MAX(a.status) AS attendance_status,
+            JSON_AGG(a.verification_notes) FILTER (WHERE a.verification_notes IS NOT NULL) AS verification_notes
+        FROM public.main_attendance a
+        WHERE a.date BETWEEN %s AND %s
+          AND a.employee_id IN (SELECT employee_id FROM selected)
+        GROUP BY a.employee_id, a.date
+    ),
+    leaves AS (
+        SELECT
+            l.employee_id,
+            l.leave_date,
+            l.leave_refno,
+            l.remarks AS leave_remarks,
+            lt.id AS leave_type_id,
+            lt.att_type,
+            lt.att_type_name
+        FROM public.main_empleave l
+        LEFT JOIN public.leave_type lt ON l.leave_type_id = lt.id
+        WHERE l.status = 'approved'
+          AND l.leave_date BETWEEN %s AND %s
+          AND l.employee_id IN (SELECT employee_id FROM selected)
+    )
+    SELECT
+        eo.employee_id,
+        eo.user_id,
+        eo.fullname,
+        u.first_name AS user_first_name,
+        eo.inactive_date,
+        eo.outlet_names,
+        eo.outlet_ids,
+        d.day AS work_date,
+        a.check_in_time,
+        a.check_out_time,
+        a.worked_hours,
+        a.attendance_status,
+        a.verification_notes,
+        lv.leave_refno,
+        lv.leave_date,
+        lv.leave_remarks,
+        lv.leave_type_id,
+        lv.att_type,
+        lv.att_type_name
+    FROM emp_outlets eo
+    CROSS JOIN dates d
+    LEFT JOIN attendance a ON a.employee_id = eo.employee_id AND d.day = a.work_date
+    LEFT JOIN leaves lv ON lv.employee_id = eo.employee_id AND d.day = lv.leave_date
+    LEFT JOIN auth_user u ON eo.user_id = u.id
+    ORDER BY eo.employee_id, d.day DESC;
+    """
+
+    params = filter_params + [
+        start_date, end_date,  # dates
+        start_date, end_date,  # attendance
+        start_date, end_date,  # leaves
+    ]
+    return query, params
+
+
+def employee_report_sql(employee_id, start_date, end_date):
+    """(query, params) of the daily report of one employee; one row per day, newest first."""
+    return employees_report_sql(start_date, end_date, employee_ids=[employee_id])
+
+
+def _employee_details(r):
+    return {
+        "employee_id": r.get("employee_id"),
+        "user_id": r.get("user_id"),
+        "user_first_name": r.get("user_first_name"),
+        "fullname": r.get("fullname"),
+        "inactive_date": r.get("inactive_date"),
+        "outlet_names": r.get("outlet_names"),
+        "outlet_ids": r.get("outlet_ids"),
+    }
+
+
+def _daily_entry(r):
+    vnotes = r.get("verification_notes") or []
+    if isinstance(vnotes, str):
+        try:
+            vnotes = json.loads(vnotes)
+        except Exception:
+            vnotes = [vnotes]
+    entry = {
+        "work_date": r.get("work_date"),
+        "check_in_time": r.get("check_in_time"),
+        "check_out_time": r.get("check_out_time"),
+        "worked_hours": r.get("worked_hours"),
+        "attendance_status": r.get("attendance_status"),
+        "verification_notes": vnotes,
+        "leave_refno": r.get("leave_refno"),
+        "leave_remarks": r.get("leave_remarks"),
+        "leave_type_id": r.get("leave_type_id"),
+        "att_type": r.get("att_type"),
+        "att_type_name": r.get("att_type_name"),
+    }
+    if not entry["attendance_status"] and not entry["leave_refno"]:
+        entry["attendance_status"] = "Blank Day"
+    return entry
+
+
 class EmployeeReportAPIView(APIView):
     """
     Full-range employee report. Query params: start_date, end_date (YYYY-MM-DD)
@@ -503,87 +593,7 @@ class EmployeeReportAPIView(APIView):
             end_date_str = request.query_params.get("end_date")
             start_date, end_date = parse_dates_or_default(start_date_str, end_date_str)
 
-            query = """
-            WITH emp_outlets AS (
-                SELECT
-                    e.employee_id,
-                    STRING_AGG(o.name, ', ') AS outlet_names,
-                    ARRAY_AGG(o.id) AS outlet_ids,
-                    e.user_id,
-                    e.fullname,
-                    e.inactive_date
-                FROM public.main_employee e
-                LEFT JOIN public.main_employee_outlets eo ON e.employee_id = eo.employee_id
-                LEFT JOIN public.main_outlet o ON eo.outlet_id = o.id
-                WHERE e.employee_id = %s
-                GROUP BY e.employee_id, e.user_id, e.fullname, e.inactive_date
-            ),
-            dates AS (
-                SELECT generate_series(%s::date, %s::date, interval '1 day')::date AS day
-            ),
-            attendance AS (
-                SELECT
-                    a.employee_id,
-                    a.date AS work_date,
-                    MIN(a.check_in_time) AS check_in_time,
-                    MAX(a.check_out_time) AS check_out_time,
-                    ROUND(EXTRACT(EPOCH FROM (MAX(a.check_out_time) - MIN(a.check_in_time))) / 3600, 2) AS worked_hours,
-                    MAX(a.status) AS attendance_status,
-                    JSON_AGG(a.verification_notes) FILTER (WHERE a.verification_notes IS NOT NULL) AS verification_notes
-                FROM public.main_attendance a
-                WHERE a.date BETWEEN %s AND %s
-                  AND a.employee_id = %s
-                GROUP BY a.employee_id, a.date
-            ),
-            leaves AS (
-                SELECT
-                    l.employee_id,
-                    l.leave_date,
-                    l.leave_refno,
-                    l.remarks AS leave_remarks,
-                    lt.id AS leave_type_id,
-                    lt.att_type,
-                    lt.att_type_name
-                FROM public.main_empleave l
-                LEFT JOIN public.leave_type lt ON l.leave_type_id = lt.id
-                WHERE LOWER(l.status) = 'approved'
-                  AND l.leave_date BETWEEN %s AND %s
-                  AND l.employee_id = %s
-            )
-            SELECT
-                eo.employee_id,
-                eo.user_id,
-                eo.fullname,
-                u.first_name AS user_first_name,
-                eo.inactive_date,
-                eo.outlet_names,
-                eo.outlet_ids,
-                d.day AS work_date,
-                a.check_in_time,
-                a.check_out_time,
-                a.worked_hours,
-                a.attendance_status,
-                a.verification_notes,
-                lv.leave_refno,
-                lv.leave_date,
-                lv.leave_remarks,
-                lv.leave_type_id,
-                lv.att_type,
-                lv.att_type_name
-            FROM emp_outlets eo
-            CROSS JOIN dates d
-            LEFT JOIN attendance a ON a.employee_id = eo.employee_id AND d.day = a.work_date
-            LEFT JOIN leaves lv ON lv.employee_id = eo.employee_id AND d.day = lv.leave_date
-            LEFT JOIN auth_user u ON eo.user_id = u.id
-            ORDER BY d.day DESC;
-            """
-
-            params = [
-                employee_id,  # emp_outlets
-                start_date, end_date,  # dates
-                start_date, end_date, employee_id,  # attendance
-                start_date, end_date, employee_id,  # leaves
-            ]
+            query, params = employee_report_sql(employee_id, start_date, end_date)
 
             rows = run_sql(query, params)
             if not rows:
@@ -594,42 +604,9 @@ class EmployeeReportAPIView(APIView):
                 employee_details = emp_rows[0]
                 return Response({"employee_details": employee_details, "daily_report": []}, status=status.HTTP_200_OK)
 
-            first = rows[0]
-            employee_details = {
-                "employee_id": first.get("employee_id"),
-                "user_id": first.get("user_id"),
-                "user_first_name": first.get("user_first_name"),
-                "fullname": first.get("fullname"),
-                "inactive_date": first.get("inactive_date"),
-                "outlet_names": first.get("outlet_names"),
-                "outlet_ids": first.get("outlet_ids"),
-            }
+            employee_details = _employee_details(rows[0])
 
-            daily_report = []
-            import json
-            for r in rows:
-                vnotes = r.get("verification_notes") or []
-                if isinstance(vnotes, str):
-                    try:
-                        vnotes = json.loads(vnotes)
-                    except Exception:
-                        vnotes = [vnotes]
-                entry = {
-                    "work_date": r.get("work_date"),
-                    "check_in_time": r.get("check_in_time"),
-                    "check_out_time": r.get("check_out_time"),
-                    "worked_hours": r.get("worked_hours"),
-                    "attendance_status": r.get("attendance_status"),
-                    "verification_notes": vnotes,
-                    "leave_refno": r.get("leave_refno"),
-                    "leave_remarks": r.get("leave_remarks"),
-                    "leave_type_id": r.get("leave_type_id"),
-                    "att_type": r.get("att_type"),
-                    "att_type_name": r.get("att_type_name"),
-                }
-                if not entry["attendance_status"] and not entry["leave_refno"]:
-                    entry["attendance_status"] = "Blank Day"
-                daily_report.append(entry)
+            daily_report = [_daily_entry(r) for r in rows]
 
             return Response({"employee_details": employee_details, "daily_report": daily_report}, status=status.HTTP_200_OK)
         except ValueError as ve:
@@ -639,6 +616,105 @@ class EmployeeReportAPIView(APIView):
             return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class EmployeeBatchReportAPIView(APIView):
+    """
+    Daily reports of many employees from one query, streamed as JSON one
+    employee at a time: {"start_date", "end_date", "results": [{"employee_details",
+    "daily_report"}, ...]}, each entry shaped like EmployeeReportAPIView.
+    Query params: outlet_id and/or employee_ids (comma separated),
+    start_date, end_date (YYYY-MM-DD)
+    """
+    MAX_EMPLOYEE_IDS = 2000
+
+    def get(self, request, format=None):
+        try:
+            start_date, end_date = parse_dates_or_default(request.query_params.get("start_date"), request.query_params.get("end_date"))
+            outlet_id = request.query_params.get("outlet_id")
+            outlet_id = int(outlet_id) if outlet_id not in (None, '', 'all') else None
+            employee_ids = request.query_params.get("employee_ids")
+            if employee_ids:
+                employee_ids = sorted({int(x) for x in employee_ids.split(',') if x.strip()})
+            else:
+                employee_ids = None
+        except ValueError as ve:
+            return Response({"detail": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if outlet_id is None and not employee_ids:
+            return Response({"detail": "outlet_id or employee_ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if employee_ids and len(employee_ids) > self.MAX_EMPLOYEE_IDS:
+            return Response({"detail": f"At most {self.MAX_EMPLOYEE_IDS} employee_ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+        if not self._allowed(get_access_scope(request), outlet_id, employee_ids):
+            return Response({"detail": "You do not have permission to access these employees."}, status=status.HTTP_403_FORBIDDEN)
+
+        query, params = employees_report_sql(start_date, end_date, employee_ids=employee_ids, outlet_id=outlet_id)
+        content = self._stream(iter_sql(query, params), start_date, end_date)
+        return StreamingHttpResponse(content, content_type='application/json')
+
+    @staticmethod
+    def _allowed(scope, outlet_id, employee_ids):
+        """Admins see everyone; others only their outlets' employees and themselves."""
+        if scope.is_admin:
+            return True
+        if outlet_id is not None and not scope.has_outlet(outlet_id):
+            return False
+        if employee_ids:
+            visible = Q(outlets__in=scope.outlet_ids)
+            if scope.employee_id is not None:
+                visible |= Q(pk=scope.employee_id)
+            found = Employee.objects.filter(visible, pk__in=employee_ids).values_list('pk', flat=True).distinct()
+            # Unknown ids count as outside the scope: nothing about other employees leaks
+            return set(found) == set(employee_ids)
+        return True
+
+    @staticmethod
+    def _stream(rows, start_date, end_date):
+        encoder = DjangoJSONEncoder()
+        yield f'{{"start_date": "{start_date}", "end_date": "{end_date}", "results": ['
+        try:
+            for n, (_, employee_rows) in enumerate(groupby(rows, key=itemgetter("employee_id"))):
+                employee_rows = list(employee_rows)
+                chunk = {
+                    "employee_details": _employee_details(employee_rows[0]),
+                    "daily_report": [_daily_entry(r) for r in employee_rows],
+                }
+                yield (',' if n else '') + encoder.encode(chunk)
+        except Exception as e:
+            # Headers are already sent; close the document with an error marker instead
+            print("EmployeeBatchReportAPIView error:", e)
+            yield '], "error": "Internal server error"}'
+            return
+        yield ']}'
+
+
+class EmployeeReportExportAPIView(APIView):
+    """
+    EmployeeReportAPIView as a streamed CSV/XLSX download.
+    Query params: start_date, end_date (YYYY-MM-DD), file_format (csv|xlsx)
+    """
+    COLUMNS = (
+        "employee_id", "fullname", "outlet_names", "work_date", "check_in_time", "check_out_time",
+        "worked_hours", "attendance_status", "leave_refno", "att_type", "att_type_name", "leave_remarks",
+    )
+
+    def get(self, request, employee_id, format=None):
+        try:
+            start_date, end_date = parse_dates_or_default(request.query_params.get("start_date"), request.query_params.get("end_date"))
+        except ValueError as ve:
+            return Response({"detail": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = export_format(request)
+        if file_format is None:
+            return Response({"detail": "file_format must be csv or xlsx."}, status=status.HTTP_400_BAD_REQUEST)
+        if not Employee.objects.filter(pk=employee_id).exists():
+            return Response({"detail": "No employee found"}, status=status.HTTP_404_NOT_FOUND)
+
+        query, params = employee_report_sql(employee_id, start_date, end_date)
+        rows = (
+            [dict(r, **_daily_entry(r)).get(c) for c in self.COLUMNS]
+            for r in iter_sql(query, params)
+        )
+        return streaming_export(f"employee_{employee_id}_{start_date}_{end_date}", self.COLUMNS, rows, file_format)
+
+
 class EmployeeDetailsByUserAPIView(APIView):
     """
     Returns employee details for given user_id.
@@ -791,7 +867,7 @@ class OutletLeaveListAPIView(APIView):
         elif end_date:
             queryset = queryset.filter(leave_date__lte=end_date)
 
-        paginator = StandardPagination()
+        paginator = get_paginator(request, keyset_ordering=('-leave_refno',), pagination_class=EstimatedCountPagination)
         page = paginator.paginate_queryset(queryset, request)
         serializer = EmpLeaveSerializer(page if page is not None else queryset, many=True)
 
@@ -861,28 +937,28 @@ class LeaveBulkCreateAPIView(APIView):
             )
 
         leave_type = LeaveType.objects.get(id=leave_type_id)
-        created_records = []
-
-        for employee in employees:
-            for leave_date in leave_dates:
-                leave_record = EmpLeave.objects.create(
-                    employee=employee,
-                    leave_date=leave_date,
-                    leave_type=leave_type,
-                    remarks=remarks,
-                    status='pending'
-                )
-
-                created_records.append({
-                    "leave_refno": leave_record.leave_refno,
-                    "employee_id": employee.employee_id,
-                    "leave_date": leave_date,
-                    "leave_type": leave_type.att_type_name,
-                    "status": leave_record.status,
-                })
+        results = ingest_leaves(
+            [employee.employee_id for employee in employees], leave_dates, leave_type,
+            status='pending', remarks=remarks,
+        )
+
+        created_records = [
+            {
+                "leave_refno": r["leave_refno"],
+                "employee_id": r["employee_id"],
+                "leave_date": r["leave_date"],
+                "leave_type": leave_type.att_type_name,
+                "status": 'pending',
+            }
+            for r in results if r["created"]
+        ]
+        skipped = [
+            {"employee_id": r["employee_id"], "leave_date": r["leave_date"], "error": r["error"]}
+            for r in results if not r["created"]
+        ]
 
         return Response(
-            {"created_count": len(created_records), "records": created_records},
+            {"created_count": len(created_records), "records": created_records, "skipped": skipped},
             status=status.HTTP_201_CREATED
         )
 
@@ -891,18 +967,15 @@ class OutletDataAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-
-        try:
-            employee = user.employee
-        except Employee.DoesNotExist:
+        scope = get_access_scope(request)
+        if scope.employee_id is None:
             return Response(
                 {"detail": "User is not linked to an employee"},
                 status=400
             )
 
         # Outlets (still manager-specific)
-        outlets = employee.outlets.all()
+        outlets = Outlet.objects.filter(id__in=scope.outlet_ids)
         outlets_data = [{"id": o.id, "name": o.name} for o in outlets]
 
         # ✅ ALL EMPLOYEES